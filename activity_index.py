@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Retrieval index over all Gemini description sessions.
+
+Every descriptions_*.md file in gemini_descriptions/ is split into chunks, one
+per timestamped entry (**YYYY-MM-DD HH:MM:SS:** ...). Older files written
+before entries were timestamped are split into paragraph groups instead. The
+chunks go into a SQLite FTS5 table so a chat question only needs the top-k
+relevant chunks instead of a whole session file.
+
+Sessions recorded in the activity store (activity.sqlite3, see
+activity_store.py) are indexed from its descriptions table instead, reading
+only rows added since the last refresh. The store commits in batches, so the
+markdown log of such a session can be a few entries ahead of it: those tail
+entries are indexed from the markdown file until the store's rows for them
+arrive and replace them. Sessions the store does not have are indexed from
+markdown alone.
+
+The index lives next to the descriptions and is updated incrementally: only
+files whose size or modification time changed are re-read.
+
+Build or refresh it offline with:  python activity_index.py [query]
+"""
+
+import os
+import re
+import sys
+import sqlite3
+import bisect
+import threading
+from datetime import datetime, timedelta
+
+DESCRIPTIONS_DIR = "gemini_descriptions"
+INDEX_FILENAME = "activity_index.sqlite3"
+STORE_FILENAME = "activity.sqlite3"  # activity_store.ActivityStore's database
+# Sessions are named by start time; remote peer sessions add a peer suffix (20250531_202921_3fa2b1c0)
+DESCRIPTION_FILE_RE = re.compile(r'descriptions_(\d{8}_\d{6}(?:_[0-9a-z]+)?)\.md$')
+ENTRY_RE = re.compile(r'^\*\*(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}):\*\* ?', re.MULTILINE)
+ENTRY_BYTES_RE = re.compile(rb'^\*\*\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}:\*\*', re.MULTILINE)
+INDEX_SCHEMA_VERSION = 3  # Bump to rebuild existing index files on schema changes
+STARTED_RE = re.compile(r'^\*\*Started:\*\* (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})', re.MULTILINE)
+WORD_RE = re.compile(r'\w+')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# A clock time in a question, optionally preceded by a date: "2025-05-31 20:15", "8:05pm", "20:00:30"
+TIME_MENTION_RE = re.compile(
+    r'(?:(\d{4}-\d{2}-\d{2})[ T])?\b(\d{1,2}):(\d{2})(?::(\d{2}))?\s*(am|pm)?\b', re.IGNORECASE)
+SINGLE_TIME_WINDOW = timedelta(minutes=5)  # "What was I doing at 20:10?" looks at 20:05-20:15
+LEGACY_CHUNK_CHARS = 1500  # Paragraph group size for files without timestamped entries
+
+# Common words that would match almost every chunk
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'did', 'do', 'does', 'for', 'from', 'had', 'has', 'have',
+    'how', 'i', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was',
+    'were', 'what', 'when', 'where', 'which', 'who', 'why', 'with', 'you', 'your',
+}
+
+
+def session_from_filename(filename):
+    """'descriptions_20250531_202921.md' -> '20250531_202921' (None if it doesn't match)."""
+    match = DESCRIPTION_FILE_RE.search(filename)
+    return match.group(1) if match else None
+
+
+def list_description_files(descriptions_dir=DESCRIPTIONS_DIR):
+    """All session markdown files, oldest first."""
+    if not os.path.exists(descriptions_dir):
+        return []
+    files = [f for f in os.listdir(descriptions_dir) if session_from_filename(f)]
+    files.sort(key=session_from_filename)
+    return [os.path.join(descriptions_dir, f) for f in files]
+
+
+def parse_description_text(content, has_header=True):
+    """Split a description log into entries: [{'timestamp': str or None, 'text': str}, ...].
+
+    Pass has_header=False for text appended after the header (an entry may contain '---').
+    """
+    # Skip the header (title, Started line, separator)
+    body = content
+    if has_header and "\n---\n" in content:
+        body = content.split("\n---\n", 1)[1]
+
+    matches = list(ENTRY_RE.finditer(body))
+    if matches:
+        entries = []
+        leading = body[:matches[0].start()].strip()
+        if leading:
+            # Untimestamped text ahead of the first entry (e.g. a log that predates timestamps)
+            started = STARTED_RE.search(content)
+            entries.append({'timestamp': started.group(1) if started else None, 'text': leading})
+        for i, match in enumerate(matches):
+            end = matches[i + 1].start() if i + 1 < len(matches) else len(body)
+            text = body[match.end():end].strip()
+            if text:
+                entries.append({'timestamp': match.group(1), 'text': text})
+        return entries
+
+    # Legacy files: one long untimestamped stream, grouped into paragraph chunks
+    started = STARTED_RE.search(content)
+    timestamp = started.group(1) if started else None
+    entries = []
+    current = []
+    current_len = 0
+    for paragraph in body.split("\n\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        current.append(paragraph)
+        current_len += len(paragraph)
+        if current_len >= LEGACY_CHUNK_CHARS:
+            entries.append({'timestamp': timestamp, 'text': "\n\n".join(current)})
+            current = []
+            current_len = 0
+    if current:
+        entries.append({'timestamp': timestamp, 'text': "\n\n".join(current)})
+    return entries
+
+
+def parse_description_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_description_text(f.read())
+
+
+def read_complete_entries(path, offset=0):
+    """Parse the entries appended to a description log since byte offset.
+
+    Returns (entries, new_offset, timestamped). Only complete entries are consumed: when the
+    file doesn't end on an entry boundary, the last (still being written) entry is left for
+    the next call.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+
+    start = 0
+    if offset == 0:
+        header_end = data.find(b"\n---\n")
+        start = header_end + 5 if header_end != -1 else 0
+    headers = [m.start() for m in ENTRY_BYTES_RE.finditer(data, start)]
+    timestamped = bool(headers)
+
+    end = len(data)
+    if timestamped and not data.endswith(b"\n\n"):
+        end = headers[-1]
+    text = data[:end].decode('utf-8', errors='replace')
+    return parse_description_text(text, has_header=(offset == 0)), offset + end, timestamped
+
+
+def fts_query(question):
+    """Turn a free-text question into an FTS5 OR-query of its meaningful words."""
+    words = []
+    for word in WORD_RE.findall(question.lower()):
+        if word not in STOPWORDS and len(word) > 1 and word not in words:
+            words.append(word)
+    return " OR ".join(f'"{word}"' for word in words)
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token) for logging."""
+    return len(text) // 4
+
+
+class ActivityIndex:
+    """SQLite FTS5 index of description chunks across all sessions."""
+
+    def __init__(self, descriptions_dir=DESCRIPTIONS_DIR, index_path=None, store_path=None):
+        self.descriptions_dir = descriptions_dir
+        self.index_path = index_path or os.path.join(descriptions_dir, INDEX_FILENAME)
+        self.store_path = store_path or os.path.join(descriptions_dir, STORE_FILENAME)
+        self._store_prefix = self.store_path + "#"  # files rows for store sessions: <store path>#<session>
+        # Chat requests retrieve on worker threads and the watcher refreshes on its own; all share this one connection
+        self.conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.version = 0  # Bumped whenever refresh() changes the index
+        # Timestamp-sorted (timestamp, rowid) arrays for bisect range lookups, rebuilt per version
+        self._timeline_version = None
+        self._timeline_keys = []
+        self._timeline_rowids = []
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_SCHEMA_VERSION:
+            # The index is a cache of the markdown files; rebuild it rather than migrate
+            self.conn.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS chunks;")
+            self.conn.execute(f"PRAGMA user_version = {INDEX_SCHEMA_VERSION}")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                session TEXT,
+                size INTEGER,      -- bytes consumed so far (complete entries only)
+                mtime REAL,
+                entries INTEGER,   -- next chunk position
+                timestamped INTEGER
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+                text,
+                session UNINDEXED,
+                timestamp UNINDEXED,
+                position UNINDEXED,
+                path UNINDEXED,
+                tokenize = 'porter unicode61'
+            );
+        """)
+
+    def refresh(self):
+        """Index new store rows and new entries in changed description files. Returns the number of sessions updated.
+
+        Store sessions resume after the last description id indexed. Timestamped session logs are
+        append-only, so a grown file is read from where the last refresh stopped; anything else that
+        changed is re-indexed from scratch. For store sessions only the entries past the store's rows
+        are taken from the markdown file, and they are dropped once the store has them.
+        """
+        updated = 0
+        with self.lock, self.conn:
+            indexed = {
+                row[0]: row[1:]
+                for row in self.conn.execute("SELECT path, size, mtime, entries, timestamped FROM files")
+            }
+            last_id = max((row[0] for path, row in indexed.items() if path.startswith(self._store_prefix)), default=0)
+            store_sessions, rows = self._read_store(last_id)
+            if rows is None:
+                # The store was recreated (ids went backwards); index it again from the start
+                stale = [path for path in indexed if path.startswith(self._store_prefix)]
+                for path in stale:
+                    self.conn.execute("DELETE FROM chunks WHERE path = ?", (path,))
+                    self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                    del indexed[path]
+                store_sessions, rows = self._read_store(0)
+            stored_before = {path: row[2] for path, row in indexed.items() if path.startswith(self._store_prefix)}
+            updated += self._index_store_rows(rows, indexed)
+
+            paths = list_description_files(self.descriptions_dir)
+            current = set(paths) | {self._store_prefix + session for session in store_sessions}
+            for path in paths:
+                stat = os.stat(path)
+                previous = indexed.get(path)
+                session = session_from_filename(os.path.basename(path))
+                store_path = self._store_prefix + session
+                stored = indexed[store_path][2] if store_path in indexed else 0
+                if previous and previous[2] > stored_before.get(store_path, 0) and stored > stored_before.get(store_path, 0):
+                    # The store caught up with entries indexed from the markdown tail; its rows replace them
+                    self.conn.execute("DELETE FROM chunks WHERE path = ? AND CAST(position AS INTEGER) < ?",
+                                      (path, stored))
+                if previous and previous[0] == stat.st_size and previous[1] == stat.st_mtime:
+                    continue
+                if previous and previous[3] and stat.st_size > previous[0]:
+                    changed = self._index_file(path, stat, offset=previous[0], position=previous[2], skip=stored)
+                else:
+                    changed = self._index_file(path, stat, skip=stored)
+                updated += 1 if changed else 0
+            for path in set(indexed) - current:
+                self.conn.execute("DELETE FROM chunks WHERE path = ?", (path,))
+                self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                updated += 1
+            if updated:
+                self.version += 1
+        return updated
+
+    def _read_store(self, after_id):
+        """(sessions in the activity store, its descriptions with id > after_id); rows is None if the ids restarted."""
+        if not os.path.exists(self.store_path):
+            return set(), []
+        try:
+            store = sqlite3.connect(f"file:{self.store_path}?mode=ro", uri=True)
+            try:
+                sessions = {row[0] for row in store.execute("SELECT session FROM sessions")}
+                if after_id and (store.execute("SELECT MAX(id) FROM descriptions").fetchone()[0] or 0) < after_id:
+                    return sessions, None
+                rows = store.execute("SELECT id, session, timestamp, text FROM descriptions WHERE id > ? ORDER BY id",
+                                     (after_id,)).fetchall()
+            finally:
+                store.close()
+        except sqlite3.Error:
+            return set(), []  # No store yet (or not initialised); index the markdown files
+        return sessions, rows
+
+    def _index_store_rows(self, rows, indexed):
+        """Append store descriptions to their sessions' chunks and files rows in indexed. Returns sessions updated."""
+        by_session = {}
+        for row in rows:
+            by_session.setdefault(row[1], []).append(row)
+        for session, session_rows in by_session.items():
+            path = self._store_prefix + session
+            position = indexed[path][2] if path in indexed else 0
+            self.conn.executemany(
+                "INSERT INTO chunks (text, session, timestamp, position, path) VALUES (?, ?, ?, ?, ?)",
+                [(text, session, timestamp, position + i, path) for i, (_, _, timestamp, text) in enumerate(session_rows)],
+            )
+            # size holds the last description id indexed for this session
+            indexed[path] = (session_rows[-1][0], 0.0, position + len(session_rows), 1)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, session, size, mtime, entries, timestamped) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, session) + indexed[path],
+            )
+        return len(by_session)
+
+    def _index_file(self, path, stat, offset=0, position=0, skip=0):
+        """Index entries from byte offset on (offset 0 re-indexes the whole file). True if rows changed.
+
+        Entries at positions below skip are consumed but not indexed (the activity store has them).
+        """
+        session = session_from_filename(os.path.basename(path))
+        entries, new_offset, timestamped = read_complete_entries(path, offset)
+        if offset == 0:
+            self.conn.execute("DELETE FROM chunks WHERE path = ?", (path,))
+        rows = [(entry['text'], session, entry['timestamp'], position + i, path)
+                for i, entry in enumerate(entries) if position + i >= skip]
+        self.conn.executemany("INSERT INTO chunks (text, session, timestamp, position, path) VALUES (?, ?, ?, ?, ?)", rows)
+        # A partial trailing entry leaves size short of the file size, so the next refresh resumes there
+        mtime = stat.st_mtime if new_offset == stat.st_size else 0.0
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, session, size, mtime, entries, timestamped) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, session, new_offset, mtime, position + len(entries), int(timestamped or offset > 0)),
+        )
+        return bool(rows) or offset == 0
+
+    def search(self, question, k=8):
+        """Top-k chunks by BM25 relevance: [{'session', 'timestamp', 'text', 'score'}, ...]."""
+        query = fts_query(question)
+        if not query:
+            return []
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT session, timestamp, position, text, bm25(chunks) AS score FROM chunks "
+                "WHERE chunks MATCH ? ORDER BY score LIMIT ?",
+                (query, k),
+            ).fetchall()
+        return [
+            {'session': session, 'timestamp': timestamp, 'position': position, 'text': text, 'score': score}
+            for session, timestamp, position, text, score in rows
+        ]
+
+    def recent(self, max_chars=6000):
+        """The newest chunks of the most recent session, oldest first, up to max_chars."""
+        with self.lock:
+            row = self.conn.execute("SELECT session FROM files ORDER BY session DESC LIMIT 1").fetchone()
+            if not row:
+                return []
+            rows = self.conn.execute(
+                "SELECT session, timestamp, position, text FROM chunks WHERE session = ? "
+                "ORDER BY CAST(position AS INTEGER) DESC",
+                (row[0],),
+            ).fetchall()
+        chunks = []
+        total = 0
+        for session, timestamp, position, text in rows:
+            if chunks and total + len(text) > max_chars:
+                break
+            chunks.append({'session': session, 'timestamp': timestamp, 'position': position, 'text': text})
+            total += len(text)
+        chunks.reverse()
+        return chunks
+
+    def newest_session(self):
+        with self.lock:
+            row = self.conn.execute("SELECT session FROM files ORDER BY session DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def since(self, session, position):
+        """Chunks of a session after the given position, oldest first."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT session, timestamp, position, text FROM chunks WHERE session = ? "
+                "AND CAST(position AS INTEGER) > ? ORDER BY CAST(position AS INTEGER)",
+                (session, position),
+            ).fetchall()
+        return [
+            {'session': session, 'timestamp': timestamp, 'position': position, 'text': text}
+            for session, timestamp, position, text in rows
+        ]
+
+    def _load_timeline(self):
+        """(Re)build the sorted timestamp arrays if the index changed since the last build."""
+        if self._timeline_version == self.version:
+            return
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT timestamp, rowid FROM chunks WHERE timestamp IS NOT NULL "
+                "ORDER BY timestamp, session, CAST(position AS INTEGER)"
+            ).fetchall()
+            self._timeline_keys = [row[0] for row in rows]
+            self._timeline_rowids = [row[1] for row in rows]
+            self._timeline_version = self.version
+
+    def between(self, start, end, limit=None):
+        """Chunks with start <= timestamp <= end (YYYY-MM-DD HH:MM:SS strings), oldest first."""
+        self._load_timeline()
+        lo = bisect.bisect_left(self._timeline_keys, start)
+        hi = bisect.bisect_right(self._timeline_keys, end)
+        rowids = self._timeline_rowids[lo:hi]
+        if limit is not None:
+            rowids = rowids[:limit]
+        if not rowids:
+            return []
+        placeholders = ",".join("?" * len(rowids))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT rowid, session, timestamp, position, text FROM chunks WHERE rowid IN ({placeholders})",
+                rowids,
+            ).fetchall()
+        by_rowid = {row[0]: row for row in rows}
+        return [
+            {'session': by_rowid[r][1], 'timestamp': by_rowid[r][2], 'position': by_rowid[r][3], 'text': by_rowid[r][4]}
+            for r in rowids if r in by_rowid
+        ]
+
+    def count_between(self, start, end):
+        self._load_timeline()
+        return bisect.bisect_right(self._timeline_keys, end) - bisect.bisect_left(self._timeline_keys, start)
+
+    def latest_timestamp(self):
+        self._load_timeline()
+        return self._timeline_keys[-1] if self._timeline_keys else None
+
+    def stats(self):
+        with self.lock:
+            files = self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            chunks = self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {'files': files, 'chunks': chunks, 'index': self.index_path}
+
+    def close(self):
+        self.conn.close()
+
+
+def _clock_time(hour, minute, second, meridiem):
+    hour = int(hour)
+    if meridiem:
+        meridiem = meridiem.lower()
+        if meridiem == 'pm' and hour < 12:
+            hour += 12
+        elif meridiem == 'am' and hour == 12:
+            hour = 0
+    return hour, int(minute), int(second or 0)
+
+
+def parse_timestamp(value, reference_date=None):
+    """Parse 'YYYY-MM-DD HH:MM[:SS]', ISO 'YYYY-MM-DDTHH:MM[:SS]' or 'HH:MM[:SS]' (on reference_date)."""
+    value = value.strip().replace('T', ' ')
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    match = TIME_MENTION_RE.fullmatch(value)
+    if match and reference_date is not None:
+        hour, minute, second = _clock_time(*match.group(2, 3, 4, 5))
+        return datetime.combine(reference_date, datetime.min.time()).replace(hour=hour, minute=minute, second=second)
+    raise ValueError(f"Unrecognized time: {value!r}")
+
+
+def parse_time_window(question, reference_date):
+    """Find a time window in a question ("between 20:00 and 20:15", "at 8:05pm").
+
+    Returns (start, end) as timestamp strings, or None if the question names no clock time.
+    Times without a date are taken on reference_date.
+    """
+    mentions = []  # (datetime, seconds given)
+    day = reference_date
+    for match in TIME_MENTION_RE.finditer(question):
+        hour, minute, second = _clock_time(*match.group(2, 3, 4, 5))
+        if hour > 23 or minute > 59 or second > 59:
+            continue
+        if match.group(1):
+            # An explicit date also applies to later times in the same question ("... 10:00 to 11:30")
+            day = datetime.strptime(match.group(1), '%Y-%m-%d').date()
+        if day is None:
+            continue
+        moment = datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute, second=second)
+        mentions.append((moment, match.group(4) is not None))
+    if not mentions:
+        return None
+    if len(mentions) >= 2:
+        (start, _), (end, end_has_seconds) = sorted(mentions[:2])
+        if not end_has_seconds:
+            end = end.replace(second=59)  # "until 20:15" includes the whole minute
+    else:
+        start = mentions[0][0] - SINGLE_TIME_WINDOW
+        end = mentions[0][0] + SINGLE_TIME_WINDOW
+    return start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)
+
+
+def format_chunks(chunks):
+    """Render chunks for a prompt, labelled with session and timestamp."""
+    lines = []
+    for chunk in chunks:
+        label = chunk['timestamp'] or f"session {chunk['session']}"
+        lines.append(f"**{label}:** {chunk['text']}")
+    return "\n\n".join(lines)
+
+
+def main():
+    index = ActivityIndex()
+    updated = index.refresh()
+    print(f"Indexed {updated} changed file(s): {index.stats()}")
+    if len(sys.argv) > 1:
+        question = " ".join(sys.argv[1:])
+        for chunk in index.search(question, k=5):
+            print(f"\n[{chunk['session']} {chunk['timestamp']}] score={chunk['score']:.2f}")
+            print(chunk['text'][:300])
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Compact SQLite store of description and frame records.
+
+Every description (timestamp, session, text, stream latencies, hash of the
+last frame sent before it) and every captured frame (capture time, content
+hash, size, dimensions, change, whether and how fast it was sent, saved path)
+becomes one row in gemini_descriptions/activity.sqlite3, indexed by session
+and time. Loading a week of history is an indexed range scan instead of
+parsing every descriptions_*.md file and listing captured_frames/:
+ActivityIndex (and through it the chat server and the rollups) reads the
+sessions recorded here from this table (plus the few newest markdown entries
+not committed here yet) and parses whole markdown files only for sessions the
+store does not have (run `import` once to bring those in too).
+
+Writes are queued and committed in batches on a background thread, so the
+capture and receive loops only pay for a queue put. The markdown log and the
+HTML viewer are views of this data and can be exported for any session:
+
+    python activity_store.py import                  # load existing descriptions_*.md files
+    python activity_store.py sessions                # sessions with entry/frame counts
+    python activity_store.py export <session> [--html] [-o path]
+"""
+
+import os
+import sys
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from loguru import logger
+
+from activity_index import DESCRIPTIONS_DIR, STORE_FILENAME, TIMESTAMP_FORMAT, list_description_files, \
+    parse_description_file, session_from_filename
+from journal import render_html_shell
+import metrics
+
+BATCH_INTERVAL = 1.0  # seconds between commits of queued records
+
+DESCRIPTION_FIELDS = ('session', 'timestamp', 'text', 'completed_by', 'chunks', 'first_chunk_latency',
+                      'last_chunk_latency', 'stream_duration', 'frame_hash')
+FRAME_FIELDS = ('session', 'captured_at', 'hash', 'width', 'height', 'bytes', 'change', 'sent',
+                'send_latency', 'path')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session TEXT PRIMARY KEY,
+    started_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS descriptions (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    text TEXT NOT NULL,
+    completed_by TEXT,
+    chunks INTEGER,
+    first_chunk_latency REAL,
+    last_chunk_latency REAL,
+    stream_duration REAL,
+    frame_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS descriptions_by_session ON descriptions (session, timestamp);
+CREATE INDEX IF NOT EXISTS descriptions_by_time ON descriptions (timestamp);
+CREATE TABLE IF NOT EXISTS frames (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    captured_at REAL NOT NULL,
+    hash TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    bytes INTEGER NOT NULL,
+    change REAL,
+    sent INTEGER NOT NULL,
+    send_latency REAL,
+    path TEXT
+);
+CREATE INDEX IF NOT EXISTS frames_by_session ON frames (session, captured_at);
+CREATE INDEX IF NOT EXISTS frames_by_hash ON frames (hash);
+"""
+
+_STOP = object()
+
+
+class ActivityStore:
+    """Batched writer and indexed reader for description and frame records."""
+
+    def __init__(self, path=None, background=True, batch_interval=BATCH_INTERVAL):
+        self.path = path or os.path.join(DESCRIPTIONS_DIR, STORE_FILENAME)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.background = background
+        self.batch_interval = batch_interval
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # With WAL a crash may lose the last batch but never corrupts the file
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+        self.last_sent_hash = None  # Frame the next description is most likely about
+        self.descriptions_written = 0
+        self.frames_written = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._writer_loop, name="activity-store", daemon=True)
+            self._thread.start()
+
+    # --- Writing ---
+
+    def start_session(self, session, started_at=None):
+        self._put(('session', (session, started_at or datetime.now().strftime(TIMESTAMP_FORMAT))))
+
+    def record_description(self, session, record):
+        """Queue a description record (the journal/turn assembler record: timestamp, text, latencies)."""
+        row = dict(record, session=session)
+        row.setdefault('frame_hash', self.last_sent_hash)
+        self._put(('description', tuple(row.get(field) for field in DESCRIPTION_FIELDS)))
+
+    def record_frame(self, session, frame, sent, send_latency=None):
+        """Queue a captured frame (capture.CapturedFrame), whether it was sent or skipped."""
+        if sent:
+            self.last_sent_hash = frame.hash
+        self._put(('frame', (session, frame.captured_at, frame.hash, frame.width, frame.height, frame.size,
+                             frame.change, int(sent), send_latency, frame.path)))
+
+    def _put(self, item):
+        if self.background:
+            self._queue.put(item)
+        else:
+            self._write_batch([item])
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_interval
+            # Collect for up to batch_interval so a burst of frames becomes one transaction
+            while batch[-1] is not _STOP:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            items = [item for item in batch if item is not _STOP and item[0] != 'flush']
+            if items:
+                try:
+                    self._write_batch(items)
+                except Exception as e:
+                    logger.error(f"Error writing activity records: {e}")
+            for item in batch:
+                if item is not _STOP and item[0] == 'flush':
+                    item[1].set()
+            if stop:
+                return
+
+    def _write_batch(self, items):
+        start = time.perf_counter()
+        rows = {'session': [], 'description': [], 'frame': []}
+        for kind, row in items:
+            rows[kind].append(row)
+        with self.lock, self.conn:
+            if rows['session']:
+                self.conn.executemany("INSERT OR IGNORE INTO sessions (session, started_at) VALUES (?, ?)",
+                                      rows['session'])
+            if rows['description']:
+                self.conn.executemany(
+                    f"INSERT INTO descriptions ({', '.join(DESCRIPTION_FIELDS)}) "
+                    f"VALUES ({', '.join('?' * len(DESCRIPTION_FIELDS))})", rows['description'])
+            if rows['frame']:
+                self.conn.executemany(
+                    f"INSERT INTO frames ({', '.join(FRAME_FIELDS)}) VALUES ({', '.join('?' * len(FRAME_FIELDS))})",
+                    rows['frame'])
+        self.descriptions_written += len(rows['description'])
+        self.frames_written += len(rows['frame'])
+        metrics.WRITE_SECONDS.labels(store='activity_store').observe(time.perf_counter() - start)
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far is committed."""
+        if self._thread is not None:
+            done = threading.Event()
+            self._queue.put(('flush', done))
+            done.wait(timeout)
+
+    def close(self):
+        """Commit queued records and close the database."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        with self.lock:
+            self.conn.close()
+
+    # --- Reading ---
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            cursor = self.conn.execute(sql, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def sessions(self):
+        """Sessions with description and frame counts, oldest first."""
+        return self._query("""
+            SELECT s.session, s.started_at,
+                   (SELECT COUNT(*) FROM descriptions d WHERE d.session = s.session) AS descriptions,
+                   (SELECT COUNT(*) FROM frames f WHERE f.session = s.session) AS frames,
+                   (SELECT COALESCE(SUM(bytes), 0) FROM frames f WHERE f.session = s.session) AS frame_bytes
+            FROM sessions s ORDER BY s.session
+        """)
+
+    def descriptions(self, session=None, start=None, end=None, limit=None):
+        """Description records oldest first, filtered by session and/or [start, end] timestamps."""
+        clauses, params = [], []
+        if session is not None:
+            clauses.append("session = ?")
+            params.append(session)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        sql = "SELECT * FROM descriptions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, params)
+
+    def frames(self, session=None, start=None, end=None, sent=None):
+        """Frame records oldest first; start/end are time.time() values."""
+        clauses, params = [], []
+        for clause, value in (("session = ?", session), ("captured_at >= ?", start),
+                              ("captured_at <= ?", end), ("sent = ?", None if sent is None else int(sent))):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        sql = "SELECT * FROM frames"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return self._query(sql + " ORDER BY captured_at, id", params)
+
+    def stats(self):
+        with self.lock:
+            descriptions = self.conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0]
+            frames, frame_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM frames").fetchone()
+        return {
+            'path': self.path,
+            'descriptions': descriptions,
+            'frames': frames,
+            'frame_bytes': frame_bytes,
+            'pending': self._queue.qsize(),
+            'file_bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+    # --- Views ---
+
+    def _started_at(self, session):
+        rows = self._query("SELECT started_at FROM sessions WHERE session = ?", (session,))
+        return rows[0]['started_at'] if rows else session
+
+    def export_markdown(self, session):
+        """The descriptions_<session>.md log for a session, rendered from its records."""
+        parts = ["# Gemini Screen Descriptions Log\n\n", f"**Started:** {self._started_at(session)}\n\n", "---\n\n"]
+        parts.extend(f"**{r['timestamp']}:** {r['text']}\n\n" for r in self.descriptions(session=session))
+        return "".join(parts)
+
+    def export_html(self, session):
+        """Self-contained HTML viewer page for a session."""
+        records = [{'timestamp': r['timestamp'], 'text': r['text']} for r in self.descriptions(session=session)]
+        return render_html_shell(session, self._started_at(session), "", records=records)
+
+    def import_markdown(self, descriptions_dir=DESCRIPTIONS_DIR):
+        """Load descriptions_*.md files for sessions the store doesn't have yet. Returns sessions imported."""
+        known = {row['session'] for row in self.sessions()}
+        imported = 0
+        for path in list_description_files(descriptions_dir):
+            session = session_from_filename(os.path.basename(path))
+            if session in known:
+                continue
+            entries = parse_description_file(path)
+            started = next((e['timestamp'] for e in entries if e['timestamp']), None)
+            if not started:
+                started = datetime.strptime(session[:15], '%Y%m%d_%H%M%S').strftime(TIMESTAMP_FORMAT)
+            rows = [(session, e['timestamp'] or started, e['text']) for e in entries]
+            with self.lock, self.conn:
+                self.conn.execute("INSERT OR IGNORE INTO sessions (session, started_at) VALUES (?, ?)", (session, started))
+                self.conn.executemany("INSERT INTO descriptions (session, timestamp, text) VALUES (?, ?, ?)", rows)
+            imported += 1
+        return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Activity store: import, list and export sessions")
+    parser.add_argument('command', choices=['import', 'sessions', 'export'])
+    parser.add_argument('session', nargs='?')
+    parser.add_argument('--html', action='store_true', help="export the HTML viewer instead of markdown")
+    parser.add_argument('-o', '--output', help="write the export here instead of stdout")
+    args = parser.parse_args()
+
+    store = ActivityStore(background=False)
+    try:
+        if args.command == 'import':
+            print(f"Imported {store.import_markdown()} session(s): {store.stats()}")
+        elif args.command == 'sessions':
+            for row in store.sessions():
+                print(f"{row['session']}  started {row['started_at']}  {row['descriptions']:>6} descriptions  "
+                      f"{row['frames']:>7} frames  {row['frame_bytes'] / 1e6:>8.1f} MB")
+        else:
+            if not args.session:
+                parser.error("export needs a session, e.g. 20250531_202921")
+            text = store.export_html(args.session) if args.html else store.export_markdown(args.session)
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                print(f"Wrote {args.output}")
+            else:
+                sys.stdout.write(text)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Adaptive capture rate and resolution for the screen streaming loop.
+
+AdaptiveCaptureController watches how much the screen changes, how big the
+uploads are and how long sends take, and picks the next capture interval,
+downscale factor and JPEG quality:
+
+- active screen (typing, scrolling): capture at min_interval
+- idle screen: back off gradually towards max_interval
+- over the upload budget: lower JPEG quality first, then resolution, then rate
+- well under budget: restore quality and resolution
+- never capture faster than frames can actually be sent
+"""
+
+import time
+
+# --- Controller defaults ---
+MIN_INTERVAL = 0.5  # seconds between captures during activity
+MAX_INTERVAL = 10.0  # seconds between captures when idle
+BASE_INTERVAL = 2.0  # starting interval
+IDLE_BACKOFF = 1.5  # interval multiplier per idle capture
+ACTIVE_CHANGE = 0.01  # changed fraction (EMA) above which the screen counts as active
+IDLE_CHANGE = 0.002  # changed fraction (EMA) below which the screen counts as idle
+BANDWIDTH_BUDGET = 250_000  # bytes per second of frame uploads
+MAX_FRAME_WIDTH = 1920  # 4K/5K screens are always downscaled to at most this width
+MIN_SCALE = 0.35
+MAX_QUALITY = 80
+MIN_QUALITY = 45
+QUALITY_STEP = 5
+SCALE_STEP = 0.85  # multiplicative downscale step when quality is already at the floor
+EMA_ALPHA = 0.3
+
+
+def _ema(previous, value, alpha=EMA_ALPHA):
+    return value if previous is None else previous + alpha * (value - previous)
+
+
+class AdaptiveCaptureController:
+    """Chooses interval, scale and JPEG quality for the next capture."""
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, base_interval=BASE_INTERVAL,
+                 bandwidth_budget=BANDWIDTH_BUDGET, max_frame_width=MAX_FRAME_WIDTH,
+                 min_quality=MIN_QUALITY, max_quality=MAX_QUALITY, min_scale=MIN_SCALE):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.bandwidth_budget = bandwidth_budget
+        self.max_frame_width = max_frame_width
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+        self.min_scale = min_scale
+
+        # Current decisions
+        self.interval = base_interval
+        self.quality = max_quality
+        self.budget_scale = 1.0  # Scale chosen for the bandwidth budget (before the width cap)
+        self.mode = "starting"
+
+        # Measurements
+        self.change_ema = None
+        self.send_latency_ema = None
+        self.payload_ema = None  # bytes per sent frame
+        self.native_width = None
+        self.adjustments = 0
+        self._updated_at = time.time()
+
+    @property
+    def scale(self):
+        """Downscale factor for the next frame: budget scale, capped by the maximum width."""
+        scale = self.budget_scale
+        if self.native_width and self.native_width * scale > self.max_frame_width:
+            scale = self.max_frame_width / self.native_width
+        return round(scale, 3)
+
+    def observe(self, change, sent, payload_bytes=0, send_seconds=None, native_width=None):
+        """Feed the result of one capture and recompute the decisions."""
+        if native_width:
+            self.native_width = native_width
+        self.change_ema = _ema(self.change_ema, change)
+        if sent:
+            self.payload_ema = _ema(self.payload_ema, payload_bytes)
+            if send_seconds is not None:
+                self.send_latency_ema = _ema(self.send_latency_ema, send_seconds)
+
+        self._update_interval(change)
+        self._update_bandwidth()
+        self._updated_at = time.time()
+
+    def _update_interval(self, change):
+        if change >= ACTIVE_CHANGE or self.change_ema >= ACTIVE_CHANGE:
+            # Something is happening: jump straight to the fast rate
+            self.mode = "active"
+            interval = self.min_interval
+        elif self.change_ema <= IDLE_CHANGE:
+            self.mode = "idle"
+            interval = self.interval * IDLE_BACKOFF
+        else:
+            self.mode = "steady"
+            interval = self.interval
+
+        # Don't capture faster than frames can be sent
+        if self.send_latency_ema is not None:
+            interval = max(interval, self.send_latency_ema * 1.2)
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+
+    def _update_bandwidth(self):
+        if not self.payload_ema or not self.bandwidth_budget:
+            return
+        projected = self.payload_ema / self.interval
+        if projected > self.bandwidth_budget:
+            # Cheapest visual loss first: quality, then resolution, then frame rate
+            if self.quality > self.min_quality:
+                self.quality = max(self.min_quality, self.quality - QUALITY_STEP)
+            elif self.budget_scale > self.min_scale:
+                self.budget_scale = max(self.min_scale, self.budget_scale * SCALE_STEP)
+            else:
+                self.interval = min(self.max_interval, self.payload_ema / self.bandwidth_budget)
+            self.adjustments += 1
+        elif projected < self.bandwidth_budget * 0.5:
+            if self.budget_scale < 1.0:
+                self.budget_scale = min(1.0, self.budget_scale / SCALE_STEP)
+                self.adjustments += 1
+            elif self.quality < self.max_quality:
+                self.quality = min(self.max_quality, self.quality + QUALITY_STEP)
+                self.adjustments += 1
+
+    def stats(self):
+        projected = self.payload_ema / self.interval if self.payload_ema else 0
+        return {
+            'mode': self.mode,
+            'interval': round(self.interval, 3),
+            'scale': self.scale,
+            'jpeg_quality': self.quality,
+            'bandwidth_budget': self.bandwidth_budget,
+            'projected_bytes_per_sec': round(projected),
+            'change_ema': round(self.change_ema or 0.0, 4),
+            'send_latency_ema': round(self.send_latency_ema, 4) if self.send_latency_ema is not None else None,
+            'payload_bytes_ema': round(self.payload_ema or 0),
+            'native_width': self.native_width,
+            'adjustments': self.adjustments,
+            'updated_at': self._updated_at,
+        }
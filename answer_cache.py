@@ -0,0 +1,182 @@
+"""
+Answer cache for repeated chat questions.
+
+Answers are keyed on the normalized question ("What errors did I hit?" and
+"what errors did i hit" are the same key) plus the context version they were
+generated against. When new descriptions are indexed the version changes and
+every cached answer is dropped, so a cached answer never describes stale
+activity. Entries expire after a TTL and the least recently used entry is
+evicted when the cache is full.
+
+Near-duplicate questions ("which apps was I using" / "what apps was I using")
+can also be served from the cache: their character shingles are compared with
+each cached question of the same version. Questions that mention different
+numbers (times, dates, counts) never match each other.
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+
+from activity_index import STOPWORDS, WORD_RE
+
+MAX_ENTRIES = 256
+TTL = 600.0  # seconds a cached answer stays valid (new descriptions invalidate sooner)
+SIMILARITY_THRESHOLD = 0.8  # Jaccard similarity of shingles for a near-duplicate hit; None disables
+SHINGLE_SIZE = 3
+NUMBER_RE = re.compile(r'\d+')
+
+
+def normalize_question(question):
+    """Lowercase words only: punctuation, case and spacing don't change the key."""
+    return " ".join(WORD_RE.findall(question.lower()))
+
+
+def shingles(normalized, size=SHINGLE_SIZE):
+    """Character shingles of the question's meaningful words."""
+    text = " ".join(w for w in normalized.split() if w not in STOPWORDS)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _Entry:
+    __slots__ = ('answer', 'version', 'shingles', 'numbers', 'created', 'tokens', 'latency', 'hits')
+
+    def __init__(self, answer, version, shingle_set, numbers, tokens, latency):
+        self.answer = answer
+        self.version = version
+        self.shingles = shingle_set
+        self.numbers = numbers
+        self.created = time.monotonic()
+        self.tokens = tokens  # Prompt + output tokens of the Gemini call a hit saves
+        self.latency = latency  # Seconds the original answer took
+        self.hits = 0
+
+
+class AnswerCache:
+    """LRU + TTL cache of chat answers, scoped to one context version at a time."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL, similarity_threshold=SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+
+        self._entries = OrderedDict()  # normalized question -> _Entry, least recently used first
+        self._version = None
+        self._lock = threading.Lock()  # invalidate() runs on the context watcher thread
+
+        self.lookups = 0
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.saved_tokens = 0
+        self.saved_seconds = 0.0
+        self._hit_seconds = 0.0  # Time spent serving hits
+        self._miss_seconds = 0.0  # Time the cached answers originally took
+        self._misses_stored = 0
+
+    def get(self, question, version):
+        """Cached answer for the question at this context version, or None."""
+        start = time.perf_counter()
+        key = normalize_question(question)
+        with self._lock:
+            self.lookups += 1
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self.exact_hits += 1
+            elif self.similarity_threshold is not None:
+                entry, key = self._nearest(key)
+                if entry is not None:
+                    self.near_hits += 1
+            if entry is None:
+                return None
+
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self.saved_tokens += entry.tokens
+            self.saved_seconds += entry.latency
+            self._hit_seconds += time.perf_counter() - start
+            return entry.answer
+
+    def put(self, question, version, answer, tokens=0, latency=0.0):
+        """Store an answer generated against the given context version."""
+        key = normalize_question(question)
+        with self._lock:
+            if self._version is None:
+                self._version = version
+            if version != self._version:
+                return  # New descriptions arrived while this answer was generated
+            self._entries[key] = _Entry(answer, version, shingles(key), NUMBER_RE.findall(key), tokens, latency)
+            self._entries.move_to_end(key)
+            self._misses_stored += 1
+            self._miss_seconds += latency
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, version=None):
+        """Drop every entry (call when new descriptions arrive); later lookups use `version`."""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            if version is not None:
+                self._version = version
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._version is not None and self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def _expired(self, entry):
+        return self.ttl is not None and time.monotonic() - entry.created > self.ttl
+
+    def _nearest(self, key):
+        """Most similar cached question above the threshold with the same numbers."""
+        candidate = shingles(key)
+        numbers = NUMBER_RE.findall(key)
+        best, best_key, best_score = None, None, self.similarity_threshold
+        for other_key, entry in list(self._entries.items()):
+            if self._expired(entry):
+                del self._entries[other_key]
+                continue
+            if entry.numbers != numbers:
+                continue
+            score = jaccard(candidate, entry.shingles)
+            if score >= best_score:
+                best, best_key, best_score = entry, other_key, score
+        return best, best_key
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.near_hits
+            return {
+                'entries': len(self._entries),
+                'version': self._version,
+                'lookups': self.lookups,
+                'hits': hits,
+                'exact_hits': self.exact_hits,
+                'near_hits': self.near_hits,
+                'hit_rate': round(hits / self.lookups, 3) if self.lookups else 0.0,
+                'saved_tokens': self.saved_tokens,
+                'saved_seconds': round(self.saved_seconds, 2),
+                'avg_hit_ms': round(self._hit_seconds / hits * 1000, 3) if hits else None,
+                'avg_miss_ms': round(self._miss_seconds / self._misses_stored * 1000, 1) if self._misses_stored else None,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+            }
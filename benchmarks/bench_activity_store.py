@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: loading history from markdown files vs. the SQLite activity store.
+
+Writes a synthetic week of sessions (markdown logs and the same records in an
+ActivityStore) to a temporary directory, then times:
+
+- loading the whole week: parsing every descriptions_*.md vs. one store scan
+- loading one afternoon: parsing every file and filtering vs. an indexed range query
+
+Usage: python benchmarks/bench_activity_store.py [days] [sessions_per_day] [entries_per_session]
+"""
+
+import os
+import sys
+import time
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from activity_index import list_description_files, parse_description_file, TIMESTAMP_FORMAT  # noqa: E402
+from activity_store import ActivityStore  # noqa: E402
+
+ENTRY_TEXT = ("The code editor shows server.py with the capture loop; the terminal below prints "
+              "frame timings and a reconnect warning. ") * 3
+
+
+def write_history(directory, store, days, sessions_per_day, entries):
+    start = datetime(2025, 6, 2, 8, 0, 0)
+    for day in range(days):
+        for s in range(sessions_per_day):
+            began = start + timedelta(days=day, hours=s * 1.5)
+            session = began.strftime('%Y%m%d_%H%M%S')
+            store.start_session(session, began.strftime(TIMESTAMP_FORMAT))
+            lines = ["# Gemini Screen Descriptions Log\n\n", f"**Started:** {began.strftime(TIMESTAMP_FORMAT)}\n\n", "---\n\n"]
+            for i in range(entries):
+                timestamp = (began + timedelta(seconds=10 * i)).strftime(TIMESTAMP_FORMAT)
+                lines.append(f"**{timestamp}:** {ENTRY_TEXT}\n\n")
+                store.record_description(session, {'timestamp': timestamp, 'text': ENTRY_TEXT})
+            with open(os.path.join(directory, f"descriptions_{session}.md"), 'w', encoding='utf-8') as f:
+                f.write("".join(lines))
+    store.flush()
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    sessions_per_day = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    entries = int(sys.argv[3]) if len(sys.argv) > 3 else 400
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ActivityStore(os.path.join(directory, "activity.sqlite3"))
+        write_history(directory, store, days, sessions_per_day, entries)
+        md_bytes = sum(os.path.getsize(p) for p in list_description_files(directory))
+
+        def parse_all():
+            return [e for path in list_description_files(directory) for e in parse_description_file(path)]
+
+        afternoon = ("2025-06-04 13:00:00", "2025-06-04 17:00:00")
+
+        def parse_range():
+            return [e for e in parse_all() if e['timestamp'] and afternoon[0] <= e['timestamp'] <= afternoon[1]]
+
+        md_all, md_entries = timed(parse_all)
+        db_all, db_entries = timed(lambda: store.descriptions())
+        md_range, md_hits = timed(parse_range)
+        db_range, db_hits = timed(lambda: store.descriptions(start=afternoon[0], end=afternoon[1]))
+        stats = store.stats()
+        store.close()
+
+    print(f"{days} days x {sessions_per_day} sessions x {entries} entries: {len(md_entries):,} descriptions")
+    print(f"markdown: {md_bytes / 1e6:.1f} MB in {days * sessions_per_day} files, "
+          f"store: {stats['file_bytes'] / 1e6:.1f} MB")
+    print(f"{'':<22} {'markdown':>10} {'store':>10}")
+    print(f"{'load whole week (ms)':<22} {md_all * 1000:>10.1f} {db_all * 1000:>10.1f}   ({len(db_entries):,} rows)")
+    print(f"{'load afternoon (ms)':<22} {md_range * 1000:>10.1f} {db_range * 1000:>10.1f}   "
+          f"({len(md_hits):,} / {len(db_hits):,} rows)")
+
+
+if __name__ == "__main__":
+    main()
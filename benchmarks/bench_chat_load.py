@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Load test: chat latency under concurrent users.
+
+Runs the chat app in-process with a stubbed model (fixed latency, no API key or
+network) and fires chats at it from 1, 10 and 100 concurrent clients. Prints
+p50/p99 latency, throughput and rejected/failed counts per level, so the effect
+of the concurrency limiter and retrieval cost can be seen without Gemini in the
+loop. With --stream the clients use /chat/stream and time-to-first-event is
+reported as well. The answer cache is off unless --cache is given, since the
+clients repeat a handful of questions.
+
+Usage: python benchmarks/bench_chat_load.py [--levels 1,10,100] [--requests 5]
+                                            [--latency 0.5] [--stream] [--cache]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+import contextlib
+
+import aiohttp
+from aiohttp.test_utils import TestServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # The index and watcher use the relative gemini_descriptions/ directory
+
+import p  # noqa: E402
+
+QUESTIONS = [
+    "What applications was I using?",
+    "What errors did I encounter?",
+    "What was I doing between 20:29 and 20:31?",
+    "Which files did I edit?",
+]
+
+
+class StubResponse:
+    def __init__(self, text, chunks=None):
+        self.text = text
+        self.usage_metadata = None
+        self._chunks = chunks or []
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for delay, chunk in self._chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+
+
+class StubModel:
+    """generate_content_async with a fixed latency; streams split it into a first chunk and the rest."""
+
+    def __init__(self, latency, first_chunk_fraction=0.3, pieces=5):
+        self.latency = latency
+        self.first_chunk_fraction = first_chunk_fraction
+        self.pieces = pieces
+
+    async def generate_content_async(self, prompt, stream=False):
+        answer = f"Stub answer for a {len(prompt):,} character prompt."
+        if not stream:
+            await asyncio.sleep(self.latency)
+            return StubResponse(answer)
+        first = self.latency * self.first_chunk_fraction
+        rest = (self.latency - first) / max(1, self.pieces - 1)
+        chunks = [(first, StubResponse(answer[:10]))]
+        chunks += [(rest, StubResponse(" ...")) for _ in range(self.pieces - 1)]
+        return StubResponse(answer, chunks)
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def one_chat(session, base_url, question, stream):
+    """Returns (ok, latency, first_event_latency)."""
+    start = time.perf_counter()
+    url = f"{base_url}/chat/stream" if stream else f"{base_url}/chat"
+    async with session.post(url, json={'message': question}) as response:
+        if response.status != 200:
+            await response.read()
+            return False, time.perf_counter() - start, None
+        if not stream:
+            data = await response.json()
+            ok = not data['response'].startswith("Error generating response")
+            return ok, time.perf_counter() - start, None
+        first_event = None
+        ok = False
+        async for line in response.content:
+            if first_event is None and line.startswith(b"data:"):
+                first_event = time.perf_counter() - start
+            if line.startswith(b"event: done"):
+                ok = True
+            elif line.startswith(b"event: error"):
+                ok = False
+        return ok, time.perf_counter() - start, first_event
+
+
+async def run_level(base_url, concurrency, requests_per_client, stream):
+    latencies, first_events = [], []
+    failures = 0
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=None)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        async def client(worker):
+            nonlocal failures
+            for i in range(requests_per_client):
+                question = QUESTIONS[(worker + i) % len(QUESTIONS)]
+                ok, latency, first_event = await one_chat(session, base_url, question, stream)
+                if not ok:
+                    failures += 1
+                    continue
+                latencies.append(latency)
+                if first_event is not None:
+                    first_events.append(first_event)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client(w) for w in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return latencies, first_events, failures, elapsed
+
+
+async def main_async(args):
+    bot = p.ActivityChatBot(model=StubModel(args.latency), max_concurrent_chats=args.max_concurrent,
+                            cache_answers=args.cache)
+    server = TestServer(bot.app)
+    await server.start_server()
+    base_url = str(server.make_url('')).rstrip('/')
+
+    header = f"{'clients':>8} {'chats':>6} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'chats/s':>8} {'failed':>7}"
+    if args.stream:
+        header += f" {'p50 first':>10} {'p99 first':>10}"
+    print(f"Stub model latency {args.latency * 1000:.0f} ms, limiter {bot.max_concurrent_chats} concurrent chats"
+          f", endpoint {'/chat/stream' if args.stream else '/chat'}")
+    print(header)
+
+    try:
+        for concurrency in args.levels:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):  # Per-chat logs
+                latencies, first_events, failures, elapsed = await run_level(
+                    base_url, concurrency, args.requests, args.stream)
+            done = len(latencies)
+            line = (f"{concurrency:>8} {done:>6} {percentile(latencies, 50) * 1000:>9.1f} "
+                    f"{percentile(latencies, 99) * 1000:>9.1f} {max(latencies, default=0) * 1000:>9.1f} "
+                    f"{done / elapsed:>8.1f} {failures:>7}")
+            if args.stream:
+                line += f" {percentile(first_events, 50) * 1000:>10.1f} {percentile(first_events, 99) * 1000:>10.1f}"
+            print(line)
+            if concurrency == 1 and latencies:
+                overhead = statistics.median(latencies) - args.latency
+                print(f"{'':>8} median overhead over the stub (retrieval, HTTP): {overhead * 1000:.1f} ms")
+        print(f"Chat counters: {bot.chat_stats()}")
+    finally:
+        await server.close()
+        bot.watcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--levels', default="1,10,100", type=lambda s: [int(x) for x in s.split(',')])
+    parser.add_argument('--requests', type=int, default=5, help="chats per client at each level")
+    parser.add_argument('--latency', type=float, default=0.5, help="stub model latency in seconds")
+    parser.add_argument('--max-concurrent', type=int, default=p.MAX_CONCURRENT_CHATS)
+    parser.add_argument('--stream', action='store_true', help="use /chat/stream and report time to first event")
+    parser.add_argument('--cache', action='store_true', help="enable the answer cache")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes uploaded per frame: full frames, dirty-rectangle crops, and
+crops replaced by OCR text deltas.
+
+Drives ScreenCapturer against a synthetic 2560x1440 desktop (a text-like
+editor background) where each step changes a small region: typing in one
+line, a terminal printing, occasionally a full window switch. Frames pass
+through FrameChangeDetector as in the server, so every run sends the same frames. The text run uses the
+dependency-free StubOCREngine, so its OCR time is not representative of tesseract.
+
+Prints avg bytes per frame (full vs. sent), cropped/text shares and time per frame.
+
+Usage: python benchmarks/bench_dirty_crop.py [frames]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw  # noqa: E402
+from capture import FrameChangeDetector, ScreenCapturer  # noqa: E402
+from text_delta import StubOCREngine, TextDeltaExtractor  # noqa: E402
+
+WIDTH, HEIGHT = 2560, 1440
+
+
+class SyntheticScreen:
+    """Stands in for an mss handle: grab() returns the current synthetic desktop."""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.monitors = [{'left': 0, 'top': 0, 'width': WIDTH, 'height': HEIGHT}] * 2
+        self.image = self._window()
+        self.step = 0
+
+    def _window(self):
+        img = Image.new("RGB", (WIDTH, HEIGHT), (30, 30, 36))
+        draw = ImageDraw.Draw(img)
+        for y in range(20, HEIGHT - 20, 22):
+            x = 40 + self.random.randrange(0, 200, 20)
+            draw.rectangle([x, y, x + self.random.randrange(200, 1400), y + 12],
+                           fill=tuple(self.random.randrange(120, 230) for _ in range(3)))
+        return img
+
+    def advance(self):
+        self.step += 1
+        draw = ImageDraw.Draw(self.image)
+        if self.step % 40 == 0:
+            self.image = self._window()  # Window switch
+        elif self.step % 3 == 0:
+            y = 1100 + (self.step % 12) * 22  # Terminal output
+            draw.rectangle([1400, y, 1400 + self.random.randrange(300, 1000), y + 12], fill=(90, 200, 90))
+        else:
+            x = 400 + (self.step % 60) * 12  # Typing on one line
+            draw.rectangle([x, 600, x + 10, 612], fill=(220, 220, 220))
+
+    def grab(self, monitor):
+        return self
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def raw(self):
+        return bytearray(self.image.convert("RGBA").tobytes("raw", "BGRA"))
+
+    def close(self):
+        pass
+
+
+def run(frames, crop, text):
+    capturer = ScreenCapturer(crop_to_changes=crop, full_frame_interval=float("inf"),
+                              text_delta=TextDeltaExtractor(StubOCREngine()) if text else None)
+    detector = FrameChangeDetector()
+    screen = SyntheticScreen()
+    capturer._sct = screen
+    elapsed = 0.0
+    incremental = []  # Bytes sent for frames that were not full frames (or would have been cropped)
+    for _ in range(frames):
+        screen.advance()
+        start = time.perf_counter()
+        frame = capturer.capture_sync()
+        if not detector.should_send(frame.signature):
+            elapsed += time.perf_counter() - start
+            continue
+        if capturer.text_delta and frame.crop is not None:
+            frame.text = capturer.text_delta.extract(frame)
+        elapsed += time.perf_counter() - start
+        if frame.crop is not None or (not crop and 0 < screen.step % 40):
+            incremental.append(frame.payload_size)
+        capturer.mark_sent(frame)
+    capturer._sct = None
+    capturer.close()
+    return capturer.stats(), elapsed / frames, sum(incremental) / max(1, len(incremental))
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    print(f"{frames} frames at {WIDTH}x{HEIGHT}")
+    print(f"{'':<10} {'full B/frame':>13} {'sent B/frame':>13} {'B/small edit':>13} {'saved':>7} "
+          f"{'cropped':>8} {'text':>5} {'ms/frame':>9}")
+    for name, crop, text in (('full', False, False), ('cropped', True, False), ('text', True, True)):
+        stats, seconds, per_edit = run(frames, crop, text)
+        print(f"{name:<10} {stats['avg_full_bytes']:>13,} {stats['avg_sent_bytes']:>13,} {per_edit:>13,.0f} "
+              f"{stats['bytes_saved_pct']:>6}% {stats['frames_cropped']:>8} {stats['frames_text']:>5} "
+              f"{seconds * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: frame encoding throughput per FrameEncoder mode and worker count.
+
+Each of N streams is a thread (like the capture worker or a peer's encode
+thread) encoding synthetic 2560x1440 BGRX desktops as fast as it can:
+scale to 1920 wide, JPEG (or WebP) encode, plus the signature and dirty grid
+the capture path needs. Inline runs the work on the stream's own thread;
+thread and process modes hand it to a shared pool (process mode through
+shared memory). Reports frames/s across all streams, ms per frame as seen by
+a stream, and process CPU (parent only; worker processes are not counted).
+
+On a single core every mode lands near the same number; the pools pay off
+when there are more cores than streams contending on the GIL.
+
+Usage: python benchmarks/bench_encoding.py [streams] [seconds] [workers] [format]
+       python benchmarks/bench_encoding.py 4 5 1,2,4 JPEG
+"""
+
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from capture import DIRTY_CELL, SIGNATURE_SIZE  # noqa: E402
+from encoding import FrameEncoder  # noqa: E402
+
+WIDTH, HEIGHT = 2560, 1440
+MAX_WIDTH = 1920
+
+
+def synthetic_frames(count, seed=0):
+    """Desktop-like BGRX buffers: flat background, rows of "text" and a changing window."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        pixels = np.full((HEIGHT, WIDTH, 4), 30, dtype=np.uint8)
+        for y in range(20, HEIGHT - 20, 22):
+            x = int(rng.integers(40, 240))
+            pixels[y:y + 12, x:x + int(rng.integers(200, 1400)), :3] = rng.integers(120, 230, 3, dtype=np.uint8)
+        pixels[400 + i * 10:800 + i * 10, 600:1400, :3] = rng.integers(0, 255, (400, 800, 3), dtype=np.uint8)
+        frames.append(bytearray(pixels.tobytes()))
+    return frames
+
+
+def run(encoder, frames, streams, seconds):
+    stop = time.perf_counter() + seconds
+    counts = [0] * streams
+    latencies = [[] for _ in range(streams)]
+
+    def stream(index):
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            encoder.encode(frames[counts[index] % len(frames)], (WIDTH, HEIGHT), "BGRX", quality=80,
+                           max_width=MAX_WIDTH, signature_size=SIGNATURE_SIZE, grid_cell=DIRTY_CELL)
+            latencies[index].append(time.perf_counter() - start)
+            counts[index] += 1
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    threads = [threading.Thread(target=stream, args=(i,)) for i in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - wall_start
+    all_latencies = sorted(latency for per_stream in latencies for latency in per_stream)
+    return {
+        'fps': sum(counts) / wall,
+        'p50_ms': all_latencies[len(all_latencies) // 2] * 1000 if all_latencies else 0.0,
+        'cpu': (time.process_time() - cpu_start) / wall,
+    }
+
+
+def main():
+    streams = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    worker_counts = [int(n) for n in (sys.argv[3] if len(sys.argv) > 3 else "1,2,4").split(",")]
+    image_format = sys.argv[4] if len(sys.argv) > 4 else "JPEG"
+    frames = synthetic_frames(8)
+
+    print(f"{streams} streams of {WIDTH}x{HEIGHT} -> {MAX_WIDTH} wide {image_format}, {seconds:g}s per run, "
+          f"{os.cpu_count()} cores")
+    print(f"{'mode':<8} {'workers':>7} {'frames/s':>9} {'p50 ms':>8} {'cpu':>6}")
+    configs = [('inline', 0)] + [(mode, n) for mode in ('thread', 'process') for n in worker_counts]
+    for mode, workers in configs:
+        encoder = FrameEncoder(mode, workers=workers or 1, image_format=image_format)
+        try:
+            result = run(encoder, frames, streams, seconds)
+        finally:
+            encoder.close()
+        print(f"{mode:<8} {workers or '-':>7} {result['fps']:>9.1f} {result['p50_ms']:>8.1f} {result['cpu']:>5.0%}")
+
+
+if __name__ == "__main__":
+    main()
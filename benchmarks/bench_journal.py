@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark: description write cost over a long session.
+
+Compares the old approach (rewrite the whole markdown file from the in-memory
+list on every description) with the append-only DescriptionJournal. Prints the
+mean per-entry write cost for each block of entries; the journal should stay
+flat while the full rewrite grows with session length.
+
+Usage: python benchmarks/bench_journal.py [entries] [block_size]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from journal import DescriptionJournal  # noqa: E402
+
+ENTRY_TEXT = "Okay, I'm looking at a code editor with a Python file open. " * 4
+LEGACY_LIMIT = 2000  # The full rewrite is quadratic; stop it early so the run finishes
+
+
+def rewrite_all(path, entries):
+    """The old save_description_to_files markdown write: regenerate everything."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# Gemini Screen Descriptions Log\n\n---\n\n")
+        for desc in entries:
+            f.write(f"**{desc['timestamp']}:** {desc['text']}\n\n")
+
+
+def bench_legacy(directory, entries, block_size):
+    path = os.path.join(directory, "legacy.md")
+    history = []
+    blocks = []
+    block_start = time.perf_counter()
+    for i in range(1, entries + 1):
+        history.append({'timestamp': '2025-05-31 20:29:22', 'text': ENTRY_TEXT})
+        rewrite_all(path, history)
+        if i % block_size == 0:
+            blocks.append((time.perf_counter() - block_start) / block_size)
+            block_start = time.perf_counter()
+    return blocks
+
+
+def bench_journal(directory, entries, block_size):
+    # Inline mode so the measured time includes the actual disk writes and fsyncs
+    journal = DescriptionJournal(directory, "bench", background=False).open()
+    blocks = []
+    block_start = time.perf_counter()
+    for i in range(1, entries + 1):
+        journal.append(ENTRY_TEXT, timestamp='2025-05-31 20:29:22')
+        if i % block_size == 0:
+            blocks.append((time.perf_counter() - block_start) / block_size)
+            block_start = time.perf_counter()
+    journal.close()
+    return blocks
+
+
+def bench_enqueue(directory, entries):
+    """Cost paid by the event loop with the background writer thread."""
+    journal = DescriptionJournal(directory, "bench_bg").open()
+    start = time.perf_counter()
+    for _ in range(entries):
+        journal.append(ENTRY_TEXT, timestamp='2025-05-31 20:29:22')
+    enqueue = (time.perf_counter() - start) / entries
+    drain_start = time.perf_counter()
+    journal.close()
+    return enqueue, time.perf_counter() - drain_start
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    block_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    with tempfile.TemporaryDirectory() as directory:
+        legacy_entries = min(entries, LEGACY_LIMIT)
+        legacy = bench_legacy(directory, legacy_entries, min(block_size, legacy_entries))
+        journal = bench_journal(directory, entries, block_size)
+        enqueue, drain = bench_enqueue(directory, entries)
+
+    print(f"Full rewrite ({legacy_entries} entries), mean cost per entry:")
+    for i, cost in enumerate(legacy, 1):
+        print(f"  entries {(i - 1) * min(block_size, legacy_entries) + 1:>6}-{i * min(block_size, legacy_entries):<6} {cost * 1e6:10.1f} us")
+
+    print(f"Append-only journal ({entries} entries), mean cost per entry:")
+    for i, cost in enumerate(journal, 1):
+        print(f"  entries {(i - 1) * block_size + 1:>6}-{i * block_size:<6} {cost * 1e6:10.1f} us")
+
+    if journal:
+        print(f"Journal growth, last block / first block: {journal[-1] / journal[0]:.2f}x")
+    print(f"Background writer: {enqueue * 1e6:.2f} us per append on the caller, {drain * 1e3:.1f} ms final drain")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event-loop delay caused by hot-path logging, per sink configuration.
+
+A producer coroutine logs like the send and receive loops do under load (a
+frame_sent line and several response_chunk lines per frame, with frame ids
+bound) at a fixed rate, while a 10ms ticker measures how late the event loop
+wakes it (loop lag). Configurations:
+
+- none: no sinks, the cost of the calls alone
+- sync: the previous setup, a DEBUG text file with rotation and zip
+  compression written on the calling thread (rotation shrunk so it happens
+  during the run)
+- enqueued: the same sinks plus the JSON sink, written on loguru's thread
+- enqueued+sampled: configure_logging() as server.py uses it
+- slow disk, sync / enqueued / enq+sampled: a sink that takes SLOW_WRITE per
+  record, standing in for a busy or network disk
+
+Reports loop lag p50/p99/max, average time per log call and lines written.
+
+Enqueueing alone is not free: loguru pickles each record onto a pipe, and
+when the writer falls behind the pipe fills and the log call blocks again.
+Sampling keeps the volume low enough that the writer thread stays ahead.
+
+Usage: python benchmarks/bench_logging.py [seconds] [frames_per_second] [chunks_per_frame]
+       python benchmarks/bench_logging.py 5 200 5
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger  # noqa: E402
+
+import logs  # noqa: E402
+
+TICK = 0.01
+SLOW_WRITE = 0.002  # seconds per record for the slow-disk sink
+ROTATION = "256 KB"  # Small enough that files rotate and get compressed during a run
+
+
+def count_lines(directory):
+    """Lines in the text and JSON logs, rotated (zipped) files included."""
+    total = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith(".zip"):
+            with zipfile.ZipFile(path) as archive:
+                total += sum(archive.read(member).count(b"\n") for member in archive.namelist())
+        elif name.endswith((".log", ".jsonl")):
+            with open(path, "rb") as f:
+                total += sum(1 for _ in f)
+    return total
+
+
+def slow_sink(path):
+    f = open(path, "a")
+
+    def write(message):
+        time.sleep(SLOW_WRITE)
+        f.write(message)
+    return write
+
+
+def setup(name, directory):
+    """Install the sinks for one configuration."""
+    logger.remove()
+    logger.configure(patcher=None)
+    log_file = os.path.join(directory, "server.log")
+    json_file = os.path.join(directory, "server.jsonl")
+    if name == "sync":
+        logger.add(log_file, level="DEBUG", format=logs.FILE_FORMAT, rotation=ROTATION, compression="zip")
+    elif name == "enqueued":
+        unsampled = logs.EventSampler(sampling={}, rate_limit=0)
+        logs.configure_logging(log_file, json_file, console_level="CRITICAL", sampler=unsampled)
+    elif name == "enqueued+sampled":
+        logs.configure_logging(log_file, json_file, console_level="CRITICAL")
+    elif name == "slow disk, sync":
+        logger.add(slow_sink(log_file), level="DEBUG", format=logs.FILE_FORMAT)
+    elif name == "slow disk, enqueued":
+        logger.add(slow_sink(log_file), level="DEBUG", format=logs.FILE_FORMAT, enqueue=True)
+    elif name == "slow disk, enq+sampled":
+        sampler = logs.EventSampler()
+        logger.configure(patcher=sampler)
+        logger.add(slow_sink(log_file), level="DEBUG", format=logs.FILE_FORMAT, enqueue=True, filter=sampler.keep)
+
+
+async def run(seconds, frames_per_second, chunks_per_frame):
+    lags = []
+    call_seconds = 0.0
+    calls = 0
+    stop = time.perf_counter() + seconds
+
+    async def ticker():
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - start - TICK)
+
+    async def producer():
+        nonlocal call_seconds, calls
+        frame = 0
+        while time.perf_counter() < stop:
+            frame += 1
+            frame_id = f"{frame:016x}"
+            start = time.perf_counter()
+            logger.bind(event="frame_sent", frame=frame_id, kind="full", bytes=48_213, send_ms=3.2).debug(
+                "Sent screen frame to Gemini (48,213 of 48,213 bytes, queue depth 1).")
+            for chunk in range(chunks_per_frame):
+                logger.bind(event="response_chunk", request_frame=frame_id, chars=64).debug(
+                    f"Gemini response chunk: the user is editing a Python file in a dark-themed editor {chunk}")
+            call_seconds += time.perf_counter() - start
+            calls += 1 + chunks_per_frame
+            await asyncio.sleep(1 / frames_per_second)
+
+    await asyncio.gather(ticker(), producer())
+    lags.sort()
+    return {
+        'p50': lags[len(lags) // 2] * 1000,
+        'p99': lags[int(len(lags) * 0.99)] * 1000,
+        'max': lags[-1] * 1000,
+        'call_us': call_seconds / calls * 1e6,
+        'offered': calls,
+    }
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    frames_per_second = float(sys.argv[2]) if len(sys.argv) > 2 else 200.0
+    chunks_per_frame = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    logs.LOG_ROTATION = ROTATION
+
+    print(f"{seconds:g}s per configuration, {frames_per_second:g} frames/s x {1 + chunks_per_frame} lines")
+    print(f"{'config':<22} {'lag p50':>8} {'p99 ms':>7} {'max ms':>7} {'us/call':>8} {'offered':>8} {'written':>8}")
+    configs = ("none", "sync", "enqueued", "enqueued+sampled", "slow disk, sync", "slow disk, enqueued",
+               "slow disk, enq+sampled")
+    for name in configs:
+        with tempfile.TemporaryDirectory() as directory:
+            setup(name, directory)
+            result = asyncio.run(run(seconds, frames_per_second, chunks_per_frame))
+            logger.remove()  # Drains enqueued sinks before counting
+            written = count_lines(directory)
+        print(f"{name:<22} {result['p50']:>8.2f} {result['p99']:>7.2f} {result['max']:>7.2f} "
+              f"{result['call_us']:>8.1f} {result['offered']:>8} {written:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Load test: how many concurrent remote screen sessions one host sustains.
+
+Each level starts N synthetic WebRTC video tracks (aiortc VideoStreamTrack
+subclasses drawing a 1280x720 "screen" whose content changes every frame),
+relays them unbuffered like server.py does, and runs a PeerSessionManager
+against a fake Live API that takes SEND_LATENCY per upload and answers each
+description request with a few streamed chunks. Nothing leaves the machine.
+
+Per level it reports the achieved sampling rate vs. the target, frames sent,
+encode time, event-loop lag (p99 of a 10ms ticker's overshoot) and process
+CPU. A level counts as sustained when every session gets >= 90% of its target
+samples and loop lag p99 stays under 100ms.
+
+Usage: python benchmarks/bench_peer_sessions.py [levels] [seconds] [sample_interval] [fps]
+       python benchmarks/bench_peer_sessions.py 1,2,4,8,16 20 1.0 15
+"""
+
+import os
+import sys
+import time
+import asyncio
+import fractions
+import tempfile
+import contextlib
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+from av import VideoFrame  # noqa: E402
+from aiortc import VideoStreamTrack  # noqa: E402
+from aiortc.contrib.media import MediaRelay  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from peer_sessions import PeerSessionManager  # noqa: E402
+
+WIDTH, HEIGHT = 1280, 720
+SEND_LATENCY = 0.02  # seconds per fake upload
+RESPONSE_CHUNKS = 4
+
+
+class SyntheticScreenTrack(VideoStreamTrack):
+    """A desktop-like frame with a moving cursor block and a terminal line that changes every frame."""
+
+    def __init__(self, seed, fps):
+        super().__init__()
+        self.fps = fps
+        self.count = 0
+        self.start = None
+        rng = np.random.default_rng(seed)
+        self.base = np.full((HEIGHT, WIDTH, 3), 32, dtype=np.uint8)
+        for y in range(20, HEIGHT - 40, 24):  # Lines of "text"
+            self.base[y:y + 12, 40:40 + int(rng.integers(200, 1100))] = rng.integers(120, 230, 3, dtype=np.uint8)
+
+    async def recv(self):
+        if self.start is None:
+            self.start = time.time()
+        self.count += 1
+        wait = self.start + self.count / self.fps - time.time()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        pixels = self.base.copy()
+        x = (self.count * 8) % (WIDTH - 40)
+        pixels[600:640, x:x + 40] = 250
+        pixels[HEIGHT - 30:HEIGHT - 18, 40:40 + (self.count * 37) % 1000] = (90, 200, 90)
+        frame = VideoFrame.from_ndarray(pixels, format="rgb24")
+        frame.pts = self.count
+        frame.time_base = fractions.Fraction(1, self.fps)
+        return frame
+
+
+class FakeLiveSession:
+    """Accepts uploads after SEND_LATENCY and streams a short description after each text request."""
+
+    def __init__(self):
+        self._responses = asyncio.Queue()
+
+    async def send_realtime_input(self, media=None, text=None):
+        await asyncio.sleep(SEND_LATENCY)
+        if text:
+            for i in range(RESPONSE_CHUNKS):
+                done = i == RESPONSE_CHUNKS - 1
+                self._responses.put_nowait(SimpleNamespace(
+                    text=f"chunk {i} of a screen description. ",
+                    server_content=SimpleNamespace(turn_complete=done)))
+
+    async def receive(self):
+        while True:
+            response = await self._responses.get()
+            yield response
+            if response.server_content.turn_complete:
+                return
+
+
+@contextlib.asynccontextmanager
+async def fake_connect():
+    yield FakeLiveSession()
+
+
+async def loop_lag(stop, samples):
+    """Overshoot of a 10ms sleep, a proxy for how long callbacks wait for the event loop."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        samples.append(time.perf_counter() - start - 0.01)
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+
+async def run_level(streams, seconds, sample_interval, fps, directory):
+    relay = MediaRelay()
+    sources = [SyntheticScreenTrack(i, fps) for i in range(streams)]
+    manager = PeerSessionManager(fake_connect, directory, "Describe the screen.", max_sessions=streams,
+                                 sample_interval=sample_interval)
+    stop = asyncio.Event()
+    lags = []
+    lag_task = asyncio.create_task(loop_lag(stop, lags))
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for i, source in enumerate(sources):
+        await manager.add(f"{i:08x}", relay.subscribe(source, buffered=False))
+    await asyncio.sleep(seconds)
+    sessions = list(manager.sessions.values())
+    sampled = [s.frames_sampled for s in sessions]
+    sent = sum(s.frames_sent for s in sessions)
+    encode = sum(s.encode_seconds for s in sessions)
+    descriptions = sum(s.assembler.turns_emitted for s in sessions)
+    cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+    stop.set()
+    await lag_task
+    await manager.close()
+    for source in sources:
+        source.stop()
+
+    expected = seconds / sample_interval
+    rate = min(sampled) / expected if expected else 0.0
+    lag_p99 = percentile(lags, 0.99)
+    return {
+        'streams': streams,
+        'rate': rate,
+        'sent': sent,
+        'descriptions': descriptions,
+        'encode_ms': encode / max(1, sum(sampled)) * 1000,
+        'lag_p99_ms': lag_p99 * 1000,
+        'cpu': cpu,
+        'sustained': rate >= 0.9 and lag_p99 < 0.1,
+    }
+
+
+async def main():
+    levels = [int(n) for n in (sys.argv[1] if len(sys.argv) > 1 else "1,2,4,8").split(",")]
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    sample_interval = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+    fps = int(sys.argv[4]) if len(sys.argv) > 4 else 15
+    logger.remove()  # Session start/stop logs would drown the table
+
+    print(f"{WIDTH}x{HEIGHT} tracks at {fps} fps, one sample per {sample_interval}s, {seconds:g}s per level")
+    print(f"{'streams':>7} {'min rate':>9} {'sent':>6} {'descr':>6} {'encode ms':>10} {'lag p99 ms':>11} {'cpu':>6}  sustained")
+    with tempfile.TemporaryDirectory() as directory:
+        best = 0
+        for streams in levels:
+            result = await run_level(streams, seconds, sample_interval, fps, directory)
+            print(f"{result['streams']:>7} {result['rate']:>8.0%} {result['sent']:>6} {result['descriptions']:>6} "
+                  f"{result['encode_ms']:>10.1f} {result['lag_p99_ms']:>11.1f} {result['cpu']:>5.0%}  "
+                  f"{'yes' if result['sustained'] else 'no'}")
+            if result['sustained']:
+                best = streams
+    print(f"Highest sustained level: {best} concurrent streams")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Soak test: memory across many WebRTC connect/disconnect cycles through PeerRegistry.
+
+Each cycle connects a client RTCPeerConnection (a small synthetic video track
+plus a datachannel) to a server-side PeerRegistry in the same process, waits
+until the server has decoded a frame through the peer's relay and answered a
+ping, then disconnects it. Cycles alternate between the client closing
+cleanly and the client vanishing without closing, which the server only
+notices through its idle/heartbeat timeouts (shortened here so the test
+finishes). Every report interval it prints live peers, Python heap
+(tracemalloc) and RSS; both should level off after warm-up instead of growing
+with the cycle count.
+
+Usage: python benchmarks/bench_peer_soak.py [cycles] [concurrency] [report_every]
+       python benchmarks/bench_peer_soak.py 2000 8 200
+"""
+
+import os
+import sys
+import gc
+import time
+import asyncio
+import fractions
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from av import VideoFrame  # noqa: E402
+from aiortc import RTCPeerConnection, VideoStreamTrack  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from peers import PeerRegistry  # noqa: E402
+
+IDLE_TIMEOUT = 2.0  # Shortened so vanished clients are evicted within the run
+HEARTBEAT_TIMEOUT = 2.0
+
+
+class TinyTrack(VideoStreamTrack):
+    """A 160x120 frame at 10 fps; content does not matter, only that frames flow."""
+
+    def __init__(self):
+        super().__init__()
+        self.pixels = np.zeros((120, 160, 3), dtype=np.uint8)
+        self.count = 0
+
+    async def recv(self):
+        await asyncio.sleep(0.1)
+        self.count += 1
+        frame = VideoFrame.from_ndarray(self.pixels, format="rgb24")
+        frame.pts = self.count
+        frame.time_base = fractions.Fraction(1, 10)
+        return frame
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+class Server:
+    """The server side: a registry whose peers read their video through the per-peer relay."""
+
+    def __init__(self):
+        self.readers = {}
+        self.frames = {}
+        self.registry = PeerRegistry(max_peers=10_000, idle_timeout=IDLE_TIMEOUT, heartbeat_interval=0.5,
+                                     heartbeat_timeout=HEARTBEAT_TIMEOUT, sweep_interval=0.5,
+                                     on_track=self.on_track, on_close=self.on_close)
+
+    def on_track(self, peer, track):
+        if track.kind == "video":
+            self.frames[peer.peer_id] = asyncio.Event()
+            self.readers[peer.peer_id] = asyncio.ensure_future(self.read(peer, peer.relay.subscribe(track, buffered=False)))
+
+    async def read(self, peer, track):
+        try:
+            while True:
+                await track.recv()
+                self.frames[peer.peer_id].set()
+        except Exception:
+            pass
+        finally:
+            track.stop()
+
+    async def on_close(self, peer):
+        reader = self.readers.pop(peer.peer_id, None)
+        if reader:
+            reader.cancel()
+            await asyncio.gather(reader, return_exceptions=True)
+        self.frames.pop(peer.peer_id, None)
+
+
+async def cycle(server, index):
+    client = RTCPeerConnection()
+    track = TinyTrack()
+    client.addTrack(track)
+    channel = client.createDataChannel("chat")
+    pong = asyncio.Event()
+    channel.on("message", lambda message: pong.set() if message.startswith("pong") else None)
+    channel.on("open", lambda: channel.send("ping 0"))
+    await client.setLocalDescription(await client.createOffer())
+    peer = await server.registry.accept(client.localDescription, f"{index:08x}")
+    await client.setRemoteDescription(peer.pc.localDescription)
+    try:
+        await asyncio.wait_for(asyncio.gather(pong.wait(), server.frames[peer.peer_id].wait()), timeout=10)
+    except (asyncio.TimeoutError, KeyError):
+        pass
+    if index % 2 == 0:
+        await client.close()  # Clean disconnect
+    else:
+        # Vanish: stop sending without closing; only the server's timeouts can clean this up
+        track.stop()
+        channel.remove_all_listeners()
+        await asyncio.sleep(IDLE_TIMEOUT + HEARTBEAT_TIMEOUT)
+        await client.close()
+
+
+async def main():
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    report_every = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+    logger.remove()  # One line per state change would drown the table
+    tracemalloc.start()
+    server = Server()
+    server.registry.start()
+
+    print(f"{cycles} connect/disconnect cycles, {concurrency} at a time")
+    print(f"{'cycles':>7} {'live':>5} {'closed':>30} {'heap MB':>8} {'rss MB':>7} {'s':>6}")
+    start = time.perf_counter()
+    pending = iter(range(cycles))
+    done = 0
+
+    async def worker():
+        nonlocal done
+        for index in pending:
+            await cycle(server, index)
+            done += 1
+            if done % report_every == 0:
+                gc.collect()
+                heap = tracemalloc.get_traced_memory()[0] / 1024 ** 2
+                closed = ", ".join(f"{k}={v}" for k, v in sorted(server.registry.closed.items()))
+                print(f"{done:>7} {len(server.registry):>5} {closed:>30} {heap:>8.1f} {rss_mb():>7.1f} "
+                      f"{time.perf_counter() - start:>6.0f}")
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    await asyncio.sleep(IDLE_TIMEOUT + 2)  # Let the last evictions happen
+    gc.collect()
+    print(f"after drain: live peers {len(server.registry)}, readers {len(server.readers)}, "
+          f"heap {tracemalloc.get_traced_memory()[0] / 1024 ** 2:.1f} MB, rss {rss_mb():.1f} MB")
+    await server.registry.close_all()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-question prompt cost with and without the shared context prefix.
+
+The old prompt rebuilt instructions + relevant chunks + newest-session tail
+for every question and sent all of it. With ContextPrefixCache the
+instructions and tail are built once per context version; a question only
+builds (and, with provider context caching, only sends) its own part.
+
+Prints mean prompt build time and input tokens per question for both, using
+the real index in gemini_descriptions/ and no model calls.
+
+Usage: python benchmarks/bench_prompt_prefix.py [rounds]
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from activity_index import ActivityIndex, estimate_tokens, format_chunks  # noqa: E402
+from prompt_prefix import ContextPrefixCache, LocalPrefixBackend, SYSTEM_INSTRUCTIONS  # noqa: E402
+
+QUESTIONS = [
+    "What applications was I using?",
+    "What errors did I encounter?",
+    "Which files did I edit?",
+    "What was the main focus of my development work?",
+    "What API endpoints was I testing?",
+]
+TOP_K = 8
+RECENT_CHARS = 6000
+
+
+def legacy_prompt(index, question):
+    """The per-question prompt before the prefix: everything rebuilt and sent every time."""
+    relevant = index.search(question, k=TOP_K)
+    recent = index.recent(max_chars=RECENT_CHARS)
+    recent_keys = {(c['session'], c['position']) for c in recent}
+    relevant = [c for c in relevant if (c['session'], c['position']) not in recent_keys]
+    context = ("Most relevant excerpts (all sessions):\n\n" + format_chunks(relevant)
+               + "\n\n---\n\nMost recent activity:\n\n" + format_chunks(recent))
+    return f"{SYSTEM_INSTRUCTIONS}\n\nCONTEXT - Screen Activity Descriptions:\n{context}\n\nUSER QUESTION: {question}\n"
+
+
+def prefixed_prompt(index, prefix_cache, question):
+    prefix, since = prefix_cache.current()
+    skip = prefix.keys | {(c['session'], int(c['position'])) for c in since}
+    relevant = [c for c in index.search(question, k=TOP_K) if (c['session'], int(c['position'])) not in skip]
+    context = "Most relevant excerpts (all sessions):\n\n" + format_chunks(relevant)
+    return prefix, f"\n{context}\n\nUSER QUESTION: {question}\n"
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    index = ActivityIndex()
+    index.refresh()
+    prefix_cache = ContextPrefixCache(index, LocalPrefixBackend(model=None), context_chars=RECENT_CHARS)
+
+    legacy_tokens = 0
+    start = time.perf_counter()
+    for i in range(rounds):
+        legacy_tokens += estimate_tokens(legacy_prompt(index, QUESTIONS[i % len(QUESTIONS)]))
+    legacy_seconds = time.perf_counter() - start
+
+    question_tokens = prefix_tokens = 0
+    start = time.perf_counter()
+    for i in range(rounds):
+        prefix, prompt = prefixed_prompt(index, prefix_cache, QUESTIONS[i % len(QUESTIONS)])
+        question_tokens += estimate_tokens(prompt)
+        prefix_tokens += prefix.tokens
+    prefixed_seconds = time.perf_counter() - start
+
+    print(f"{rounds} questions against {index.stats()['chunks']} indexed chunks")
+    print(f"{'':<28} {'build ms':>9} {'tokens sent':>12} {'tokens cached':>14}")
+    print(f"{'full prompt per question':<28} {legacy_seconds / rounds * 1000:>9.3f} {legacy_tokens // rounds:>12,} {0:>14,}")
+    print(f"{'shared prefix (local)':<28} {prefixed_seconds / rounds * 1000:>9.3f} "
+          f"{(question_tokens + prefix_tokens) // rounds:>12,} {0:>14,}")
+    print(f"{'shared prefix (provider)':<28} {prefixed_seconds / rounds * 1000:>9.3f} "
+          f"{question_tokens // rounds:>12,} {prefix_tokens // rounds:>14,}")
+    print(f"Prefix stats: {prefix_cache.stats()}")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end run: the real server pipeline against replayed frames and responses.
+
+Runs server.run_gemini_screen_interaction (capture, change detection, queue,
+send, receive, turn assembly, journal) for a fixed time with
+CAPTURE_SOURCE="replay" and LIVE_BACKEND="replay": frames come from saved
+captures (or synthetic ones generated into a temp directory when there are
+none) and responses from a recorded session, streamed with its recorded
+timing. Nothing touches the screen, the network or the API, and the jitter
+is seeded, so two runs with the same arguments should report the same
+numbers give or take scheduling noise. Server side effects (frames,
+descriptions) land in a temporary directory.
+
+Reports frames sent, descriptions, first/final chunk latency percentiles,
+frame age at send and the replay server's counters.
+
+Usage: python benchmarks/bench_replay.py [seconds] [responses] [frames_dir] [capture_interval]
+       python benchmarks/bench_replay.py 30 server_logs_20250531_202921.log captured_frames 2
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+from PIL import Image as PILImage  # noqa: E402
+
+WIDTH, HEIGHT = 1280, 720
+SYNTHETIC_FRAMES = 12
+
+
+def synthetic_frames(directory, count=SYNTHETIC_FRAMES, seed=0):
+    """Saved-frame lookalikes: a desktop whose main window changes completely every frame."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 1, 1, 12, 0, 0)
+    os.makedirs(directory, exist_ok=True)
+    for i in range(count):
+        pixels = np.full((HEIGHT, WIDTH, 3), 30, dtype=np.uint8)
+        for y in range(20, HEIGHT - 20, 22):
+            x = int(rng.integers(40, 240))
+            pixels[y:y + 12, x:x + int(rng.integers(200, 900))] = rng.integers(120, 230, 3, dtype=np.uint8)
+        pixels[100:620, 300:1000] = rng.integers(0, 255, 3, dtype=np.uint8)
+        name = f"frame_{(start + timedelta(seconds=i)).strftime('%Y%m%d_%H%M%S_%f')[:-3]}.jpg"
+        PILImage.fromarray(pixels).save(os.path.join(directory, name), quality=80)
+    return directory
+
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+async def run(server, seconds):
+    app = {}
+    records = []
+    save = server._save_assembled_turn
+
+    def collect(record):
+        records.append(record)
+        save(record)
+
+    server._save_assembled_turn = collect
+    task = asyncio.create_task(server.run_gemini_screen_interaction(app))
+    await asyncio.sleep(seconds)
+    app["gemini_streaming_task_running"] = False
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    server._save_assembled_turn = save
+    return app, records
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 30.0
+    responses = os.path.abspath(sys.argv[2] if len(sys.argv) > 2 else os.path.join(ROOT, "server_logs_20250531_202921.log"))
+    frames_dir = os.path.abspath(sys.argv[3]) if len(sys.argv) > 3 else os.path.join(ROOT, "captured_frames")
+    interval = float(sys.argv[4]) if len(sys.argv) > 4 else 2.0  # server.py's SCREEN_CAPTURE_INTERVAL
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)  # server.py creates its frame and description directories relative to the cwd
+        from replay import list_frames
+        if not os.path.isdir(frames_dir) or not list_frames(frames_dir):
+            frames_dir = synthetic_frames(os.path.join(directory, "replay_frames"))
+
+        from loguru import logger
+        logger.remove()  # Per-frame lines would drown the report
+        import server
+        server.LIVE_BACKEND = "replay"
+        server.REPLAY_SOURCE = responses
+        server.CAPTURE_SOURCE = "replay"
+        server.REPLAY_FRAMES_DIR = frames_dir
+        server.ADAPTIVE_CAPTURE = False  # A fixed interval keeps runs comparable
+        server.SCREEN_CAPTURE_INTERVAL = interval
+        server.SAVE_FRAMES = False
+
+        print(f"{seconds:g}s replaying {os.path.basename(responses)} against "
+              f"{len(list_frames(frames_dir))} frames from {frames_dir}, capture every {interval:g}s")
+        app, records = asyncio.run(run(server, seconds))
+
+        first = [record['first_chunk_latency'] for record in records if 'first_chunk_latency' in record]
+        final = [record['last_chunk_latency'] for record in records if 'last_chunk_latency' in record]
+        timings = app['screen_capturer'].timer.summary()
+        print(f"{'frames sent':<24} {app['frame_change_detector'].frames_sent}")
+        print(f"{'descriptions':<24} {len(records)}")
+        for label, values in (("first chunk s", first), ("final chunk s", final)):
+            p50, p95 = percentile(values, 0.5), percentile(values, 0.95)
+            print(f"{label:<24} p50 {p50 if p50 is not None else '-'}  p95 {p95 if p95 is not None else '-'}")
+        if 'frame_age' in timings:
+            print(f"{'frame age ms':<24} avg {timings['frame_age']['avg_ms']}  max {timings['frame_age']['max_ms']}")
+        print(f"{'replay server':<24} {json.dumps(app['replay_server'].stats())}")
+        app['screen_capturer'].close()
+        app['frame_encoder'].close()
+        os.chdir(ROOT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+"""
+Screen capture helpers for the Gemini streaming loop.
+
+ScreenCapturer owns one mss handle on a dedicated worker thread and encodes
+each frame once (a FrameEncoder from encoding.py: on that thread, or on a
+thread or process pool); the same JPEG (or WebP) bytes are sent to Gemini and
+handed to the FrameStore (frame_store.py), which writes them off the capture
+thread. The
+capture target is one monitor, all monitors or a fixed region, and with
+cropping enabled only the bounding box of what changed since the last sent
+frame is uploaded (an extra, much smaller encode), or with a TextDeltaExtractor
+(text_delta.py) just the text that changed in it. FrameChangeDetector
+compares a tiny grayscale thumbnail of each captured frame with the last frame
+that was actually sent, so unchanged screens are not uploaded again and
+description prompts are only sent after a real change.
+"""
+
+import time
+import hashlib
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image as PILImage, ImageChops
+import mss
+from loguru import logger
+
+import metrics
+from encoding import FrameEncoder
+
+JPEG_QUALITY = 80  # Single encode shared by saved frames and Gemini uploads
+
+# --- Change detection defaults ---
+SIGNATURE_SIZE = (64, 64)  # Thumbnail compared between frames
+PIXEL_DIFF_THRESHOLD = 24  # 0-255 grayscale delta for a thumbnail pixel to count as changed
+FRAME_CHANGE_THRESHOLD = 0.002  # Fraction of changed pixels needed to send a frame
+DESCRIPTION_CHANGE_THRESHOLD = 0.02  # Fraction changed since the last description to ask for a new one
+DESCRIPTION_MIN_FRAMES = 3  # Frames sent between description requests (the old fixed cadence)
+FORCE_SEND_INTERVAL = 60.0  # seconds; send a frame anyway so the session still sees the screen
+
+# --- Capture target and dirty-rectangle cropping defaults ---
+CAPTURE_TARGET = 1  # "all" (every monitor), a monitor number (1 = primary) or an ROI (left, top, width, height)
+DIRTY_CELL = 16  # Pixels per cell of the grid compared to find the changed region
+CROP_MARGIN = 32  # Pixels of context kept around the changed region
+CROP_MAX_AREA = 0.5  # Send the full frame when the changed region covers more than this fraction
+FULL_FRAME_INTERVAL = 30.0  # seconds; send an uncropped frame at least this often
+
+
+def frame_signature(img):
+    """Downsampled grayscale thumbnail used for cheap frame comparisons."""
+    return img.convert("L").resize(SIGNATURE_SIZE, PILImage.BILINEAR)
+
+
+def dirty_box(previous, current, pixel_threshold=PIXEL_DIFF_THRESHOLD):
+    """Bounding box (left, top, right, bottom) of changed cells between two grayscale grids, or None."""
+    if previous is None or previous.size != current.size:
+        return None
+    diff = ImageChops.difference(previous, current)
+    mask = diff.point([0] * (pixel_threshold + 1) + [255] * (255 - pixel_threshold))
+    return mask.getbbox()
+
+
+def resolve_target(monitors, target):
+    """mss region for a capture target: "all", a monitor number or (left, top, width, height)."""
+    if target == "all":
+        return monitors[0]  # The virtual screen spanning every monitor
+    if isinstance(target, int):
+        if not 0 <= target < len(monitors):
+            raise ValueError(f"Monitor {target} not found ({len(monitors) - 1} monitors attached)")
+        return monitors[target]
+    if isinstance(target, dict):
+        return target
+    left, top, width, height = target
+    return {'left': left, 'top': top, 'width': width, 'height': height}
+
+
+def frame_hash(jpeg):
+    """Short content hash of the encoded frame (identifies identical frames across records)."""
+    return hashlib.blake2b(jpeg, digest_size=8).hexdigest()
+
+
+def crop_caption(frame):
+    """Text sent ahead of a cropped upload so the model knows where the region sits on the screen."""
+    left, top, right, bottom = frame.crop
+    return (f"Screen region update: the next image is only the region x={left}-{right}, y={top}-{bottom} "
+            f"of the {frame.width}x{frame.height} screen; everything outside it is unchanged.")
+
+
+def changed_fraction(previous, current, pixel_threshold=PIXEL_DIFF_THRESHOLD):
+    """Fraction of signature pixels whose grayscale value moved more than pixel_threshold."""
+    if previous is None or previous.size != current.size:
+        return 1.0
+    diff = ImageChops.difference(previous, current)
+    histogram = diff.histogram()
+    changed = sum(histogram[pixel_threshold + 1:])
+    return changed / (current.size[0] * current.size[1])
+
+
+class FrameChangeDetector:
+    """Decides which captured frames are worth sending and when to ask for a description."""
+
+    def __init__(self, frame_threshold=FRAME_CHANGE_THRESHOLD,
+                 description_threshold=DESCRIPTION_CHANGE_THRESHOLD,
+                 description_min_frames=DESCRIPTION_MIN_FRAMES,
+                 pixel_threshold=PIXEL_DIFF_THRESHOLD,
+                 force_send_interval=FORCE_SEND_INTERVAL):
+        self.frame_threshold = frame_threshold
+        self.description_threshold = description_threshold
+        self.description_min_frames = description_min_frames
+        self.pixel_threshold = pixel_threshold
+        self.force_send_interval = force_send_interval
+
+        self.frames_captured = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.description_requests = 0
+        self.last_change = 0.0  # Changed fraction of the most recent capture
+
+        self._last_sent = None  # Signature of the last frame sent
+        self._last_sent_time = 0.0
+        self._last_described = None  # Signature at the last description request
+        self._frames_since_description = 0
+
+    def should_send(self, signature):
+        """Record a captured frame; True if it differs enough from the last sent one."""
+        self.frames_captured += 1
+        self.last_change = changed_fraction(self._last_sent, signature, self.pixel_threshold)
+        stale = time.monotonic() - self._last_sent_time >= self.force_send_interval
+        if self.last_change < self.frame_threshold and not stale:
+            self.frames_skipped += 1
+            return False
+
+        self.frames_sent += 1
+        self._last_sent = signature
+        self._last_sent_time = time.monotonic()
+        self._frames_since_description += 1
+        return True
+
+    def should_describe(self):
+        """True if the screen changed significantly since the last description request."""
+        if self._last_sent is None or self._frames_since_description < self.description_min_frames:
+            return False
+        change = changed_fraction(self._last_described, self._last_sent, self.pixel_threshold)
+        if change < self.description_threshold:
+            return False
+
+        self.description_requests += 1
+        self._last_described = self._last_sent
+        self._frames_since_description = 0
+        return True
+
+    def stats(self):
+        return {
+            'frames_captured': self.frames_captured,
+            'frames_sent': self.frames_sent,
+            'frames_skipped': self.frames_skipped,
+            'description_requests': self.description_requests,
+            'last_change': round(self.last_change, 4),
+        }
+
+
+class StageTimer:
+    """Running count/total/max/last of per-stage durations (capture, encode, send, ...)."""
+
+    def __init__(self):
+        self._stages = {}
+
+    def record(self, stage, seconds):
+        entry = self._stages.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+        entry['count'] += 1
+        entry['total'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+        entry['last'] = seconds
+        metrics.STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+    def summary(self):
+        """Per-stage timings in milliseconds."""
+        return {
+            stage: {
+                'count': entry['count'],
+                'avg_ms': round(entry['total'] / entry['count'] * 1000, 2),
+                'max_ms': round(entry['max'] * 1000, 2),
+                'last_ms': round(entry['last'] * 1000, 2),
+            }
+            for stage, entry in self._stages.items()
+        }
+
+
+class CapturedFrame:
+    """One encoded screen frame plus what the pipeline needs to know about it."""
+
+    __slots__ = ('jpeg', 'width', 'height', 'signature', 'captured_at', 'path', 'change', 'hash',
+                 'grid', 'crop', 'payload', 'image', 'text', 'mime_type')
+
+    def __init__(self, jpeg, width, height, signature, captured_at, path=None, grid=None, crop=None, payload=None,
+                 image=None, mime_type="image/jpeg"):
+        self.jpeg = jpeg  # Encoded full frame, used for the saved file (and the upload when not cropped)
+        self.hash = frame_hash(jpeg)
+        self.width = width
+        self.height = height
+        self.signature = signature
+        self.captured_at = captured_at  # time.time() of the grab
+        self.path = path  # Saved frame file, set by the FrameStore
+        self.change = 1.0  # Changed fraction vs. the previously sent frame
+        self.grid = grid  # Grayscale grid for dirty-rectangle detection
+        self.crop = crop  # (left, top, right, bottom) of the uploaded region, None for the full frame
+        self.payload = payload or jpeg  # Bytes uploaded to Gemini
+        self.image = image  # The (scaled) PIL image, kept only for the OCR pre-pass
+        self.text = None  # Text update sent instead of the image, if the OCR pre-pass produced one
+        self.mime_type = mime_type  # Of jpeg and payload (image/jpeg unless the encoder writes WebP)
+
+    @property
+    def size(self):
+        return len(self.jpeg)
+
+    @property
+    def payload_size(self):
+        return len(self.text.encode('utf-8')) if self.text else len(self.payload)
+
+
+class ScreenCapturer:
+    """Persistent capture worker: one thread, one mss handle, one full-frame encode per frame."""
+
+    def __init__(self, target=CAPTURE_TARGET, jpeg_quality=JPEG_QUALITY, timer=None, crop_to_changes=False,
+                 crop_margin=CROP_MARGIN, crop_max_area=CROP_MAX_AREA, full_frame_interval=FULL_FRAME_INTERVAL,
+                 pixel_threshold=PIXEL_DIFF_THRESHOLD, text_delta=None, encoder=None, source=None):
+        # sct.monitors[0] is the entire virtual screen, [1] is the primary monitor
+        self.target = target
+        self.jpeg_quality = jpeg_quality
+        self.scale = 1.0  # Downscale factor applied before encoding (set by the adaptive controller)
+        self.native_size = None  # Monitor resolution of the last grab
+        self.timer = timer or StageTimer()
+        self.crop_to_changes = crop_to_changes
+        self.crop_margin = crop_margin
+        self.crop_max_area = crop_max_area
+        self.full_frame_interval = full_frame_interval
+        self.pixel_threshold = pixel_threshold
+        self.text_delta = text_delta  # Optional TextDeltaExtractor (needs crop_to_changes)
+        self.encoder = encoder or FrameEncoder('inline')  # Resize + encode; inline runs on the capture thread
+        self.source = source or mss.mss  # () -> mss-compatible handle (replay.ReplayFrameSource for offline runs)
+
+        # What Gemini has seen: grid of the last sent frame (written by the send loop, read on the capture thread)
+        self._reference = None
+        self._last_full_sent = 0.0
+        self.frames_sent = 0
+        self.frames_cropped = 0
+        self.frames_text = 0
+        self.full_bytes = 0  # Uncropped JPEG bytes of the frames sent
+        self.payload_bytes = 0  # Bytes actually uploaded
+        # mss handles are bound to the thread that created them, so all grabs happen on this one
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screen-capture")
+        self._sct = None
+
+    async def capture(self):
+        """Grab and encode one frame on the worker thread. Returns a CapturedFrame or None."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.capture_sync)
+
+    def capture_sync(self):
+        try:
+            if self._sct is None:
+                self._sct = self.source()
+            monitor = resolve_target(self._sct.monitors, self.target)
+
+            start = time.perf_counter()
+            sct_img = self._sct.grab(monitor)
+            captured_at = time.time()
+            # Hand the raw BGRA buffer over directly instead of building mss's RGB copy first
+            pixels = sct_img.raw
+            self.native_size = sct_img.size
+            grabbed = time.perf_counter()
+            self.timer.record('capture', grabbed - start)
+
+            encoded = self.encoder.encode(pixels, sct_img.size, "BGRX", quality=self.jpeg_quality, scale=self.scale,
+                                          signature_size=SIGNATURE_SIZE,
+                                          grid_cell=DIRTY_CELL if self.crop_to_changes else None,
+                                          keep_image=self.text_delta is not None)
+            encode_done = time.perf_counter()
+            self.timer.record('encode', encode_done - grabbed)
+
+            crop = payload = None
+            if self.crop_to_changes:
+                crop = self._crop_box(encoded.grid, (encoded.width, encoded.height))
+                if crop:
+                    payload = self.encoder.encode(pixels, sct_img.size, "BGRX", quality=self.jpeg_quality,
+                                                  scale=self.scale, region=crop).data
+                self.timer.record('crop', time.perf_counter() - encode_done)
+
+            return CapturedFrame(encoded.data, encoded.width, encoded.height, encoded.signature, captured_at,
+                                 grid=encoded.grid, crop=crop, payload=payload, image=encoded.image,
+                                 mime_type=encoded.mime_type)
+        except Exception as e:
+            logger.error(f"Error capturing screen: {e}")
+            # Drop the handle; it is recreated on the next capture (e.g. after a display change)
+            self._close_handle()
+            return None
+
+    def _crop_box(self, grid, size):
+        """Pixel box around what changed since the last sent frame, or None to send the full frame."""
+        reference = self._reference
+        if reference is None or time.monotonic() - self._last_full_sent >= self.full_frame_interval:
+            return None
+        box = dirty_box(reference, grid, self.pixel_threshold)
+        if box is None:
+            return None  # Nothing changed (a forced resend): send the whole screen
+        width, height = size
+        left = max(0, box[0] * DIRTY_CELL - self.crop_margin)
+        top = max(0, box[1] * DIRTY_CELL - self.crop_margin)
+        right = min(width, box[2] * DIRTY_CELL + self.crop_margin)
+        bottom = min(height, box[3] * DIRTY_CELL + self.crop_margin)
+        if (right - left) * (bottom - top) > self.crop_max_area * width * height:
+            return None
+        return (left, top, right, bottom)
+
+    def uncrop_if_stale(self, frame):
+        """Send a queued crop as the full frame when the session it was cut for has been replaced."""
+        if frame.crop is not None and self._reference is None:
+            frame.crop = None
+            frame.payload = frame.jpeg
+
+    def mark_sent(self, frame):
+        """Record a frame Gemini received; later crops are relative to it."""
+        self.frames_sent += 1
+        self.full_bytes += frame.size
+        self.payload_bytes += frame.payload_size
+        if frame.text:
+            self.frames_text += 1
+        elif frame.crop is None:
+            self._last_full_sent = time.monotonic()
+        else:
+            self.frames_cropped += 1
+        if frame.grid is not None:
+            self._reference = frame.grid
+        if self.text_delta:
+            self.text_delta.mark_sent(frame)
+        frame.image = None  # Only needed until it becomes the OCR reference
+
+    def request_full_frame(self):
+        """Send the next frame uncropped (e.g. a new Gemini session has seen nothing yet)."""
+        self._reference = None
+        if self.text_delta:
+            self.text_delta.reset()
+
+    def stats(self):
+        """Capture target and bytes per sent frame before (full frame) and after cropping."""
+        sent = self.frames_sent
+        return {
+            'target': self.target if not isinstance(self.target, tuple) else list(self.target),
+            'native_size': list(self.native_size) if self.native_size else None,
+            'crop_to_changes': self.crop_to_changes,
+            'encoder': self.encoder.stats(),
+            'frames_sent': sent,
+            'frames_cropped': self.frames_cropped,
+            'frames_text': self.frames_text,
+            'avg_full_bytes': round(self.full_bytes / sent) if sent else None,
+            'avg_sent_bytes': round(self.payload_bytes / sent) if sent else None,
+            'bytes_saved_pct': round((1 - self.payload_bytes / self.full_bytes) * 100, 1) if self.full_bytes else None,
+            **({'text_delta': self.text_delta.stats()} if self.text_delta else {}),
+        }
+
+    def close(self):
+        """Release the mss handle and stop the worker thread."""
+        try:
+            self._executor.submit(self._close_handle).result(timeout=5)
+        except Exception as e:
+            logger.warning(f"Error closing screen capturer: {e}")
+        self._executor.shutdown(wait=False)
+
+    def _close_handle(self):
+        if self._sct is not None:
+            try:
+                self._sct.close()
+            finally:
+                self._sct = None
+
+
+class FrameQueue:
+    """Bounded frame hand-off between capture and send; when full the oldest frame is dropped."""
+
+    def __init__(self, maxsize=2):
+        self.maxsize = maxsize
+        self._frames = deque()
+        self._ready = asyncio.Event()
+        self.enqueued = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put_latest(self, frame):
+        """Enqueue without blocking; stale frames are discarded to make room (latest frame wins)."""
+        self._frames.append(frame)
+        self.enqueued += 1
+        self._trim()
+        self.max_depth = max(self.max_depth, len(self._frames))
+        self._ready.set()
+
+    def put_back(self, frame):
+        """Return a frame that could not be sent to the front of the queue; it goes out next."""
+        self._frames.appendleft(frame)
+        self._trim(keep_first=True)
+        self._ready.set()
+
+    async def get(self):
+        while not self._frames:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._frames.popleft()
+
+    def set_maxsize(self, maxsize):
+        """Change the capacity, e.g. to hold a longer backlog while the session is reconnecting."""
+        self.maxsize = maxsize
+        self._trim()
+
+    def depth(self):
+        return len(self._frames)
+
+    def _trim(self, keep_first=False):
+        while len(self._frames) > max(self.maxsize, 1):
+            if keep_first:
+                del self._frames[1]  # Oldest frame after the one just put back
+            else:
+                self._frames.popleft()
+            self.dropped += 1
+            metrics.FRAMES.labels(outcome='dropped').inc()
+
+    def stats(self):
+        return {
+            'depth': len(self._frames),
+            'max_depth': self.max_depth,
+            'maxsize': self.maxsize,
+            'enqueued': self.enqueued,
+            'dropped': self.dropped,
+        }
@@ -0,0 +1,166 @@
+"""
+Hot-reloading view of the newest description session for the chat bot.
+
+ContextWatcher keeps the newest descriptions_*.md cached in memory together with
+the metadata /context reports. When the file grows only the appended bytes are
+read; when a newer session file appears it switches to that file. Change
+notifications come from watchdog (inotify on Linux) when it is installed, with a
+polling thread as the fallback.
+"""
+
+import os
+import codecs
+import threading
+from datetime import datetime
+
+from activity_index import list_description_files, session_from_filename
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # Optional: fall back to polling
+    Observer = None
+    FileSystemEventHandler = object
+
+POLL_INTERVAL = 1.0  # seconds between checks when watchdog isn't available
+PREVIEW_CHARS = 500
+
+
+def readable_session_timestamp(session):
+    """'20250531_202921' (or a peer session '20250531_202921_3fa2b1c0') -> '2025-05-31 20:29:21'"""
+    try:
+        return datetime.strptime(session[:15], '%Y%m%d_%H%M%S').strftime('%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return "Unknown"
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if not event.is_directory and event.src_path.endswith(".md"):
+            self.watcher.check()
+
+
+class ContextWatcher:
+    """Cached, incrementally updated content and metadata of the newest session file."""
+
+    def __init__(self, descriptions_dir="gemini_descriptions", on_change=None, poll_interval=POLL_INTERVAL):
+        if not os.path.exists(descriptions_dir):
+            raise FileNotFoundError(f"Directory {descriptions_dir} not found")
+        self.descriptions_dir = descriptions_dir
+        self.on_change = on_change  # Called (from the watcher thread) after new content is read
+        self.poll_interval = poll_interval
+        self.mode = None  # "inotify" or "polling" once started
+
+        self._lock = threading.Lock()
+        self._path = None
+        self._offset = 0
+        self._decoder = None
+        self._parts = []
+        self._content = None
+        self._lines = 0
+        self._chars = 0
+        self._preview = ""
+        self._updated_at = None
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    @property
+    def content(self):
+        """Full text of the newest session (joined lazily after appends)."""
+        with self._lock:
+            if self._content is None:
+                self._content = "".join(self._parts)
+                self._parts = [self._content]
+            return self._content
+
+    def snapshot(self):
+        """Metadata for /context; no file system access."""
+        with self._lock:
+            if self._path is None:
+                return None
+            filename = os.path.basename(self._path)
+            return {
+                'file': filename,
+                'timestamp': readable_session_timestamp(session_from_filename(filename)),
+                'lines': self._lines,
+                'characters': self._chars,
+                'bytes': self._offset,
+                'updated_at': self._updated_at,
+                'preview': self._preview + "..." if self._chars > PREVIEW_CHARS else self._preview,
+                'watch_mode': self.mode,
+            }
+
+    def start(self):
+        """Load the newest session and start watching for changes."""
+        self.check()
+        if Observer is not None:
+            self._observer = Observer()
+            self._observer.schedule(_ChangeHandler(self), self.descriptions_dir, recursive=False)
+            self._observer.daemon = True
+            self._observer.start()
+            self.mode = "inotify"
+        else:
+            self._thread = threading.Thread(target=self._poll_loop, name="context-watcher", daemon=True)
+            self._thread.start()
+            self.mode = "polling"
+        print(f"Watching {self.descriptions_dir} for new descriptions ({self.mode})")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error checking for new descriptions: {e}")
+
+    def check(self):
+        """Pick up a newer session file or bytes appended to the current one. True if anything changed."""
+        files = list_description_files(self.descriptions_dir)
+        if not files:
+            return False
+        newest = files[-1]
+        size = os.path.getsize(newest)
+
+        with self._lock:
+            if newest != self._path or size < self._offset:
+                # New session (or the file was rewritten): start over from the beginning
+                self._path = newest
+                self._offset = 0
+                self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+                self._parts = []
+                self._content = ""
+                self._lines = 1
+                self._chars = 0
+                self._preview = ""
+            elif size == self._offset:
+                return False
+
+            with open(self._path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+            self._offset += len(data)
+            text = self._decoder.decode(data)
+            self._parts.append(text)
+            self._content = None
+            self._lines += text.count("\n")
+            self._chars += len(text)
+            if len(self._preview) < PREVIEW_CHARS:
+                self._preview = (self._preview + text)[:PREVIEW_CHARS]
+            self._updated_at = datetime.now().isoformat()
+
+        if self.on_change:
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"Error handling description update: {e}")
+        return True
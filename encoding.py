@@ -0,0 +1,268 @@
+"""
+Frame encoding: resize, colour conversion and JPEG/WebP encode, inline or on a pool.
+
+FrameEncoder turns raw pixels (mss's BGRX buffer, or RGB from a decoded WebRTC
+frame) into the encoded upload plus the grayscale thumbnail and grid the
+change detector and dirty-rectangle cropping need. Where that work runs is a
+mode:
+
+- inline: on the calling thread (the capture worker, or a peer's encode thread)
+- thread: on a shared thread pool; Pillow releases the GIL while resizing and
+  encoding, so several streams overlap
+- process: on a process pool, for when the Python-level parts of the pipeline
+  contend on the GIL. Pixels are copied into a reusable SharedMemory block and
+  only its name crosses the process boundary; the encoded bytes and small
+  thumbnails come back pickled.
+
+The process pool forks by default so the server module is not re-imported in
+the workers; with the spawn start method the main module must be import-safe.
+Forking is only safe while the parent has no other threads, so create a
+process-mode encoder before starting any (server.py does so at import, ahead
+of its writer threads).
+"""
+
+import io
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from PIL import Image as PILImage
+
+ENCODE_MODES = ('inline', 'thread', 'process')
+IMAGE_FORMATS = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp'}
+ENCODE_WORKERS = 2  # Pool size for the thread and process modes
+WEBP_METHOD = 2  # 0 (fastest) - 6 (smallest); the default of 4 is too slow for full screens
+ATTACHED_BUFFERS = 16  # SharedMemory blocks each worker process keeps mapped
+
+
+class EncodedImage:
+    """Result of one encode: the bytes to upload and the thumbnails derived from the same pixels."""
+
+    __slots__ = ('data', 'width', 'height', 'mime_type', 'signature', 'grid', 'image')
+
+    def __init__(self, data, width, height, mime_type, signature=None, grid=None, image=None):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.mime_type = mime_type
+        self.signature = signature  # Grayscale thumbnail for change detection
+        self.grid = grid  # Grayscale grid for dirty-rectangle detection
+        self.image = image  # The scaled RGB image, when asked for (OCR pre-pass)
+
+
+def output_size(size, scale=1.0, max_width=None):
+    """Encoded (width, height) for a native size, the scale factor and an optional width cap."""
+    width, height = size
+    if max_width and width * scale > max_width:
+        scale = max_width / width
+    if scale >= 1.0:
+        return width, height
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def to_image(pixels, size, rawmode="BGRX", scale=1.0, max_width=None, region=None):
+    """Raw pixels -> scaled RGB image; region is a (left, top, right, bottom) box in scaled coordinates."""
+    img = PILImage.frombuffer("RGB", size, pixels, "raw", rawmode, 0, 1)
+    out_width, out_height = output_size(size, scale, max_width)
+    if region is not None:
+        # Crop the native pixels first so only the region is resized
+        fx, fy = size[0] / out_width, size[1] / out_height
+        left, top, right, bottom = region
+        native = (round(left * fx), round(top * fy), min(size[0], round(right * fx)), min(size[1], round(bottom * fy)))
+        img = img.crop(native)
+        target = (right - left, bottom - top)
+        return img if img.size == target else img.resize(target, PILImage.BILINEAR)
+    if (out_width, out_height) != size:
+        img = img.resize((out_width, out_height), PILImage.BILINEAR)
+    return img
+
+
+def encode_pixels(pixels, size, rawmode="BGRX", quality=80, image_format="JPEG", scale=1.0, max_width=None,
+                  region=None, signature_size=None, grid_cell=None, keep_image=False):
+    """Resize, convert and encode raw pixels. Returns an EncodedImage."""
+    img = to_image(pixels, size, rawmode, scale, max_width, region)
+    image_io = io.BytesIO()
+    if image_format == 'WEBP':
+        img.save(image_io, format="WEBP", quality=quality, method=WEBP_METHOD)
+    else:
+        img.save(image_io, format=image_format, quality=quality)
+    signature = grid = None
+    if signature_size or grid_cell:
+        gray = img.convert("L")
+        signature = gray.resize(signature_size, PILImage.BILINEAR) if signature_size else None
+        grid = gray.reduce(grid_cell) if grid_cell else None
+    return EncodedImage(image_io.getvalue(), img.width, img.height, IMAGE_FORMATS[image_format],
+                        signature, grid, img if keep_image else None)
+
+
+# --- Process workers ---
+_attached = OrderedDict()  # Per worker process: SharedMemory name -> mapped block
+
+
+def _attach(name):
+    block = _attached.pop(name, None)
+    if block is None:
+        block = shared_memory.SharedMemory(name=name)
+        while len(_attached) >= ATTACHED_BUFFERS:
+            _attached.popitem(last=False)[1].close()
+    _attached[name] = block
+    return block
+
+
+def _encode_shared(name, nbytes, size, rawmode, options):
+    """Process-pool entry point: encode pixels the parent left in SharedMemory block `name`."""
+    view = _attach(name).buf[:nbytes]
+    try:
+        return encode_pixels(view, size, rawmode, **options)
+    finally:
+        view.release()
+
+
+def _warm_up():
+    return True
+
+
+class SharedBuffers:
+    """Reusable SharedMemory blocks for handing pixels to worker processes without pickling them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = []
+        self._blocks = set()
+        self.bytes_shared = 0
+
+    def put(self, pixels):
+        """Copy pixels into a free (or new) block. Returns (block, nbytes); give the block back with release()."""
+        data = memoryview(pixels).cast('B')
+        nbytes = data.nbytes
+        block = None
+        with self._lock:
+            for i, candidate in enumerate(self._free):
+                if candidate.size >= nbytes:
+                    block = self._free.pop(i)
+                    break
+            if block is None and self._free:
+                self._discard(self._free.pop(0))  # Too small for this resolution; replace it
+        if block is None:
+            block = shared_memory.SharedMemory(create=True, size=nbytes)
+            with self._lock:
+                self._blocks.add(block)
+        block.buf[:nbytes] = data
+        self.bytes_shared += nbytes
+        return block, nbytes
+
+    def release(self, block):
+        with self._lock:
+            if block in self._blocks:
+                self._free.append(block)
+
+    def close(self):
+        with self._lock:
+            for block in list(self._blocks):
+                self._discard(block)
+            self._free = []
+
+    def _discard(self, block):
+        self._blocks.discard(block)
+        block.close()
+        block.unlink()
+
+    def __len__(self):
+        return len(self._blocks)
+
+
+class FrameEncoder:
+    """Runs encode_pixels inline, on a thread pool or on a process pool fed through shared memory."""
+
+    def __init__(self, mode="inline", workers=ENCODE_WORKERS, image_format="JPEG", start_method="fork"):
+        if mode not in ENCODE_MODES:
+            raise ValueError(f"Unknown encode mode {mode!r} (expected one of {', '.join(ENCODE_MODES)})")
+        image_format = image_format.upper()
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format {image_format!r} (expected one of {', '.join(IMAGE_FORMATS)})")
+        self.mode = mode
+        self.workers = workers
+        self.image_format = image_format
+        self.mime_type = IMAGE_FORMATS[image_format]
+        self._executor = None
+        self._buffers = None
+        if mode == 'thread':
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame-encode")
+        elif mode == 'process':
+            if start_method not in multiprocessing.get_all_start_methods():
+                start_method = None  # e.g. no fork on Windows
+            # Workers must share our resource tracker; their own would "clean up" blocks we still use when they exit
+            resource_tracker.ensure_running()
+            self._executor = ProcessPoolExecutor(max_workers=workers,
+                                                 mp_context=multiprocessing.get_context(start_method))
+            self._buffers = SharedBuffers()
+            # Start the workers now, before the server has spun up more threads
+            self._executor.submit(_warm_up).result()
+
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.encode_seconds = 0.0  # Wall time per encode as seen by the caller, handoff included
+        self.bytes_out = 0
+
+    def encode(self, pixels, size, rawmode="BGRX", **options):
+        """Encode on this encoder's mode, blocking the calling thread. See encode_pixels for options."""
+        options.setdefault('image_format', self.image_format)
+        start = time.perf_counter()
+        if self.mode == 'process':
+            result = self._encode_in_process(pixels, size, rawmode, options)
+        elif self.mode == 'thread':
+            result = self._executor.submit(encode_pixels, pixels, size, rawmode, **options).result()
+        else:
+            result = encode_pixels(pixels, size, rawmode, **options)
+        self._record(time.perf_counter() - start, result)
+        return result
+
+    def _encode_in_process(self, pixels, size, rawmode, options):
+        keep_image = options.pop('keep_image', False)
+        result = self._submit_shared(pixels, size, rawmode, options).result()
+        self._restore_image(result, keep_image, pixels, size, rawmode, options)
+        return result
+
+    def _submit_shared(self, pixels, size, rawmode, options):
+        block, nbytes = self._buffers.put(pixels)
+        try:
+            future = self._executor.submit(_encode_shared, block.name, nbytes, size, rawmode, options)
+        except BaseException:
+            self._buffers.release(block)
+            raise
+        future.add_done_callback(lambda _: self._buffers.release(block))
+        return future
+
+    @staticmethod
+    def _restore_image(result, keep_image, pixels, size, rawmode, options):
+        # A full-size image would have to be pickled back; rebuild it here from the pixels we still have
+        if keep_image:
+            result.image = to_image(pixels, size, rawmode, options.get('scale', 1.0), options.get('max_width'),
+                                    options.get('region'))
+
+    def _record(self, seconds, result):
+        with self._lock:
+            self.frames += 1
+            self.encode_seconds += seconds
+            self.bytes_out += len(result.data)
+
+    def stats(self):
+        frames = self.frames
+        return {
+            'mode': self.mode,
+            'workers': self.workers if self.mode != 'inline' else 0,
+            'format': self.image_format,
+            'frames': frames,
+            'avg_encode_ms': round(self.encode_seconds / frames * 1000, 2) if frames else None,
+            'avg_bytes': round(self.bytes_out / frames) if frames else None,
+            **({'shared_buffers': len(self._buffers), 'bytes_shared': self._buffers.bytes_shared}
+               if self._buffers else {}),
+        }
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        if self._buffers:
+            self._buffers.close()
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Tiered storage for captured screen frames.
+
+FrameStore takes the already-encoded frames from the capture pipeline and
+writes them on its own thread, so disk I/O never runs on the capture path.
+Frames that look the same as the last saved one (same thumbnail signature
+within DEDUPE_THRESHOLD) are not written at all.
+
+Frames live in captured_frames/<session>/frame_<timestamp>.jpg (or .webp) and age
+through tiers during periodic maintenance:
+
+- full:      newer than FULL_RES_RETENTION, kept as captured
+- thumbnail: older frames are re-encoded in place at THUMBNAIL_WIDTH
+- keyframe:  after ARCHIVE_AFTER only one frame per KEYFRAME_INTERVAL is kept
+- deleted:   after MAX_AGE, or oldest first while the store exceeds MAX_BYTES
+
+Frame names sort by capture time, so each session directory only keeps two
+watermarks plus its file and byte totals and the time its next frame changes
+tier (.tiers.json) instead of per-file state. A pass skips directories that
+have not changed since the last one and have nothing due, only stats frames
+it has not seen, and enforces MAX_BYTES from the stored totals.
+
+    python frame_store.py report     # storage usage per session
+    python frame_store.py maintain   # run one tiering/retention pass now
+"""
+
+import os
+import io
+import re
+import sys
+import bisect
+import json
+import time
+import queue
+import threading
+from datetime import datetime, timedelta
+from PIL import Image as PILImage
+from loguru import logger
+
+from capture import changed_fraction, PIXEL_DIFF_THRESHOLD
+import metrics
+
+FRAMES_DIR = "captured_frames"
+DEDUPE_THRESHOLD = 0.001  # Changed fraction below which a frame counts as identical to the last saved one
+FULL_RES_RETENTION = timedelta(hours=1)
+THUMBNAIL_WIDTH = 480
+THUMBNAIL_QUALITY = 60
+ARCHIVE_AFTER = timedelta(days=1)
+KEYFRAME_INTERVAL = timedelta(minutes=1)
+MAX_AGE = timedelta(days=7)
+MAX_BYTES = 5 * 1024 ** 3
+MAINTENANCE_INTERVAL = 300.0  # seconds between tiering/retention passes
+
+FRAME_TIME_FORMAT = "%Y%m%d_%H%M%S_%f"
+FRAME_EXTENSIONS = {'image/jpeg': '.jpg', 'image/webp': '.webp'}
+STATE_FILENAME = ".tiers.json"
+FRAME_NAME_RE = re.compile(r"^frame_\d{8}_\d{6}_\d{3}(" + "|".join(re.escape(ext) for ext in FRAME_EXTENSIONS.values())
+                           + r")$")
+
+_STOP = object()
+
+
+def frame_time(filename):
+    """Capture time encoded in frame_<YYYYmmdd_HHMMSS_mmm>.jpg (or .webp), or None."""
+    stem, extension = os.path.splitext(filename)
+    if not (stem.startswith("frame_") and extension in FRAME_EXTENSIONS.values()):
+        return None
+    try:
+        return datetime.strptime(stem[6:], FRAME_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def frame_key(when):
+    """Filename prefix for a capture time; frame names compare against it in time order."""
+    return "frame_" + when.strftime(FRAME_TIME_FORMAT)[:-3]
+
+
+class FrameStore:
+    """Deduplicating, asynchronous, tiered frame writer."""
+
+    def __init__(self, frames_dir=FRAMES_DIR, session=None, dedupe_threshold=DEDUPE_THRESHOLD,
+                 full_res_retention=FULL_RES_RETENTION, archive_after=ARCHIVE_AFTER,
+                 keyframe_interval=KEYFRAME_INTERVAL, max_age=MAX_AGE, max_bytes=MAX_BYTES,
+                 maintenance_interval=MAINTENANCE_INTERVAL, background=True):
+        self.frames_dir = frames_dir
+        self.session = session
+        self.session_dir = os.path.join(frames_dir, session) if session else frames_dir
+        self.dedupe_threshold = dedupe_threshold
+        self.full_res_retention = full_res_retention
+        self.archive_after = archive_after
+        self.keyframe_interval = keyframe_interval
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.maintenance_interval = maintenance_interval
+        self.background = background
+        os.makedirs(self.session_dir, exist_ok=True)
+
+        self.frames_saved = 0
+        self.frames_deduplicated = 0
+        self.bytes_written = 0
+        self.write_seconds = 0.0
+        self.thumbnailed = 0
+        self.pruned = 0
+        self.last_maintenance = None
+        self._last_signature = None
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        if self.background:
+            self._thread = threading.Thread(target=self._writer_loop, name="frame-store", daemon=True)
+            self._thread.start()
+        return self
+
+    def save(self, frame):
+        """Queue a captured frame for writing unless it matches the last saved one. Returns its path or None."""
+        change = changed_fraction(self._last_signature, frame.signature, PIXEL_DIFF_THRESHOLD)
+        if change < self.dedupe_threshold:
+            self.frames_deduplicated += 1
+            return None
+        self._last_signature = frame.signature
+        timestamp = datetime.fromtimestamp(frame.captured_at).strftime(FRAME_TIME_FORMAT)[:-3]  # Milliseconds
+        extension = FRAME_EXTENSIONS.get(frame.mime_type, '.jpg')
+        frame.path = os.path.join(self.session_dir, f"frame_{timestamp}{extension}")
+        if self._thread is not None:
+            self._queue.put((frame.path, frame.jpeg))
+        else:
+            self._write(frame.path, frame.jpeg)
+        return frame.path
+
+    def close(self):
+        """Write everything still queued and stop the writer thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _writer_loop(self):
+        next_maintenance = time.monotonic() + self.maintenance_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, next_maintenance - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                return
+            if item is not None:
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    logger.error(f"Error saving frame {item[0]}: {e}")
+            if time.monotonic() >= next_maintenance:
+                try:
+                    self.maintain()
+                except Exception as e:
+                    logger.error(f"Error maintaining frame storage: {e}")
+                next_maintenance = time.monotonic() + self.maintenance_interval
+
+    def _write(self, path, jpeg):
+        start = time.perf_counter()
+        with open(path, 'wb') as f:
+            f.write(jpeg)
+        elapsed = time.perf_counter() - start
+        self.write_seconds += elapsed
+        metrics.WRITE_SECONDS.labels(store='frame_store').observe(elapsed)
+        self.frames_saved += 1
+        self.bytes_written += len(jpeg)
+        logger.debug(f"Saved frame to: {path}")
+
+    # --- Tiering and retention ---
+
+    def _directories(self):
+        """Session directories plus the top-level directory (frames saved before per-session folders)."""
+        dirs = [self.frames_dir]
+        for name in sorted(os.listdir(self.frames_dir)):
+            path = os.path.join(self.frames_dir, name)
+            if os.path.isdir(path):
+                dirs.append(path)
+        return dirs
+
+    @staticmethod
+    def _frame_names(directory):
+        """Frame filenames in a directory, oldest first (names sort by capture time)."""
+        return sorted(name for name in os.listdir(directory) if FRAME_NAME_RE.match(name))
+
+    @staticmethod
+    def _load_state(directory):
+        try:
+            with open(os.path.join(directory, STATE_FILENAME), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _save_state(directory, state):
+        with open(os.path.join(directory, STATE_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
+    def _save_state_with_mtime(self, directory, state):
+        """Save state including the directory's mtime, so the next pass can tell whether anything changed."""
+        if not os.path.exists(os.path.join(directory, STATE_FILENAME)):
+            self._save_state(directory, state)  # Creating the file changes the mtime; rewriting it does not
+        state['mtime'] = os.stat(directory).st_mtime_ns
+        self._save_state(directory, state)
+
+    def maintain(self, now=None):
+        """One tiering and retention pass; directories with nothing due and no new files are skipped."""
+        now = now or datetime.now()
+        start = time.perf_counter()
+        scanned = 0
+        states = {}
+        directories = self._directories()
+        for directory in directories:
+            state = self._load_state(directory)
+            if self._is_idle(directory, state, now):
+                states[directory] = state  # Nothing due and unchanged since the last pass: use its totals
+                continue
+            scanned += 1
+            state = self._maintain_directory(directory, state, now)
+            if state is not None:
+                states[directory] = state
+            self._write_pending()  # Don't let queued frame writes wait behind a long pass
+
+        self._enforce_size_limit(states)
+        self.last_maintenance = now.isoformat()
+        logger.info(f"Frame storage maintenance took {time.perf_counter() - start:.2f}s "
+                    f"({scanned} of {len(directories)} directories scanned): "
+                    f"{self.thumbnailed} thumbnailed, {self.pruned} pruned so far")
+
+    @staticmethod
+    def _is_idle(directory, state, now):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return False
+        return state.get('mtime') == mtime and 'next_due' in state and now < datetime.fromisoformat(state['next_due'])
+
+    def _maintain_directory(self, directory, state, now):
+        """Age one directory's frames through the tiers, keeping its file and byte totals in its state."""
+        names = self._frame_names(directory)
+        if not names:
+            self._remove_empty(directory)
+            return None
+
+        # Totals: stat only frames newer than the last pass; recount if files vanished behind our back
+        newest = state.get('newest', '')
+        new = names[bisect.bisect_right(names, newest):]
+        if 'files' in state and state['files'] + len(new) == len(names):
+            files, total = len(names), state['bytes'] + self._sizes(directory, new)
+        else:
+            files, total = len(names), self._sizes(directory, names)
+
+        # Past the maximum age: delete
+        expired = names[:bisect.bisect_left(names, frame_key(now - self.max_age))]
+        for name in expired:
+            total -= self._delete(os.path.join(directory, name))
+        names = names[len(expired):]
+
+        # Past the archive age: keep one keyframe per interval (the watermark skips thinned frames)
+        done = state.get('archived_through', '')
+        first = bisect.bisect_right(names, done)
+        due = bisect.bisect_left(names, frame_key(now - self.archive_after), lo=first)
+        if due > first:
+            last_kept = frame_time(names[first - 1]) if first else None
+            kept = names[:first]
+            for name in names[first:due]:
+                captured = frame_time(name)
+                if last_kept is not None and captured - last_kept < self.keyframe_interval:
+                    total -= self._delete(os.path.join(directory, name))
+                else:
+                    kept.append(name)
+                    last_kept = captured
+            state['archived_through'] = names[due - 1]
+            names = kept + names[due:]
+
+        # Past the full-resolution window: re-encode as thumbnails
+        done = state.get('thumbnailed_through', '')
+        first = bisect.bisect_right(names, done)
+        due = bisect.bisect_left(names, frame_key(now - self.full_res_retention), lo=first)
+        for name in names[first:due]:
+            total += self._thumbnail(os.path.join(directory, name))
+        if due > first:
+            state['thumbnailed_through'] = names[due - 1]
+
+        if not names:
+            self._remove_empty(directory)
+            return None
+        state.update(files=len(names), bytes=total, oldest=names[0], newest=names[-1],
+                     next_due=self._next_due(names, state).isoformat())
+        self._save_state_with_mtime(directory, state)
+        return state
+
+    def _next_due(self, names, state):
+        """When the next frame in this directory crosses a tier boundary."""
+        due = [frame_time(names[0]) + self.max_age]
+        for watermark, age in (('archived_through', self.archive_after),
+                               ('thumbnailed_through', self.full_res_retention)):
+            index = bisect.bisect_right(names, state.get(watermark, ''))
+            if index < len(names):
+                due.append(frame_time(names[index]) + age)
+        return min(due)
+
+    @staticmethod
+    def _sizes(directory, names):
+        total = 0
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+        return total
+
+    def _write_pending(self):
+        """Write frames queued during maintenance (writer thread only)."""
+        if self._thread is None:
+            return
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is _STOP:
+                self._queue.put(_STOP)  # Leave it for the writer loop
+                return
+            try:
+                self._write(*item)
+            except Exception as e:
+                logger.error(f"Error saving frame {item[0]}: {e}")
+
+    def _remove_empty(self, directory):
+        """Drop an old session directory (and its watermarks) once all of its frames are gone."""
+        if directory in (self.frames_dir, self.session_dir):
+            return
+        for name in os.listdir(directory):
+            if name != STATE_FILENAME:
+                return
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    def _thumbnail(self, path):
+        """Re-encode a frame at THUMBNAIL_WIDTH. Returns the change in its size (bytes)."""
+        try:
+            with PILImage.open(path) as img:
+                if img.width <= THUMBNAIL_WIDTH:
+                    return 0
+                height = max(1, round(img.height * THUMBNAIL_WIDTH / img.width))
+                small = img.convert("RGB").resize((THUMBNAIL_WIDTH, height), PILImage.BILINEAR)
+                image_format = img.format  # Keep the file's format so its extension stays right
+            before = os.path.getsize(path)
+            buffer = io.BytesIO()
+            small.save(buffer, format=image_format, quality=THUMBNAIL_QUALITY)
+            tmp = path + ".tmp"
+            with open(tmp, 'wb') as f:
+                f.write(buffer.getvalue())
+            os.replace(tmp, path)
+            self.thumbnailed += 1
+            return buffer.tell() - before
+        except OSError as e:
+            logger.warning(f"Could not thumbnail {path}: {e}")
+            return 0
+
+    def _delete(self, path):
+        """Remove a frame. Returns the bytes freed."""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self.pruned += 1
+            return size
+        except FileNotFoundError:
+            return 0
+
+    def _enforce_size_limit(self, states):
+        """Delete the oldest frames while the directories' totals exceed max_bytes; lists only what it prunes."""
+        if not self.max_bytes:
+            return
+        total = sum(state['bytes'] for state in states.values())
+        if total <= self.max_bytes:
+            return
+        for directory in sorted(states, key=lambda d: states[d]['oldest']):
+            state = states[directory]
+            names = self._frame_names(directory)
+            for name in names:
+                if total <= self.max_bytes:
+                    break
+                freed = self._delete(os.path.join(directory, name))
+                total -= freed
+                state['bytes'] -= freed
+                state['files'] -= 1
+            remaining = self._frame_names(directory)
+            if not remaining:
+                self._remove_empty(directory)
+            else:
+                state.update(oldest=remaining[0], newest=remaining[-1], files=len(remaining),
+                             next_due=self._next_due(remaining, state).isoformat())
+                self._save_state_with_mtime(directory, state)
+            if total <= self.max_bytes:
+                return
+
+    # --- Reporting ---
+
+    def usage(self, now=None):
+        """Storage use per session directory: files and bytes per tier, oldest and newest frame."""
+        now = now or datetime.now()
+        report = []
+        for directory in self._directories():
+            frames = [(frame_time(name), name) for name in self._frame_names(directory)]
+            if not frames:
+                continue
+            state = self._load_state(directory)
+            thumbnailed_through = state.get('thumbnailed_through', '')
+            full = thumbnails = full_bytes = thumbnail_bytes = 0
+            for captured, name in frames:
+                size = os.path.getsize(os.path.join(directory, name))
+                if name <= thumbnailed_through:
+                    thumbnails += 1
+                    thumbnail_bytes += size
+                else:
+                    full += 1
+                    full_bytes += size
+            report.append({
+                'session': os.path.basename(directory) if directory != self.frames_dir else "(unsorted)",
+                'frames': len(frames),
+                'bytes': full_bytes + thumbnail_bytes,
+                'full_res': full,
+                'full_res_bytes': full_bytes,
+                'thumbnails': thumbnails,
+                'thumbnail_bytes': thumbnail_bytes,
+                'oldest': frames[0][0].isoformat(),
+                'newest': frames[-1][0].isoformat(),
+                'age_hours': round((now - frames[0][0]).total_seconds() / 3600, 1),
+            })
+        return report
+
+    def stats(self):
+        return {
+            'session_dir': self.session_dir,
+            'saved': self.frames_saved,
+            'deduplicated': self.frames_deduplicated,
+            'bytes_written': self.bytes_written,
+            'avg_write_ms': round(self.write_seconds / self.frames_saved * 1000, 2) if self.frames_saved else None,
+            'pending': self._queue.qsize(),
+            'thumbnailed': self.thumbnailed,
+            'pruned': self.pruned,
+            'last_maintenance': self.last_maintenance,
+        }
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    store = FrameStore(background=False)
+    if command == "maintain":
+        store.maintain()
+    elif command != "report":
+        sys.exit("Usage: python frame_store.py [report|maintain]")
+    total = 0
+    for row in store.usage():
+        total += row['bytes']
+        print(f"{row['session']:<16} {row['frames']:>7} frames {row['bytes'] / 1e6:>9.1f} MB  "
+              f"full {row['full_res']:>6} ({row['full_res_bytes'] / 1e6:.1f} MB)  "
+              f"thumbs {row['thumbnails']:>6} ({row['thumbnail_bytes'] / 1e6:.1f} MB)  "
+              f"{row['oldest'][:16]} .. {row['newest'][:16]}")
+    print(f"Total: {total / 1e6:.1f} MB in {store.frames_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""
+Append-only description journal for Gemini screen descriptions.
+
+Each session writes three files into the descriptions directory:
+
+- descriptions_<session>.md     human-readable log, appended one entry at a time
+- descriptions_<session>.jsonl  machine-readable journal, one JSON record per line
+- descriptions_<session>.html   static viewer shell that tails the .jsonl journal
+
+Appending an entry costs O(entry) instead of rewriting every file from the full
+in-memory history, and the disk work happens on a background writer thread so the
+event loop only pays for a queue put. fsync is batched by count and by time.
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+from loguru import logger
+
+import metrics
+
+MARKDOWN_TEMPLATE = "descriptions_{session}.md"
+JOURNAL_TEMPLATE = "descriptions_{session}.jsonl"
+HTML_TEMPLATE = "descriptions_{session}.html"
+
+_STOP = object()
+
+
+class DescriptionJournal:
+    """Streams description entries to the markdown log and the JSON lines journal."""
+
+    def __init__(self, directory, session_timestamp, fsync_every=32, fsync_interval=1.0,
+                 background=True, recent_size=50):
+        self.directory = directory
+        self.session_timestamp = session_timestamp
+        self.markdown_path = os.path.join(directory, MARKDOWN_TEMPLATE.format(session=session_timestamp))
+        self.journal_path = os.path.join(directory, JOURNAL_TEMPLATE.format(session=session_timestamp))
+        self.html_path = os.path.join(directory, HTML_TEMPLATE.format(session=session_timestamp))
+        self.fsync_every = fsync_every  # fsync after this many unsynced entries...
+        self.fsync_interval = fsync_interval  # ...or after this many seconds, whichever comes first
+        self.background = background
+        self.entry_count = 0
+        self.recent = deque(maxlen=recent_size)  # Tail kept in memory for prompts/reconnects
+
+        self._md_file = None
+        self._journal_file = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def open(self):
+        """Open the journal files for appending and write the static HTML shell."""
+        os.makedirs(self.directory, exist_ok=True)
+        started = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        new_markdown = not os.path.exists(self.markdown_path)
+        self._md_file = open(self.markdown_path, 'a', encoding='utf-8')
+        if new_markdown:
+            self._md_file.write("# Gemini Screen Descriptions Log\n\n")
+            self._md_file.write(f"**Started:** {started}\n\n")
+            self._md_file.write("---\n\n")
+            self._md_file.flush()
+
+        self._journal_file = open(self.journal_path, 'a', encoding='utf-8')
+
+        # The viewer is static; it tails the .jsonl journal instead of being regenerated
+        if not os.path.exists(self.html_path):
+            with open(self.html_path, 'w', encoding='utf-8') as f:
+                f.write(render_html_shell(self.session_timestamp, started,
+                                          os.path.basename(self.journal_path)))
+
+        if self.background:
+            self._thread = threading.Thread(target=self._writer_loop, name="description-journal", daemon=True)
+            self._thread.start()
+        return self
+
+    def append(self, text, timestamp=None, **fields):
+        """Queue a description entry for writing and return the record."""
+        record = {
+            'timestamp': timestamp or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'text': text,
+        }
+        record.update(fields)
+        self.entry_count += 1
+        self.recent.append(record)
+
+        if self.background:
+            self._queue.put(record)
+        else:
+            self._write_batch([record])
+        return record
+
+    def close(self):
+        """Drain pending entries, fsync and close the files."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        for f in (self._md_file, self._journal_file):
+            if f is not None and not f.closed:
+                self._sync(f)
+                f.close()
+        self._md_file = None
+        self._journal_file = None
+
+    def _writer_loop(self):
+        """Background thread: write queued entries in batches, fsync on count or time."""
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                if self._unsynced:
+                    self._sync_all()
+                continue
+
+            batch = [item]
+            # Drain whatever else is already waiting so bursts become one write
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(entry is _STOP for entry in batch)
+            records = [entry for entry in batch if entry is not _STOP]
+            if records:
+                try:
+                    self._write_batch(records)
+                except Exception as e:
+                    logger.error(f"Error writing description to journal: {e}")
+            if stop:
+                return
+
+    def _write_batch(self, records):
+        start = time.perf_counter()
+        md_chunks = []
+        journal_chunks = []
+        for record in records:
+            md_chunks.append(f"**{record['timestamp']}:** {record['text']}\n\n")
+            journal_chunks.append(json.dumps(record, ensure_ascii=False) + "\n")
+
+        self._md_file.write("".join(md_chunks))
+        self._journal_file.write("".join(journal_chunks))
+        self._md_file.flush()
+        self._journal_file.flush()
+
+        self._unsynced += len(records)
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self._sync_all()
+        metrics.WRITE_SECONDS.labels(store='journal').observe(time.perf_counter() - start)
+
+    def _sync_all(self):
+        self._sync(self._md_file)
+        self._sync(self._journal_file)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def _sync(f):
+        if f is None or f.closed:
+            return
+        f.flush()
+        try:
+            os.fsync(f.fileno())
+        except OSError as e:
+            logger.warning(f"fsync failed for {f.name}: {e}")
+
+
+def read_journal(path, offset=0):
+    """Read complete records from a .jsonl journal starting at a byte offset.
+
+    Returns (records, new_offset). A trailing partial line is left for the next call.
+    """
+    records = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            logger.warning(f"Skipping malformed journal line in {path}")
+    return records, offset + end
+
+
+def render_html_shell(session_timestamp, started, journal_filename, records=None):
+    """Static viewer page that polls the journal with HTTP Range requests.
+
+    With records the page is a self-contained export: the entries are embedded and nothing is polled.
+    """
+    embedded = "null" if records is None else json.dumps(records, ensure_ascii=False).replace("</", "<\\/")
+    return HTML_SHELL.replace("{{session}}", session_timestamp) \
+        .replace("{{started}}", started) \
+        .replace("{{journal}}", journal_filename) \
+        .replace("{{records}}", embedded)
+
+
+HTML_SHELL = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Gemini Screen Descriptions - {{session}}</title>
+    <style>
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            line-height: 1.6;
+            margin: 0;
+            padding: 20px;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            min-height: 100vh;
+        }
+        .container {
+            max-width: 1000px;
+            margin: 0 auto;
+            background: white;
+            border-radius: 15px;
+            box-shadow: 0 20px 40px rgba(0,0,0,0.1);
+            overflow: hidden;
+        }
+        .header {
+            background: linear-gradient(135deg, #1e3c72 0%, #2a5298 100%);
+            color: white;
+            padding: 30px;
+            text-align: center;
+        }
+        .header h1 {
+            margin: 0;
+            font-size: 2.5em;
+            font-weight: 300;
+            text-shadow: 0 2px 4px rgba(0,0,0,0.3);
+        }
+        .header .timestamp {
+            margin: 10px 0 0 0;
+            font-size: 1.1em;
+            opacity: 0.9;
+        }
+        .content {
+            padding: 30px;
+        }
+        .description-item {
+            background: #f8f9fa;
+            border-left: 4px solid #2a5298;
+            margin: 20px 0;
+            padding: 20px;
+            border-radius: 0 10px 10px 0;
+            box-shadow: 0 2px 10px rgba(0,0,0,0.05);
+            transition: transform 0.2s ease, box-shadow 0.2s ease;
+        }
+        .description-item:hover {
+            transform: translateY(-2px);
+            box-shadow: 0 4px 20px rgba(0,0,0,0.1);
+        }
+        .description-time {
+            color: #6c757d;
+            font-size: 0.9em;
+            margin-bottom: 10px;
+            font-weight: 500;
+        }
+        .description-text {
+            font-size: 1.1em;
+            color: #2c3e50;
+            line-height: 1.7;
+            white-space: pre-wrap;
+        }
+        .stats {
+            background: #e9ecef;
+            padding: 20px;
+            margin: 20px 0;
+            border-radius: 10px;
+            text-align: center;
+        }
+        .stats-item {
+            display: inline-block;
+            margin: 0 20px;
+            text-align: center;
+        }
+        .stats-number {
+            font-size: 2em;
+            font-weight: bold;
+            color: #2a5298;
+            display: block;
+        }
+        .stats-label {
+            color: #6c757d;
+            font-size: 0.9em;
+        }
+        .footer {
+            background: #f8f9fa;
+            padding: 20px;
+            text-align: center;
+            color: #6c757d;
+            border-top: 1px solid #dee2e6;
+        }
+        .live-indicator {
+            display: inline-block;
+            width: 12px;
+            height: 12px;
+            background: #28a745;
+            border-radius: 50%;
+            margin-right: 8px;
+            animation: pulse 2s infinite;
+        }
+        @keyframes pulse {
+            0% { opacity: 1; }
+            50% { opacity: 0.5; }
+            100% { opacity: 1; }
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1><span class="live-indicator"></span>Gemini Screen Descriptions</h1>
+            <div class="timestamp">Session started: {{started}}</div>
+        </div>
+
+        <div class="content">
+            <div class="stats">
+                <div class="stats-item">
+                    <span class="stats-number" id="description-count">0</span>
+                    <span class="stats-label">Descriptions</span>
+                </div>
+                <div class="stats-item">
+                    <span class="stats-number" id="status">Live</span>
+                    <span class="stats-label">Status</span>
+                </div>
+            </div>
+
+            <div id="descriptions-container"></div>
+        </div>
+
+        <div class="footer">
+            <p>Generated by Gemini Screen Capture System | Last updated: <span id="last-updated">-</span></p>
+        </div>
+    </div>
+
+    <script>
+        // Tails {{journal}} with Range requests; only bytes appended since the last poll are fetched.
+        const JOURNAL_URL = '{{journal}}';
+        const POLL_INTERVAL_MS = 2000;
+        const container = document.getElementById('descriptions-container');
+        const countElement = document.getElementById('description-count');
+        const statusElement = document.getElementById('status');
+        const lastUpdatedElement = document.getElementById('last-updated');
+        const decoder = new TextDecoder();
+        let offset = 0;
+        let pending = '';
+        let count = 0;
+
+        function addDescription(record) {
+            const item = document.createElement('div');
+            item.className = 'description-item';
+            const time = document.createElement('div');
+            time.className = 'description-time';
+            const indicator = document.createElement('span');
+            indicator.className = 'live-indicator';
+            time.appendChild(indicator);
+            time.appendChild(document.createTextNode(record.timestamp));
+            const text = document.createElement('div');
+            text.className = 'description-text';
+            text.textContent = record.text;
+            item.appendChild(time);
+            item.appendChild(text);
+            container.appendChild(item);
+            count += 1;
+            countElement.textContent = count;
+            lastUpdatedElement.textContent = record.timestamp;
+        }
+
+        async function poll() {
+            try {
+                const response = await fetch(JOURNAL_URL, {
+                    headers: { 'Range': `bytes=${offset}-` },
+                    cache: 'no-store'
+                });
+                if (response.status === 416) {
+                    return; // Nothing new since the last poll
+                }
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                let bytes = new Uint8Array(await response.arrayBuffer());
+                if (response.status === 200) {
+                    bytes = bytes.subarray(offset); // Server ignored the Range header
+                }
+                offset += bytes.length;
+                pending += decoder.decode(bytes, { stream: true });
+                const lines = pending.split('\\n');
+                pending = lines.pop();
+                for (const line of lines) {
+                    if (line.trim()) {
+                        addDescription(JSON.parse(line));
+                    }
+                }
+                statusElement.textContent = 'Live';
+            } catch (err) {
+                statusElement.textContent = 'Offline';
+                console.error('Error reading journal:', err);
+            }
+        }
+
+        const EMBEDDED_RECORDS = {{records}};
+        if (EMBEDDED_RECORDS) {
+            // Exported page: everything is already here
+            EMBEDDED_RECORDS.forEach(addDescription);
+            statusElement.textContent = 'Archived';
+        } else {
+            poll();
+            setInterval(poll, POLL_INTERVAL_MS);
+        }
+    </script>
+</body>
+</html>
+'''
@@ -0,0 +1,128 @@
+"""
+Logging setup for the server: background sinks, hot-path sampling and JSON records.
+
+Every sink is added with enqueue=True, so a log call only formats the record
+and puts it on a queue; writing, rotation and zip compression happen on
+loguru's writer thread instead of the event loop.
+
+Hot-path lines (per frame sent or skipped, per response chunk) are logged
+with an event name bound to them, e.g.
+
+    logger.bind(event="frame_sent", frame=frame.hash).debug("Sent screen frame ...")
+
+EventSampler sees each record once, before any sink, and drops DEBUG records
+of chatty events: it keeps one in every LOG_SAMPLING[event] and then at most
+LOG_RATE_LIMIT per second per event (token bucket). The next record kept for
+an event carries how many were dropped before it. INFO and above are never
+dropped.
+
+Besides the human-readable log, the JSON sink writes one object per line
+(time, level, location, message and the bound fields such as event and frame
+ids) to server_logs_*.jsonl for analysis.
+"""
+
+import sys
+import json
+import time
+import threading
+import traceback
+from loguru import logger
+
+import metrics
+
+CONSOLE_FORMAT = ("<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+                  "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>")
+FILE_FORMAT = "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}"
+LOG_ROTATION = "10 MB"  # Rotate each log file when it reaches this size
+LOG_RETENTION = "7 days"
+LOG_COMPRESSION = "zip"  # Rotated files are compressed on the writer thread
+LOG_SAMPLING = {  # event -> keep one in N of its DEBUG records
+    'frame_sent': 10,
+    'frame_skipped': 20,
+    'response_chunk': 10,
+    'non_text_response': 50,
+    'audio': 50,
+}
+LOG_RATE_LIMIT = 5.0  # DEBUG records per second per event after sampling
+LOG_RATE_BURST = 20  # Records an event may log at once after being quiet
+
+
+class EventSampler:
+    """loguru patcher that marks chatty DEBUG records to drop; sinks filter on keep()."""
+
+    def __init__(self, sampling=None, rate_limit=LOG_RATE_LIMIT, burst=LOG_RATE_BURST, level="DEBUG"):
+        self.sampling = dict(LOG_SAMPLING if sampling is None else sampling)
+        self.rate_limit = rate_limit  # None or 0: no rate limit
+        self.burst = burst
+        self.level_no = logger.level(level).no  # Records above this level are never dropped
+        self._lock = threading.Lock()
+        self._events = {}  # event -> [seen, kept, dropped since last kept, tokens, last refill]
+
+    def __call__(self, record):
+        event = record["extra"].get("event")
+        if event is None or record["level"].no > self.level_no:
+            return
+        now = time.monotonic()
+        with self._lock:
+            state = self._events.get(event)
+            if state is None:
+                state = self._events[event] = [0, 0, 0, float(self.burst), now]
+            state[0] += 1
+            keep = (state[0] - 1) % self.sampling.get(event, 1) == 0
+            if keep and self.rate_limit:
+                state[3] = min(float(self.burst), state[3] + (now - state[4]) * self.rate_limit)
+                state[4] = now
+                keep = state[3] >= 1.0
+                if keep:
+                    state[3] -= 1.0
+            if keep:
+                state[1] += 1
+                if state[2]:
+                    record["extra"]["suppressed"] = state[2]
+                    state[2] = 0
+                return
+            state[2] += 1
+        record["extra"]["_drop"] = True
+        metrics.LOG_SUPPRESSED.labels(event=event).inc()
+
+    @staticmethod
+    def keep(record):
+        return "_drop" not in record["extra"]
+
+    def stats(self):
+        with self._lock:
+            return {event: {'seen': seen, 'kept': kept} for event, (seen, kept, *_) in self._events.items()}
+
+
+def json_format(record):
+    """loguru format function: the record as one JSON object per line."""
+    payload = {
+        'time': record["time"].isoformat(timespec="milliseconds"),
+        'level': record["level"].name,
+        'module': record["name"],
+        'function': record["function"],
+        'line': record["line"],
+        'message': record["message"],
+    }
+    payload.update((key, value) for key, value in record["extra"].items() if not key.startswith("_"))
+    if record["exception"]:
+        payload['exception'] = "".join(traceback.format_exception(*record["exception"]))
+    record["extra"]["_json"] = json.dumps(payload, default=str)
+    return "{extra[_json]}\n"
+
+
+def configure_logging(log_filename=None, json_filename=None, console_level="INFO", file_level="DEBUG",
+                      enqueue=True, sampler=None):
+    """Replace loguru's handlers with console, text file and JSON file sinks. Returns the EventSampler."""
+    sampler = sampler or EventSampler()
+    logger.remove()
+    logger.configure(patcher=sampler)
+    logger.add(sys.stderr, level=console_level, format=CONSOLE_FORMAT, colorize=True, filter=sampler.keep,
+               enqueue=enqueue)
+    if log_filename:
+        logger.add(log_filename, level=file_level, format=FILE_FORMAT, filter=sampler.keep, enqueue=enqueue,
+                   rotation=LOG_ROTATION, retention=LOG_RETENTION, compression=LOG_COMPRESSION)
+    if json_filename:
+        logger.add(json_filename, level=file_level, format=json_format, filter=sampler.keep, enqueue=enqueue,
+                   rotation=LOG_ROTATION, retention=LOG_RETENTION, compression=LOG_COMPRESSION)
+    return sampler
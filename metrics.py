@@ -0,0 +1,290 @@
+"""
+Prometheus-style metrics and optional per-frame tracing for the streaming server.
+
+A small, dependency-free registry of counters, gauges and histograms that
+renders the Prometheus text exposition format (served at /metrics by
+server.py). Metrics are module-level so the capture, journal and store
+modules can record into them without knowing about the server; updates are
+thread-safe because the journal, activity and frame stores record from their
+writer threads.
+
+Per-frame spans (capture -> sent, with a child span for the send) go to
+OpenTelemetry when the opentelemetry-api package is installed and tracing is
+enabled; without an SDK configured they are no-ops.
+"""
+
+import math
+import time
+import threading
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # Tracing is optional
+    otel_trace = None
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 32768, 65536, 131072, 262144, 524288, 1048576, 2097152)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, **labels):
+        """The child metric for one combination of label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def _single(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; use .labels()")
+        return self._children[()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (name should end in _total)."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._single().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead."""
+        self.function = function
+
+    def render(self, name, labelnames, key):
+        value = self.function() if self.function else self.value
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(value)}"]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down (connections, queue depth)."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._single().set(value)
+
+    def inc(self, amount=1):
+        self._single().inc(amount)
+
+    def dec(self, amount=1):
+        self._single().dec(amount)
+
+    def set_function(self, function):
+        self._single().set_function(function)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def render(self, name, labelnames, key):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, [('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets (the last bucket is +Inf)."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=SECONDS_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._single().observe(value)
+
+
+class Registry:
+    """Named metrics rendered together for one scrape."""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Capture and send ---
+STAGE_SECONDS = Histogram("screen_stage_seconds", "Capture pipeline stage durations (capture, encode, crop, send, frame_age)",
+                          ["stage"])
+PAYLOAD_BYTES = Histogram("screen_payload_bytes", "Bytes uploaded per sent frame by kind (full, crop, text)",
+                          ["kind"], buckets=BYTES_BUCKETS)
+FRAMES = Counter("screen_frames_total", "Captured frames by outcome (sent, skipped, dropped, failed)", ["outcome"])
+QUEUE_DEPTH = Gauge("screen_frame_queue_depth", "Frames waiting to be sent")
+
+# --- Descriptions ---
+FIRST_CHUNK_SECONDS = Histogram("screen_description_first_chunk_seconds",
+                                "Time from a description request to the first response chunk", buckets=LATENCY_BUCKETS)
+FINAL_CHUNK_SECONDS = Histogram("screen_description_final_chunk_seconds",
+                                "Time from a description request to the last response chunk", buckets=LATENCY_BUCKETS)
+DESCRIPTIONS = Counter("screen_descriptions_total", "Descriptions assembled from response chunks")
+RESPONSE_CHUNKS = Counter("screen_response_chunks_total", "Text chunks received from Gemini")
+
+# --- Persistence ---
+WRITE_SECONDS = Histogram("screen_persistence_write_seconds",
+                          "Time per write batch in the persistence layer (journal, activity_store, frame_store)",
+                          ["store"])
+
+# --- Connections ---
+RECONNECTS = Counter("screen_gemini_reconnects_total", "Gemini Live sessions re-established after a failure")
+CONNECTED = Gauge("screen_gemini_connected", "1 while a Gemini Live session is up")
+PEER_CONNECTIONS = Gauge("screen_peer_connections", "Active WebRTC peer connections")
+PEER_CLOSED = Counter("screen_peer_connections_closed_total",
+                      "Peer connections closed by reason (closed, failed, idle, heartbeat, connect_timeout, ...)",
+                      ["reason"])
+PEER_OFFERS_REJECTED = Counter("screen_peer_offers_rejected_total", "Offers refused by admission control")
+PEER_SESSIONS = Gauge("screen_peer_sessions", "Remote screens streaming to their own Gemini session")
+
+# --- Logging ---
+LOG_SUPPRESSED = Counter("screen_log_lines_suppressed_total",
+                         "Hot-path debug log lines dropped by sampling or rate limiting", ["event"])
+
+# --- Tracing ---
+_tracer = None
+
+
+def enable_tracing(name="memory.screen"):
+    """Emit per-frame spans through OpenTelemetry. Returns False if opentelemetry-api is not installed."""
+    global _tracer
+    if otel_trace is None:
+        return False
+    _tracer = otel_trace.get_tracer(name)
+    return True
+
+
+def trace_frame(frame, send_seconds):
+    """One span from capture to sent, with the send as a child span."""
+    if _tracer is None:
+        return
+    end = time.time_ns()
+    send_start = end - int(send_seconds * 1e9)
+    span = _tracer.start_span("screen.frame", start_time=int(frame.captured_at * 1e9), attributes={
+        'frame.hash': frame.hash,
+        'frame.bytes': frame.size,
+        'frame.payload_bytes': frame.payload_size,
+        'frame.change': frame.change,
+        'frame.kind': frame_kind(frame),
+    })
+    child = _tracer.start_span("screen.send", context=otel_trace.set_span_in_context(span), start_time=send_start)
+    child.end(end_time=end)
+    span.end(end_time=end)
+
+
+def frame_kind(frame):
+    if frame.text:
+        return "text"
+    return "full" if frame.crop is None else "crop"
@@ -7,225 +7,462 @@ Reads the most recent Gemini description and provides a chat interface to ask ab
 import os
 import re
 import json
+import time
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify
+from aiohttp import web
 import google.generativeai as genai
 from dotenv import load_dotenv
+from context_watcher import ContextWatcher
+from answer_cache import AnswerCache
+from rollups import ActivityRollups
+from prompt_prefix import ContextPrefixCache, GeminiPrefixBackend, LocalPrefixBackend
+from activity_index import (ActivityIndex, format_chunks, estimate_tokens, parse_time_window,
+                            parse_timestamp, TIMESTAMP_FORMAT)
 
 # Load environment variables
 load_dotenv()
 
+# Retrieval settings: how much context each question gets
+RETRIEVAL_TOP_K = 8  # Most relevant chunks across all sessions
+RECENT_CONTEXT_CHARS = 6000  # Tail of the newest session, sent as the shared prompt prefix
+TIME_WINDOW_CONTEXT_CHARS = 40000  # Budget for entries when a question names a time window
+ACTIVITY_MAX_ENTRIES = 500  # Cap on entries returned by /activity
+ROLLUP_CONTEXT_CHARS = 12000  # Budget for session summaries when a question is about the big picture
+# Questions about the big picture are answered from rollups rather than a handful of raw entries
+BROAD_QUESTION_RE = re.compile(
+    r'\b(overall|overview|summar\w*|all day|today|this week|whole|entire|main focus|mostly|in general|'
+    r'how much time|how long|what have i been)\b', re.IGNORECASE)
+
+GEMINI_MODEL = 'gemini-2.5-flash-preview-05-20'
+CONTEXT_CACHING = True  # Register the prompt prefix as Gemini cached content
+
+# Serving settings
+MAX_CONCURRENT_CHATS = 16  # Gemini calls in flight at once; further chats wait for a slot
+CHAT_QUEUE_TIMEOUT = 15.0  # seconds a chat may wait for a slot before getting a 503
+CHAT_TIMEOUT = 90.0  # seconds for one answer (whole response, or the whole stream)
+ANSWER_CACHE = True  # Reuse answers to repeated questions until new descriptions arrive
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+
+class ChatBusyError(Exception):
+    """No chat slot became free within CHAT_QUEUE_TIMEOUT"""
+
+
 class ActivityChatBot:
-    def __init__(self):
-        # Configure Gemini API
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
+    def __init__(self, model=None, max_concurrent_chats=MAX_CONCURRENT_CHATS,
+                 chat_timeout=CHAT_TIMEOUT, queue_timeout=CHAT_QUEUE_TIMEOUT, cache_answers=ANSWER_CACHE,
+                 summarize=None):
+        if model is None:
+            # Configure Gemini API
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise ValueError("GEMINI_API_KEY not found in environment variables")
+            
+            genai.configure(api_key=api_key)
+            
+            # Use the correct model name based on research
+            model = genai.GenerativeModel(GEMINI_MODEL)
+            backend = GeminiPrefixBackend(model, GEMINI_MODEL) if CONTEXT_CACHING else LocalPrefixBackend(model)
+            summarize = summarize or (lambda prompt: model.generate_content(prompt).text)
+        else:
+            backend = LocalPrefixBackend(model)
+        self.model = model  # Anything with generate_content_async (a stub in the load test)
         
-        genai.configure(api_key=api_key)
+        # Bound the Gemini calls in flight; each chat holds a slot for its whole answer
+        self.chat_timeout = chat_timeout
+        self.queue_timeout = queue_timeout
+        self.max_concurrent_chats = max_concurrent_chats
+        self.chat_slots = asyncio.Semaphore(max_concurrent_chats)
+        self.active_chats = 0
+        self.chats_completed = 0
+        self.chats_rejected = 0
+        self.chats_timed_out = 0
         
-        # Use the correct model name based on research
-        self.model = genai.GenerativeModel('gemini-2.5-flash-preview-05-20')
+        # Repeated questions are answered from here while the indexed context is unchanged
+        self.answer_cache = AnswerCache() if cache_answers else None
         
-        # Load the most recent description
-        self.context = self.load_most_recent_description()
+        # Index every session so each question only carries the relevant chunks
+        self.index = ActivityIndex()
+        updated = self.index.refresh()
+        print(f"Activity index: {self.index.stats()} ({updated} file(s) re-indexed)")
         
-        # Initialize Flask app
-        self.app = Flask(__name__)
+        # 5-minute/hour/session summaries, built in the background as windows close (off with a
+        # stub model unless a summarize callable is passed)
+        self.rollups = ActivityRollups(self.index, summarize).start() if summarize else None
+        
+        # Instructions + newest-session tail, built once per context version and shared by all questions
+        self.prefix_cache = ContextPrefixCache(self.index, backend, context_chars=RECENT_CONTEXT_CHARS)
+        
+        # Follow the newest session as server.py appends to it; the index picks up new entries too
+        self.watcher = ContextWatcher(on_change=self.on_descriptions_changed).start()
+        snapshot = self.watcher.snapshot()
+        if snapshot:
+            print(f"Loaded {snapshot['characters']:,} characters from: {snapshot['file']}")
+        else:
+            print("No description files found yet")
+        
+        # Initialize the aiohttp app
+        self.app = web.Application()
         self.setup_routes()
+        self.app.on_cleanup.append(self.on_cleanup)
     
-    def find_most_recent_description(self):
-        """Find the most recent description file based on trailing timestamp"""
-        descriptions_dir = "gemini_descriptions"
-        if not os.path.exists(descriptions_dir):
-            raise FileNotFoundError(f"Directory {descriptions_dir} not found")
-        
-        # Get all description files
-        all_files = os.listdir(descriptions_dir)
-        print(f"Found {len(all_files)} total files in {descriptions_dir}")
-        
-        # Filter for description files
-        files = [f for f in all_files if f.startswith("descriptions_") and f.endswith(".md")]
-        print(f"Found {len(files)} description files: {files}")
-        
-        if not files:
-            raise FileNotFoundError("No description files found")
-        
-        # Extract timestamps and find the most recent
-        def extract_timestamp(filename):
-            # Extract timestamp from filename like descriptions_20250531_201602.md
-            # Format: descriptions_YYYYMMDD_HHMMSS.md
-            match = re.search(r'descriptions_(\d{8}_\d{6})\.md', filename)
-            if match:
-                timestamp = match.group(1)
-                print(f"Extracted timestamp '{timestamp}' from file '{filename}'")
-                return timestamp
-            else:
-                print(f"WARNING: Could not extract timestamp from file '{filename}'")
-                return "00000000_000000"
-        
-        # Create list of (filename, timestamp) tuples for debugging
-        file_timestamps = [(f, extract_timestamp(f)) for f in files]
-        print("File timestamps:")
-        for filename, timestamp in file_timestamps:
-            print(f"  {filename} -> {timestamp}")
-        
-        # Sort by timestamp (most recent first)
-        files.sort(key=extract_timestamp, reverse=True)
-        
-        most_recent = files[0]
-        most_recent_timestamp = extract_timestamp(most_recent)
-        
-        print(f"Selected most recent file: {most_recent} (timestamp: {most_recent_timestamp})")
-        
-        # Parse and display the timestamp in a readable format
-        try:
-            # Parse timestamp: YYYYMMDD_HHMMSS
-            date_part = most_recent_timestamp[:8]  # YYYYMMDD
-            time_part = most_recent_timestamp[9:]  # HHMMSS
-            
-            year = date_part[:4]
-            month = date_part[4:6]
-            day = date_part[6:8]
-            hour = time_part[:2]
-            minute = time_part[2:4]
-            second = time_part[4:6]
-            
-            readable_time = f"{year}-{month}-{day} {hour}:{minute}:{second}"
-            print(f"Most recent file timestamp: {readable_time}")
-            
-        except Exception as e:
-            print(f"Error parsing timestamp: {e}")
-        
-        return os.path.join(descriptions_dir, most_recent)
+    def on_descriptions_changed(self):
+        """Index new descriptions; cached answers were built from the old context, so drop them"""
+        if not self.index.refresh():
+            return
+        if self.answer_cache:
+            self.answer_cache.invalidate(self.index.version)
+        if self.rollups:
+            self.rollups.schedule()
     
-    def load_most_recent_description(self):
-        """Load the content of the most recent description file"""
-        try:
-            filepath = self.find_most_recent_description()
-            
-            # Check file size
-            file_size = os.path.getsize(filepath)
-            print(f"Loading file: {filepath}")
-            print(f"File size: {file_size:,} bytes")
-            
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            print(f"Successfully loaded {len(content):,} characters from: {os.path.basename(filepath)}")
-            return content
-            
-        except Exception as e:
-            print(f"Error loading description: {e}")
-            return "No screen activity context available."
+    def cached_answer(self, user_message, version):
+        if not self.answer_cache:
+            return None
+        answer = self.answer_cache.get(user_message, version)
+        if answer is not None:
+            print(f"Chat request: answered from cache ({self.answer_cache.stats()['hit_rate']:.0%} hit rate)")
+        return answer
     
-    def chat_with_gemini(self, user_message):
-        """Send message to Gemini with full context"""
-        try:
-            # Create the full prompt with context
-            full_prompt = f"""
-You are an AI assistant that can answer questions about screen activity and computer usage based on detailed descriptions.
-
-CONTEXT - Screen Activity Descriptions:
-{self.context}
+    def cache_answer(self, user_message, version, answer, tokens, latency):
+        if self.answer_cache and answer:
+            self.answer_cache.put(user_message, version, answer, tokens=tokens, latency=latency)
+    
+    @property
+    def context(self):
+        """Content of the newest session, kept current by the watcher"""
+        return self.watcher.content
+    
+    def reference_date(self):
+        """Date used for times given without one: the day of the newest indexed entry"""
+        latest = self.index.latest_timestamp()
+        if latest:
+            return datetime.strptime(latest, TIMESTAMP_FORMAT).date()
+        return datetime.now().date()
+    
+    def build_window_context(self, start, end):
+        """Entries in [start, end]; if they exceed the context budget, the window's 5-minute
+        or hourly summaries, and only as a last resort the entries thinned evenly"""
+        chunks = self.index.between(start, end)
+        total = sum(len(c['text']) for c in chunks)
+        if total > TIME_WINDOW_CONTEXT_CHARS and self.rollups:
+            for level in ('5min', 'hour'):
+                summaries = self.rollups.between(level, start, end)
+                if summaries and sum(len(s['text']) for s in summaries) <= TIME_WINDOW_CONTEXT_CHARS:
+                    print(f"Time window {start} - {end}: {len(summaries)} {level} summaries in context")
+                    return f"Summaries of activity between {start} and {end} ({level} windows):\n\n" + format_chunks(summaries)
+        if total > TIME_WINDOW_CONTEXT_CHARS:
+            step = total / TIME_WINDOW_CONTEXT_CHARS
+            chunks = [c for i, c in enumerate(chunks) if int(i % step) == 0]
+        print(f"Time window {start} - {end}: {len(chunks)} entries in context")
+        if not chunks:
+            return None
+        return f"Activity between {start} and {end}:\n\n" + format_chunks(chunks)
+    
+    def build_context(self, user_message, prefix, since):
+        """Question-specific context that follows the shared prefix: entries (or summaries) from a
+        time window named in the question, otherwise session summaries for big-picture questions,
+        top-k relevant chunks from all sessions and anything indexed after the prefix was built"""
+        window = parse_time_window(user_message, self.reference_date())
+        if window:
+            window_context = self.build_window_context(*window)
+            if window_context:
+                return window_context
+        
+        summaries = []
+        if self.rollups and BROAD_QUESTION_RE.search(user_message):
+            # Big-picture question: session summaries, plus a few raw entries to drill into
+            summaries = self.rollups.sessions(max_chars=ROLLUP_CONTEXT_CHARS)
+        relevant = self.index.search(user_message, k=RETRIEVAL_TOP_K // 2 if summaries else RETRIEVAL_TOP_K)
+        
+        # Don't repeat chunks the prefix or the new-activity section already carry
+        skip = prefix.keys | {(c['session'], int(c['position'])) for c in since}
+        relevant = [c for c in relevant if (c['session'], int(c['position'])) not in skip]
+        
+        sections = []
+        if summaries:
+            sections.append("Session summaries:\n\n" + format_chunks(summaries))
+        if relevant:
+            sections.append("Most relevant excerpts (all sessions):\n\n" + format_chunks(relevant))
+        if since:
+            sections.append("Activity since the context above:\n\n" + format_chunks(since))
+        return "\n\n---\n\n".join(sections)
+    
+    def build_prompt(self, user_message):
+        """Prompt for a question: returns (prefix, prompt, context) where the shared prefix
+        (instructions + recent activity) goes first and prompt is the per-question part"""
+        prefix, since = self.prefix_cache.current()
+        context = self.build_context(user_message, prefix, since)
+        
+        prompt = f"""
+{context}
 
 USER QUESTION: {user_message}
 
-Please answer the user's question based on the screen activity context provided above. Focus on:
-- What applications were being used
-- What tasks were being performed  
-- What problems or issues were encountered
-- Timeline of activities
-- Technical details from the logs and code
-- Any patterns or insights about the user's workflow
-
-Provide a helpful, detailed response based on the available context.
+Please answer the user's question based on the screen activity context provided above.
 """
-            
-            # Generate response using Gemini
-            response = self.model.generate_content(full_prompt)
-            
-            return response.text
-            
+        return prefix, prompt, context
+    
+    def log_usage(self, prefix, prompt, context, response, timing=""):
+        """Print context size and token counts for one request; returns the total token count"""
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', None) or estimate_tokens(prefix.text + prompt)
+        cached_tokens = getattr(usage, 'cached_content_token_count', None) or 0
+        output_tokens = getattr(usage, 'candidates_token_count', None)
+        print(f"Chat request: context {len(context):,} chars, prompt tokens {prompt_tokens:,} "
+              f"({cached_tokens:,} cached), output tokens {output_tokens}{timing}")
+        return prompt_tokens + (output_tokens or 0)
+    
+    @asynccontextmanager
+    async def chat_slot(self):
+        """Hold one of the concurrent chat slots; ChatBusyError if none frees up in time"""
+        try:
+            await asyncio.wait_for(self.chat_slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.chats_rejected += 1
+            raise ChatBusyError(f"Too many concurrent chats ({self.max_concurrent_chats}); try again shortly")
+        self.active_chats += 1
+        try:
+            yield
+        finally:
+            self.active_chats -= 1
+            self.chat_slots.release()
+    
+    async def chat_with_gemini(self, user_message):
+        """Send message to Gemini with the retrieved context"""
+        version = self.index.version
+        cached = self.cached_answer(user_message, version)
+        if cached is not None:
+            return cached
+        
+        try:
+            async with self.chat_slot():
+                # Retrieval hits SQLite; keep it off the event loop
+                prefix, prompt, context = await asyncio.to_thread(self.build_prompt, user_message)
+                
+                # Generate response using Gemini
+                start = time.perf_counter()
+                response = await asyncio.wait_for(self.prefix_cache.generate(prefix, prompt), self.chat_timeout)
+                
+                elapsed = time.perf_counter() - start
+                tokens = self.log_usage(prefix, prompt, context, response, f", total {elapsed:.2f}s")
+                self.chats_completed += 1
+                self.cache_answer(user_message, version, response.text, tokens, elapsed)
+                
+                return response.text
+        
+        except ChatBusyError:
+            raise
+        except asyncio.TimeoutError:
+            self.chats_timed_out += 1
+            return f"Error generating response: no answer within {self.chat_timeout:g}s"
         except Exception as e:
             return f"Error generating response: {str(e)}"
     
+    async def stream_chat_with_gemini(self, user_message):
+        """Yield the answer in pieces as Gemini generates it"""
+        version = self.index.version
+        cached = self.cached_answer(user_message, version)
+        if cached is not None:
+            yield cached
+            return
+        
+        async with self.chat_slot():
+            prefix, prompt, context = await asyncio.to_thread(self.build_prompt, user_message)
+            
+            start = time.perf_counter()
+            deadline = start + self.chat_timeout
+            first_token = None
+            pieces = []
+            try:
+                response = await asyncio.wait_for(
+                    self.prefix_cache.generate(prefix, prompt, stream=True), self.chat_timeout)
+                chunks = response.__aiter__()
+                while True:
+                    # One deadline for the whole stream, not per chunk
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), deadline - time.perf_counter())
+                    except StopAsyncIteration:
+                        break
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        continue  # Chunk without text parts (e.g. only safety ratings)
+                    if not text:
+                        continue
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                        print(f"Chat stream: time to first token {first_token:.2f}s")
+                    pieces.append(text)
+                    yield text
+            except asyncio.TimeoutError:
+                self.chats_timed_out += 1
+                raise TimeoutError(f"no complete answer within {self.chat_timeout:g}s")
+            
+            elapsed = time.perf_counter() - start
+            ttft = f"{first_token:.2f}s" if first_token is not None else "n/a"
+            tokens = self.log_usage(prefix, prompt, context, response,
+                                    f", time to first token {ttft}, total {elapsed:.2f}s")
+            self.chats_completed += 1
+            self.cache_answer(user_message, version, "".join(pieces), tokens, elapsed)
+    
+    def chat_stats(self):
+        return {
+            'max_concurrent_chats': self.max_concurrent_chats,
+            'active_chats': self.active_chats,
+            'completed': self.chats_completed,
+            'rejected': self.chats_rejected,
+            'timed_out': self.chats_timed_out,
+            'answer_cache': self.answer_cache.stats() if self.answer_cache else None,
+            'prompt_prefix': self.prefix_cache.stats(),
+            'rollups': self.rollups.stats() if self.rollups else None,
+        }
+    
+    async def read_message(self, request):
+        """The 'message' field of a JSON chat request, or '' if missing or malformed"""
+        try:
+            data = await request.json()
+        except ValueError:
+            return ''
+        return data.get('message', '') if isinstance(data, dict) else ''
+    
     def setup_routes(self):
-        """Setup Flask routes"""
+        """Setup aiohttp routes"""
         
-        @self.app.route('/')
-        def index():
-            return render_template('chat.html')
+        async def index(request):
+            return web.FileResponse(os.path.join(TEMPLATES_DIR, 'chat.html'))
         
-        @self.app.route('/chat', methods=['POST'])
-        def chat():
-            data = request.json
-            user_message = data.get('message', '')
+        async def chat(request):
+            user_message = await self.read_message(request)
             
             if not user_message:
-                return jsonify({'error': 'No message provided'}), 400
+                return web.json_response({'error': 'No message provided'}, status=400)
             
             # Get response from Gemini
-            response = self.chat_with_gemini(user_message)
+            try:
+                response = await self.chat_with_gemini(user_message)
+            except ChatBusyError as e:
+                return web.json_response({'error': str(e)}, status=503, headers={'Retry-After': '5'})
             
-            return jsonify({
+            return web.json_response({
                 'response': response,
                 'timestamp': datetime.now().isoformat()
             })
         
-        @self.app.route('/context')
-        def get_context():
-            """Get information about the loaded context"""
-            filepath = self.find_most_recent_description()
-            lines = self.context.split('\n')
+        async def chat_stream(request):
+            """Same as /chat, but streams the answer as server-sent events"""
+            user_message = await self.read_message(request)
+            
+            if not user_message:
+                return web.json_response({'error': 'No message provided'}, status=400)
             
-            # Extract timestamp from filename for display
-            filename = os.path.basename(filepath)
-            timestamp_match = re.search(r'descriptions_(\d{8}_\d{6})\.md', filename)
-            readable_timestamp = "Unknown"
+            response = web.StreamResponse(headers={
+                'Content-Type': 'text/event-stream',
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no',  # Don't let a proxy buffer the stream
+            })
+            await response.prepare(request)
+            stream = self.stream_chat_with_gemini(user_message)
+            try:
+                async for text in stream:
+                    await response.write(f"data: {json.dumps({'text': text})}\n\n".encode())
+                await response.write(f"event: done\ndata: {json.dumps({'timestamp': datetime.now().isoformat()})}\n\n".encode())
+            except ChatBusyError as e:
+                await response.write(f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n".encode())
+            except ConnectionResetError:
+                raise  # Client went away
+            except Exception as e:
+                await response.write(f"event: error\ndata: {json.dumps({'error': f'Error generating response: {e}'})}\n\n".encode())
+            finally:
+                await stream.aclose()  # Releases the chat slot even if the client disconnected
+            await response.write_eof()
+            return response
+        
+        async def activity(request):
+            """Descriptions between ?start= and ?end= (YYYY-MM-DD HH:MM[:SS], or HH:MM on the latest day)"""
+            reference = self.reference_date()
+            try:
+                start = parse_timestamp(request.query.get('start', '00:00'), reference)
+                end = parse_timestamp(request.query.get('end', '23:59:59'), reference)
+                limit = min(int(request.query.get('limit', ACTIVITY_MAX_ENTRIES)), ACTIVITY_MAX_ENTRIES)
+            except ValueError as e:
+                return web.json_response({'error': str(e)}, status=400)
+            if len(request.query.get('end', '')) == 10:
+                end = end.replace(hour=23, minute=59, second=59)  # A bare end date covers the whole day
             
-            if timestamp_match:
-                timestamp = timestamp_match.group(1)
-                try:
-                    date_part = timestamp[:8]
-                    time_part = timestamp[9:]
-                    year = date_part[:4]
-                    month = date_part[4:6]
-                    day = date_part[6:8]
-                    hour = time_part[:2]
-                    minute = time_part[2:4]
-                    second = time_part[4:6]
-                    readable_timestamp = f"{year}-{month}-{day} {hour}:{minute}:{second}"
-                except:
-                    pass
+            start_key = start.strftime(TIMESTAMP_FORMAT)
+            end_key = end.strftime(TIMESTAMP_FORMAT)
+            entries = self.index.between(start_key, end_key, limit=limit)
             
-            return jsonify({
-                'file': filename,
-                'timestamp': readable_timestamp,
-                'lines': len(lines),
-                'characters': len(self.context),
-                'preview': self.context[:500] + "..." if len(self.context) > 500 else self.context
+            return web.json_response({
+                'start': start_key,
+                'end': end_key,
+                'total': self.index.count_between(start_key, end_key),
+                'count': len(entries),
+                'entries': [{'session': e['session'], 'timestamp': e['timestamp'], 'text': e['text']} for e in entries]
             })
+        
+        async def get_context(request):
+            """Get information about the loaded context (cached; no file system access)"""
+            snapshot = self.watcher.snapshot()
+            if snapshot is None:
+                return web.json_response({'error': 'No description files found'}, status=404)
+            snapshot['chat'] = self.chat_stats()
+            return web.json_response(snapshot)
+        
+        self.app.router.add_get('/', index)
+        self.app.router.add_post('/chat', chat)
+        self.app.router.add_post('/chat/stream', chat_stream)
+        self.app.router.add_get('/activity', activity)
+        self.app.router.add_get('/context', get_context)
+    
+    async def on_cleanup(self, app):
+        self.watcher.stop()
+        if self.rollups:
+            self.rollups.stop()
+        await asyncio.to_thread(self.prefix_cache.close)  # Delete provider-side cached contexts
     
-    def run(self, debug=True, port=5000):
-        """Run the Flask app"""
+    async def serve(self, host, port):
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        print(f"Server starting on http://{host}:{port}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+    
+    def run(self, debug=False, host='127.0.0.1', port=5000):
+        """Run the aiohttp app; debug enables asyncio debug mode (slow-callback warnings)"""
         print(f"Starting Activity Chat Bot...")
         print(f"Context loaded: {len(self.context):,} characters")
-        print(f"Server starting on http://localhost:{port}")
-        self.app.run(debug=debug, port=port)
+        print(f"Up to {self.max_concurrent_chats} concurrent chats, {self.chat_timeout:g}s per answer")
+        try:
+            asyncio.run(self.serve(host, port), debug=debug)
+        except KeyboardInterrupt:
+            pass
 
 def main():
+    parser = argparse.ArgumentParser(description="Chat about your screen activity")
+    parser.add_argument('--host', default=os.getenv('CHAT_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('CHAT_PORT', '5000')))
+    parser.add_argument('--debug', action='store_true', help="asyncio debug mode (development only)")
+    args = parser.parse_args()
+    
     try:
         # Create and run the chat bot
         bot = ActivityChatBot()
-        bot.run()
+        bot.run(debug=args.debug, host=args.host, port=args.port)
         
     except Exception as e:
         print(f"Error starting application: {e}")
         print("\nMake sure you have:")
         print("1. GEMINI_API_KEY in your .env file")
         print("2. gemini_descriptions/ directory with description files")
-        print("3. Required dependencies: pip install flask google-generativeai python-dotenv")
+        print("3. Required dependencies: pip install -r requirements.txt")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,311 @@
+"""
+Per-peer Gemini sessions for screens streamed to the server over WebRTC.
+
+Each remote peer's video track is subscribed through the server's MediaRelay
+without buffering, so the relay keeps only the newest decoded frame. A
+PeerSession samples that track every sample_interval seconds, converts the
+frame to RGB on a shared worker pool, has the manager's FrameEncoder
+(encoding.py) resize and encode it (there, or on the encoder's own pool),
+runs it through the same FrameChangeDetector/FrameQueue pipeline as the local
+capture, and streams it to the peer's own Gemini Live session. Descriptions go to the peer's own
+journal (descriptions_<start>_<peer>.md/.jsonl/.html), so the chat app
+indexes remote sessions like local ones.
+
+PeerSessionManager caps the number of concurrent sessions and reports
+per-session resource use: frames sampled/sent, upload bytes, encode time,
+descriptions and reconnects.
+"""
+
+import time
+import asyncio
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from aiortc.mediastreams import MediaStreamError
+from google.genai import types
+from loguru import logger
+
+import metrics
+from capture import SIGNATURE_SIZE, CapturedFrame, FrameChangeDetector, FrameQueue, StageTimer
+from encoding import FrameEncoder
+from journal import DescriptionJournal
+from turns import TurnAssembler, extract_response_text, is_turn_complete
+
+MAX_PEER_SESSIONS = 4  # Concurrent remote sessions (each holds a Gemini Live connection)
+PEER_SAMPLE_INTERVAL = 2.0  # seconds between frames taken from a peer's track
+PEER_MAX_FRAME_WIDTH = 1920  # Wider frames are downscaled before encoding
+PEER_JPEG_QUALITY = 80
+PEER_QUEUE_SIZE = 2  # Frames waiting to be sent per peer; older ones are dropped
+ENCODE_WORKERS = 4  # Threads shared by all peers for frame conversion (and encoding, with an inline encoder)
+DESCRIBE_PROMPT = "Describe what you see on the screen in detail."
+RECONNECT_BASE_DELAY = 1.0  # seconds; doubles per failed attempt
+RECONNECT_MAX_DELAY = 60.0
+
+
+class SessionLimitError(Exception):
+    """Raised when a peer session would exceed the concurrent session cap."""
+
+
+def encode_video_frame(encoder, video_frame, max_width=PEER_MAX_FRAME_WIDTH, jpeg_quality=PEER_JPEG_QUALITY):
+    """Decoded av.VideoFrame -> EncodedImage with its signature, downscaled to max_width."""
+    pixels = np.ascontiguousarray(video_frame.to_ndarray(format="rgb24"))
+    return encoder.encode(pixels, (video_frame.width, video_frame.height), "RGB", quality=jpeg_quality,
+                          max_width=max_width, signature_size=SIGNATURE_SIZE)
+
+
+class PeerSession:
+    """One remote screen: sampled track -> change detection -> its own Gemini session and journal."""
+
+    def __init__(self, peer_id, track, connect, executor, encoder, descriptions_dir, prompt,
+                 sample_interval=PEER_SAMPLE_INTERVAL, max_width=PEER_MAX_FRAME_WIDTH,
+                 jpeg_quality=PEER_JPEG_QUALITY, queue_size=PEER_QUEUE_SIZE, activity_store=None,
+                 turn_idle_timeout=5.0):
+        self.peer_id = peer_id
+        self.track = track  # Unbuffered MediaRelay subscription
+        self.connect = connect  # () -> async context manager yielding a Live session
+        self.executor = executor
+        self.encoder = encoder
+        self.prompt = prompt
+        self.sample_interval = sample_interval
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self.activity_store = activity_store
+        self.session_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{peer_id[:8].lower()}"
+        self.journal = DescriptionJournal(descriptions_dir, self.session_id)
+        self.detector = FrameChangeDetector()
+        self.queue = FrameQueue(maxsize=queue_size)
+        self.timer = StageTimer()
+        self.assembler = TurnAssembler(self._save_turn, idle_timeout=turn_idle_timeout)
+
+        self.started_at = time.time()
+        self.frames_sampled = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.encode_seconds = 0.0  # Conversion + encode time per sampled frame
+        self.connected = False
+        self.connects = 0
+        self.last_error = None
+        self._running = False
+        self._stopping = False  # stop() was called while start() was still opening the journal
+        self._tasks = []
+
+    async def start(self):
+        await asyncio.to_thread(self.journal.open)
+        if self._stopping:
+            # Removed (e.g. its track ended) while starting; don't open a Gemini session nobody tracks
+            self.track.stop()
+            await asyncio.to_thread(self.journal.close)
+            logger.info(f"Peer session {self.session_id} stopped before it started")
+            return self
+        if self.activity_store:
+            self.activity_store.start_session(self.session_id)
+        self._running = True
+        self._tasks = [
+            asyncio.create_task(self._sample_track(), name=f"peer-sample-{self.session_id}"),
+            asyncio.create_task(self._run_gemini(), name=f"peer-gemini-{self.session_id}"),
+        ]
+        logger.info(f"Peer session {self.session_id} started (sampling every {self.sample_interval}s)")
+        return self
+
+    async def stop(self):
+        if not self._running:
+            self._stopping = True  # start() checks this once its await returns
+            return
+        self._running = False
+        self.track.stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.assembler.flush()
+        await asyncio.to_thread(self.journal.close)
+        logger.info(f"Peer session {self.session_id} stopped: {self.stats()}")
+
+    # --- Track sampling ---
+
+    async def _sample_track(self):
+        """Take the newest frame every sample_interval; the unbuffered relay drops the rest."""
+        loop = asyncio.get_running_loop()
+        next_sample = loop.time()
+        try:
+            while self._running:
+                delay = next_sample - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                next_sample = max(next_sample + self.sample_interval, loop.time())
+                video_frame = await self.track.recv()
+                start = time.perf_counter()
+                encoded = await loop.run_in_executor(
+                    self.executor, encode_video_frame, self.encoder, video_frame, self.max_width, self.jpeg_quality)
+                encode_seconds = time.perf_counter() - start
+                self.timer.record('encode', encode_seconds)
+                self.encode_seconds += encode_seconds
+                frame = CapturedFrame(encoded.data, encoded.width, encoded.height, encoded.signature, time.time(),
+                                      mime_type=encoded.mime_type)
+                self.frames_sampled += 1
+                send = self.detector.should_send(frame.signature)
+                frame.change = self.detector.last_change
+                if send:
+                    self.queue.put_latest(frame)
+                else:
+                    metrics.FRAMES.labels(outcome='skipped').inc()
+                    if self.activity_store:
+                        self.activity_store.record_frame(self.session_id, frame, sent=False)
+        except MediaStreamError:
+            logger.info(f"Peer session {self.session_id}: track ended")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Peer session {self.session_id}: error sampling track: {e}")
+            self.last_error = f"sample: {e}"
+
+    # --- Gemini session ---
+
+    async def _run_gemini(self):
+        """Keep this peer's Live session up, reconnecting with backoff."""
+        attempt = 0
+        while self._running:
+            started = time.monotonic()
+            try:
+                await self._run_session()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Peer session {self.session_id}: Gemini session failed: {e}")
+            self.connected = False
+            if time.monotonic() - started >= RECONNECT_MAX_DELAY:
+                attempt = 0
+            delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * (2 ** attempt))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _run_session(self):
+        async with self.connect() as session:
+            self.connects += 1
+            self.connected = True
+            if self.connects > 1:
+                metrics.RECONNECTS.inc()
+            await session.send_realtime_input(text=self.prompt)
+            self.assembler.mark_request()
+            tasks = [asyncio.create_task(self._send_frames(session)),
+                     asyncio.create_task(self._receive(session))]
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()  # Surface the error that ended the session
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                self.assembler.flush()  # Requests this session left unanswered must not pair with the next one's turns
+
+    async def _send_frames(self, session):
+        while True:
+            frame = await self.queue.get()
+            start = time.perf_counter()
+            try:
+                await session.send_realtime_input(media=types.Blob(data=frame.payload, mime_type=frame.mime_type))
+            except Exception:
+                self.queue.put_back(frame)  # Goes out first on the next session
+                raise
+            send_seconds = time.perf_counter() - start
+            self.timer.record('send', send_seconds)
+            self.frames_sent += 1
+            self.bytes_sent += frame.payload_size
+            metrics.FRAMES.labels(outcome='sent').inc()
+            metrics.PAYLOAD_BYTES.labels(kind=metrics.frame_kind(frame)).observe(frame.payload_size)
+            if self.activity_store:
+                self.activity_store.record_frame(self.session_id, frame, sent=True, send_latency=send_seconds)
+            if self.detector.should_describe():
+                await session.send_realtime_input(text=DESCRIBE_PROMPT)
+                self.assembler.mark_request()
+
+    async def _receive(self, session):
+        while True:
+            async for response in session.receive():
+                text = extract_response_text(response)
+                if text:
+                    self.assembler.add_chunk(text)
+                    metrics.RESPONSE_CHUNKS.inc()
+                if is_turn_complete(response):
+                    self.assembler.complete_turn()
+            await asyncio.sleep(0.1)  # receive() ends after each turn; listen again
+
+    def _save_turn(self, record):
+        metrics.DESCRIPTIONS.inc()
+        if 'first_chunk_latency' in record:
+            metrics.FIRST_CHUNK_SECONDS.observe(record['first_chunk_latency'])
+            metrics.FINAL_CHUNK_SECONDS.observe(record['last_chunk_latency'])
+        fields = {key: value for key, value in record.items() if key not in ('text', 'timestamp')}
+        saved = self.journal.append(record['text'], timestamp=record['timestamp'], **fields)
+        if self.activity_store:
+            self.activity_store.record_description(self.session_id, saved)
+
+    def stats(self):
+        return {
+            'session': self.session_id,
+            'age_seconds': round(time.time() - self.started_at, 1),
+            'connected': self.connected,
+            'connects': self.connects,
+            'frames_sampled': self.frames_sampled,
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.queue.dropped,
+            'bytes_sent': self.bytes_sent,
+            'encode_seconds': round(self.encode_seconds, 2),
+            'descriptions': self.journal.entry_count,
+            'timings': self.timer.summary(),
+            'last_error': self.last_error,
+        }
+
+
+class PeerSessionManager:
+    """Admission control and bookkeeping for concurrent PeerSessions."""
+
+    def __init__(self, connect, descriptions_dir, prompt, max_sessions=MAX_PEER_SESSIONS,
+                 encode_workers=ENCODE_WORKERS, encoder=None, **session_options):
+        self.connect = connect
+        self.descriptions_dir = descriptions_dir
+        self.prompt = prompt
+        self.max_sessions = max_sessions
+        self.session_options = session_options
+        self.sessions = {}
+        self.rejected = 0
+        self.completed = 0
+        self._executor = ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix="peer-encode")
+        self.encoder = encoder or FrameEncoder('inline')  # Inline encodes on the peer-encode threads
+
+    def full(self):
+        return len(self.sessions) >= self.max_sessions
+
+    async def add(self, peer_id, track):
+        """Start a session for a peer's (relayed) video track. Raises SessionLimitError at the cap."""
+        if peer_id in self.sessions:
+            await self.remove(peer_id)
+        if self.full():
+            self.rejected += 1
+            raise SessionLimitError(f"{len(self.sessions)}/{self.max_sessions} peer sessions active")
+        session = PeerSession(peer_id, track, self.connect, self._executor, self.encoder, self.descriptions_dir,
+                              self.prompt, **self.session_options)
+        self.sessions[peer_id] = session
+        await session.start()
+        return session
+
+    async def remove(self, peer_id):
+        session = self.sessions.pop(peer_id, None)
+        if session:
+            await session.stop()
+            self.completed += 1
+
+    async def close(self):
+        await asyncio.gather(*(self.remove(peer_id) for peer_id in list(self.sessions)))
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            'active': len(self.sessions),
+            'max_sessions': self.max_sessions,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'encoder': self.encoder.stats(),
+            'sessions': [session.stats() for session in self.sessions.values()],
+        }
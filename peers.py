@@ -0,0 +1,258 @@
+"""
+Lifecycle of the WebRTC peer connections accepted on /offer.
+
+PeerRegistry owns every RTCPeerConnection the server creates, replacing the
+old module-level set that only forgot a peer when its connection "failed".
+A peer is closed and dropped (connection, event handlers, relay and any
+per-peer session) when:
+
+- its connection state becomes "failed" or "closed"
+- it stays "disconnected" longer than disconnected_grace
+- it never reaches "connected" within connect_timeout
+- nothing arrives from it (RTP/DTLS bytes or datachannel messages) for idle_timeout
+- it has used the ping/pong datachannel but stopped answering for heartbeat_timeout
+
+The server also pings each open datachannel every heartbeat_interval ("ping
+<ms>"; clients answer "pong <ms>", as the server does for client pings).
+Admission control caps the number of live peers; offers past the cap are
+rejected before any connection is created.
+"""
+
+import time
+import asyncio
+from aiortc import RTCPeerConnection
+from aiortc.contrib.media import MediaRelay
+from loguru import logger
+
+import metrics
+
+MAX_PEERS = 16  # Live peer connections; further offers are rejected
+CONNECT_TIMEOUT = 30.0  # seconds for a new peer to reach "connected"
+DISCONNECTED_GRACE = 15.0  # seconds a "disconnected" peer has to recover
+IDLE_TIMEOUT = 60.0  # seconds without inbound bytes or datachannel messages
+HEARTBEAT_INTERVAL = 5.0  # seconds between server pings on a peer's datachannel
+HEARTBEAT_TIMEOUT = 20.0  # seconds without ping/pong from a peer that has sent one before
+SWEEP_INTERVAL = 2.0  # seconds between timeout checks
+
+
+class PeerLimitError(Exception):
+    """Raised when an offer would exceed the peer connection cap."""
+
+
+class Peer:
+    """One remote peer: its connection plus what the registry tracks about it."""
+
+    def __init__(self, peer_id, pc, remote=None):
+        self.peer_id = peer_id
+        self.pc = pc
+        self.remote = remote
+        self.relay = MediaRelay()  # Per peer, so relay state goes away with the connection
+        self.channel = None
+        self.created_at = time.time()
+        self.state = pc.connectionState
+        now = time.monotonic()
+        self.state_since = now
+        self.last_activity = now
+        self.last_heartbeat = None  # Last ping/pong from the peer; None until it uses the channel
+        self.last_ping_sent = 0.0
+        self.bytes_in = 0  # DTLS transport bytes received (media and bundled datachannel)
+        self.channel_messages = 0
+        self.channel_bytes = 0
+        self.close_reason = None
+
+    def set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self.state_since = time.monotonic()
+
+    def on_channel_message(self, message):
+        """Datachannel traffic counts as activity; pings are answered, pings and pongs are heartbeats."""
+        now = time.monotonic()
+        self.last_activity = now
+        self.channel_messages += 1
+        self.channel_bytes += len(message)
+        if isinstance(message, str):
+            if message.startswith("ping"):
+                self.last_heartbeat = now
+                self.send("pong" + message[4:])
+            elif message.startswith("pong"):
+                self.last_heartbeat = now
+
+    def send(self, message):
+        channel = self.channel
+        if channel is not None and channel.readyState == "open":
+            try:
+                channel.send(message)
+            except Exception as e:
+                logger.debug(f"Peer {self.peer_id}: datachannel send failed: {e}")
+
+    async def refresh_bytes(self):
+        """Update bytes_in from the connection's transport stats; True if anything new arrived."""
+        try:
+            report = await self.pc.getStats()
+        except Exception:
+            return False
+        received = sum(getattr(s, 'bytesReceived', 0) for s in report.values() if s.type == "transport")
+        if received > self.bytes_in:
+            self.bytes_in = received
+            self.last_activity = time.monotonic()
+            return True
+        return False
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'peer': self.peer_id,
+            'remote': self.remote,
+            'state': self.state,
+            'age_seconds': round(time.time() - self.created_at, 1),
+            'idle_seconds': round(now - self.last_activity, 1),
+            'bytes_in': self.bytes_in,
+            'channel_messages': self.channel_messages,
+            'heartbeat_age_seconds': round(now - self.last_heartbeat, 1) if self.last_heartbeat else None,
+        }
+
+
+class PeerRegistry:
+    """Admission control, state handling and timeouts for the server's peer connections."""
+
+    def __init__(self, max_peers=MAX_PEERS, connect_timeout=CONNECT_TIMEOUT, disconnected_grace=DISCONNECTED_GRACE,
+                 idle_timeout=IDLE_TIMEOUT, heartbeat_interval=HEARTBEAT_INTERVAL,
+                 heartbeat_timeout=HEARTBEAT_TIMEOUT, sweep_interval=SWEEP_INTERVAL, on_track=None, on_close=None):
+        self.max_peers = max_peers
+        self.connect_timeout = connect_timeout
+        self.disconnected_grace = disconnected_grace
+        self.idle_timeout = idle_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.sweep_interval = sweep_interval
+        self.on_track = on_track  # (peer, track) -> None, called as tracks arrive during negotiation
+        self.on_close = on_close  # async (peer) -> None, release per-peer resources
+        self.peers = {}
+        self.admitted = 0
+        self.rejected = 0
+        self.closed = {}  # reason -> count
+        self._sweeper = None
+
+    def __len__(self):
+        return len(self.peers)
+
+    def full(self):
+        return len(self.peers) >= self.max_peers
+
+    def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop(), name="peer-sweeper")
+        return self
+
+    async def accept(self, offer, peer_id, remote=None):
+        """Create a peer for an SDP offer and answer it. Raises PeerLimitError at the cap."""
+        if self.full():
+            self.rejected += 1
+            metrics.PEER_OFFERS_REJECTED.inc()
+            raise PeerLimitError(f"{len(self.peers)}/{self.max_peers} peer connections active")
+        peer = Peer(peer_id, RTCPeerConnection(), remote)
+        self.peers[peer_id] = peer
+        self.admitted += 1
+        self._bind(peer)
+        try:
+            await peer.pc.setRemoteDescription(offer)
+            await peer.pc.setLocalDescription(await peer.pc.createAnswer())
+        except Exception:
+            await self.close(peer_id, "negotiation")
+            raise
+        return peer
+
+    def _bind(self, peer):
+        pc = peer.pc
+
+        @pc.on("datachannel")
+        def on_datachannel(channel):
+            peer.channel = channel
+            channel.on("message", peer.on_channel_message)
+
+        @pc.on("connectionstatechange")
+        async def on_connectionstatechange():
+            logger.info(f"Peer {peer.peer_id}: connection state is {pc.connectionState}")
+            peer.set_state(pc.connectionState)
+            if pc.connectionState in ("failed", "closed"):
+                await self.close(peer.peer_id, pc.connectionState)
+
+        @pc.on("track")
+        def on_track(track):
+            peer.last_activity = time.monotonic()
+            if self.on_track:
+                self.on_track(peer, track)
+
+    async def close(self, peer_id, reason):
+        """Close and forget a peer; safe to call more than once."""
+        peer = self.peers.pop(peer_id, None)
+        if peer is None:
+            return
+        peer.close_reason = reason
+        self.closed[reason] = self.closed.get(reason, 0) + 1
+        metrics.PEER_CLOSED.labels(reason=reason).inc()
+        logger.info(f"Peer {peer_id} closed ({reason}) after {time.time() - peer.created_at:.0f}s, "
+                    f"{peer.bytes_in} bytes in")
+        try:
+            if self.on_close:
+                await self.on_close(peer)
+        except Exception as e:
+            logger.warning(f"Peer {peer_id}: error releasing resources: {e}")
+        try:
+            await peer.pc.close()
+        except Exception as e:
+            logger.warning(f"Peer {peer_id}: error closing connection: {e}")
+        # Handlers close over the peer; drop them so nothing keeps the connection alive
+        peer.pc.remove_all_listeners()
+        if peer.channel is not None:
+            peer.channel.remove_all_listeners()
+            peer.channel = None
+        peer.relay = None
+
+    async def close_all(self, reason="shutdown"):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        await asyncio.gather(*(self.close(peer_id, reason) for peer_id in list(self.peers)))
+
+    async def sweep(self):
+        """Close peers past a timeout and ping the open datachannels."""
+        now = time.monotonic()
+        for peer in list(self.peers.values()):
+            reason = None
+            if peer.state in ("new", "connecting") and now - peer.state_since > self.connect_timeout:
+                reason = "connect_timeout"
+            elif peer.state == "disconnected" and now - peer.state_since > self.disconnected_grace:
+                reason = "disconnected"
+            elif peer.state == "connected":
+                await peer.refresh_bytes()
+                if now - peer.last_activity > self.idle_timeout:
+                    reason = "idle"
+                elif peer.last_heartbeat is not None and now - peer.last_heartbeat > self.heartbeat_timeout:
+                    reason = "heartbeat"
+                elif now - peer.last_ping_sent >= self.heartbeat_interval:
+                    peer.last_ping_sent = now
+                    peer.send(f"ping {int(time.time() * 1000)}")
+            if reason:
+                await self.close(peer.peer_id, reason)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping peer connections: {e}")
+
+    def stats(self):
+        return {
+            'count': len(self.peers),
+            'max_peers': self.max_peers,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'closed': dict(self.closed),
+            'bytes_in': sum(peer.bytes_in for peer in self.peers.values()),
+            'peers': [peer.stats() for peer in self.peers.values()],
+        }
@@ -0,0 +1,216 @@
+"""
+Reusable prompt prefix for chat questions.
+
+Every chat prompt starts with the same instructions and the same tail of the
+newest session. ContextPrefixCache builds that prefix once, keeps it
+byte-identical across questions and only rebuilds it when the newest session
+changes, enough new entries have piled up after it, or it gets old. Entries
+indexed after the prefix was built travel with each question instead
+("activity since"), so answers still see the latest descriptions.
+
+The prefix is handed to a backend:
+
+- GeminiPrefixBackend registers it as Gemini cached content, so each request
+  only sends the question part; cached tokens are billed at the reduced rate
+  and are not re-processed. If registration fails (for example when the
+  prefix is below the provider's minimum cacheable size) it falls back to
+  sending the whole prompt.
+- LocalPrefixBackend is the stand-in used with stub models and in the load
+  test: it sends prefix + question part as one prompt. A stable leading
+  prefix still lets the provider's implicit prefix caching apply.
+"""
+
+import time
+import threading
+from datetime import timedelta
+
+from activity_index import estimate_tokens, format_chunks
+
+PREFIX_CONTEXT_CHARS = 6000  # Tail of the newest session baked into the prefix
+PREFIX_MAX_DELTA_CHARS = 4000  # Rebuild once this much new activity has arrived after the prefix
+PREFIX_MAX_AGE = 300.0  # seconds before the prefix is rebuilt anyway
+PREFIX_CACHE_TTL = timedelta(minutes=10)  # Provider-side lifetime; longer than PREFIX_MAX_AGE
+
+SYSTEM_INSTRUCTIONS = """You are an AI assistant that can answer questions about screen activity and computer usage based on detailed descriptions.
+
+Answer the user's question based on the screen activity context provided. Focus on:
+- What applications were being used
+- What tasks were being performed
+- What problems or issues were encountered
+- Timeline of activities
+- Technical details from the logs and code
+- Any patterns or insights about the user's workflow
+
+Provide a helpful, detailed response based on the available context."""
+
+
+class ContextPrefix:
+    """One built prefix: the instructions plus the newest-session tail at build time."""
+
+    __slots__ = ('version', 'session', 'last_position', 'keys', 'context', 'text', 'tokens', 'created_at',
+                 'cache_name', 'model')
+
+    def __init__(self, version, session, last_position, keys, context):
+        self.version = version  # Index version the prefix was built from
+        self.session = session
+        self.last_position = last_position  # Last entry of the session included in the prefix
+        self.keys = keys  # (session, position) of every chunk in the prefix
+        self.context = context
+        self.text = f"{SYSTEM_INSTRUCTIONS}\n\nCONTEXT - Screen Activity Descriptions (most recent activity):\n\n{context}\n"
+        self.tokens = estimate_tokens(self.text)
+        self.created_at = time.monotonic()
+        self.cache_name = None  # Provider cached-content name, when registered
+        self.model = None  # Model bound to the cached content
+
+
+class LocalPrefixBackend:
+    """Sends prefix + question part as a single prompt; nothing is registered."""
+
+    name = "local"
+
+    def __init__(self, model):
+        self.model = model
+
+    def register(self, prefix):
+        pass
+
+    def release(self, prefix):
+        pass
+
+    async def generate(self, prefix, prompt, stream=False):
+        return await self.model.generate_content_async(prefix.text + prompt, stream=stream)
+
+
+class GeminiPrefixBackend(LocalPrefixBackend):
+    """Registers each prefix as Gemini cached content and sends only the question part."""
+
+    name = "gemini"
+
+    def __init__(self, model, model_name, ttl=PREFIX_CACHE_TTL):
+        super().__init__(model)
+        self.model_name = model_name
+        self.ttl = ttl
+        self.registration_errors = 0
+
+    def register(self, prefix):
+        # Imported here so the local backend works without the caching API
+        import google.generativeai as genai
+        from google.generativeai import caching
+        try:
+            cached = caching.CachedContent.create(
+                model=self.model_name,
+                display_name=f"activity-context-v{prefix.version}",
+                system_instruction=SYSTEM_INSTRUCTIONS,
+                contents=[f"CONTEXT - Screen Activity Descriptions (most recent activity):\n\n{prefix.context}"],
+                ttl=self.ttl,
+            )
+        except Exception as e:
+            self.registration_errors += 1
+            print(f"Context caching unavailable, sending the full prompt: {e}")
+            return
+        prefix.cache_name = cached.name
+        prefix.model = genai.GenerativeModel.from_cached_content(cached)
+
+    def release(self, prefix):
+        if not prefix.cache_name:
+            return
+        from google.generativeai import caching
+        try:
+            caching.CachedContent.get(prefix.cache_name).delete()
+        except Exception as e:
+            print(f"Error deleting cached context {prefix.cache_name}: {e}")  # It still expires on its own
+        prefix.cache_name = None
+        prefix.model = None
+
+    async def generate(self, prefix, prompt, stream=False):
+        if prefix.model is None:
+            return await super().generate(prefix, prompt, stream=stream)
+        return await prefix.model.generate_content_async(prompt, stream=stream)
+
+
+class ContextPrefixCache:
+    """Builds the prompt prefix once per context version and tracks what arrived after it."""
+
+    def __init__(self, index, backend, context_chars=PREFIX_CONTEXT_CHARS,
+                 max_delta_chars=PREFIX_MAX_DELTA_CHARS, max_age=PREFIX_MAX_AGE):
+        self.index = index
+        self.backend = backend
+        self.context_chars = context_chars
+        self.max_delta_chars = max_delta_chars
+        self.max_age = max_age
+
+        self._lock = threading.Lock()  # Prompts are built on worker threads
+        self._prefix = None
+        self._previous = None  # Kept registered until the next rebuild; requests may still use it
+        self._delta = []
+        self._delta_version = None
+
+        self.builds = 0
+        self.requests = 0
+        self.prefix_tokens_reused = 0  # Prefix tokens served from a prefix built for an earlier request
+
+    def current(self):
+        """(prefix, chunks indexed after it), rebuilding the prefix if it is stale."""
+        with self._lock:
+            self.requests += 1
+            prefix = self._prefix
+            if prefix is not None and prefix.version != self.index.version and self._delta_version != self.index.version:
+                self._delta_version = self.index.version
+                if self.index.newest_session() != prefix.session:
+                    self._delta = None  # A new session started
+                else:
+                    self._delta = self.index.since(prefix.session, prefix.last_position)
+
+            if (prefix is None or self._delta is None
+                    or sum(len(c['text']) for c in self._delta) > self.max_delta_chars
+                    or time.monotonic() - prefix.created_at > self.max_age):
+                prefix = self._build()
+            else:
+                self.prefix_tokens_reused += prefix.tokens
+            return prefix, list(self._delta)
+
+    def _build(self):
+        version = self.index.version
+        recent = self.index.recent(max_chars=self.context_chars)
+        session = recent[-1]['session'] if recent else None
+        last_position = int(recent[-1]['position']) if recent else -1
+        context = format_chunks(recent) if recent else "No screen activity context available."
+
+        keys = {(c['session'], int(c['position'])) for c in recent}
+        prefix = ContextPrefix(version, session, last_position, keys, context)
+        self.backend.register(prefix)
+        if self._previous is not None:
+            self.backend.release(self._previous)
+        self._previous = self._prefix
+        self._prefix = prefix
+        self._delta = []
+        self._delta_version = version
+        self.builds += 1
+        print(f"Built prompt prefix v{version}: {prefix.tokens:,} tokens, "
+              f"{'cached as ' + prefix.cache_name if prefix.cache_name else self.backend.name + ' backend'}")
+        return prefix
+
+    async def generate(self, prefix, prompt, stream=False):
+        return await self.backend.generate(prefix, prompt, stream=stream)
+
+    def close(self):
+        with self._lock:
+            for prefix in (self._previous, self._prefix):
+                if prefix is not None:
+                    self.backend.release(prefix)
+            self._previous = self._prefix = None
+
+    def stats(self):
+        prefix = self._prefix
+        return {
+            'backend': self.backend.name,
+            'builds': self.builds,
+            'requests': self.requests,
+            'prefix_version': prefix.version if prefix else None,
+            'prefix_tokens': prefix.tokens if prefix else 0,
+            'prefix_age': round(time.monotonic() - prefix.created_at, 1) if prefix else None,
+            'provider_cached': bool(prefix and prefix.cache_name),
+            'registration_errors': getattr(self.backend, 'registration_errors', 0),
+            'delta_entries': len(self._delta or []),
+            'prefix_tokens_reused': self.prefix_tokens_reused,
+        }
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Offline stand-ins for the Gemini Live API and the screen, for replaying recorded sessions.
+
+ReplayLiveServer implements the small part of the Live API the server uses
+(connect() -> session with send_realtime_input(), send_client_content() and
+receive()) in-process. It answers every realtime text input (the prompt,
+description requests) and every client content that completes a turn with the
+next recorded turn, streamed chunk by chunk with a configurable first-chunk
+latency, inter-chunk interval and jitter (seeded, so runs are reproducible);
+context sent with turn_complete=False is only counted. Turns are
+reconstructed from:
+
+- server logs (server_logs_*.log): the logged response chunks, split into
+  turns at description requests, with their recorded timing (logs written
+  with response_chunk sampling on, see logs.py, are missing chunks; prefer
+  the journal for those sessions)
+- description journals (descriptions_*.jsonl): one turn per record, cut into
+  the recorded number of chunks and paced by the recorded latencies
+- description logs (descriptions_*.md): one turn per entry
+
+ReplayFrameSource stands in for an mss handle: grab() returns the next frame
+from captured_frames/ (all sessions, or one), decoded to the BGRX buffer
+ScreenCapturer expects.
+
+    python replay.py turns server_logs_20250531_202921.log    # what would be replayed
+    python replay.py frames captured_frames                    # frames available for replay
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import contextlib
+from datetime import datetime
+from PIL import Image as PILImage
+
+from activity_index import list_description_files, parse_description_file
+from frame_store import frame_time
+from journal import read_journal
+
+FIRST_CHUNK_LATENCY = 1.0  # seconds from a request to the first chunk, when not recorded
+CHUNK_INTERVAL = 0.05  # seconds between chunks, when not recorded
+JITTER = 0.2  # +/- fraction applied to every delay
+CHUNK_CHARS = 80  # Text per chunk when splitting descriptions that don't record their chunks
+LOG_TURN_GAP = 5.0  # seconds without chunks that end a turn in logs without request markers
+
+LOG_LINE_RE = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3}) \| (\w+)\s*\| \S+ - (.*)$')
+LOG_CHUNK_PREFIXES = ("Gemini response (text): ", "Gemini response chunk: ")
+LOG_REQUEST_MARKERS = ("Sent description request", "Sent initial prompt")
+LOG_TURN_END_MARKER = "Gemini description ("
+
+
+# --- Recorded turns ---
+# A turn is a list of (delay, text) chunks; delay is seconds after the previous chunk (the first:
+# after the request), or None when the source did not record it.
+
+def turns_from_log(path):
+    """Response chunks logged by server.py, grouped into turns at description requests."""
+    turns = []
+    current = []
+    request_at = last_at = None
+    in_chunk = False
+
+    def finish():
+        nonlocal current
+        if current:
+            turns.append(current)
+        current = []
+
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.rstrip("\n")
+            match = LOG_LINE_RE.match(line)
+            if not match:
+                if in_chunk and current:  # Multi-line chunk text continues without a log prefix
+                    delay, text = current[-1]
+                    current[-1] = (delay, text + "\n" + line)
+                continue
+            at = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S.%f").timestamp()
+            message = match.group(3)
+            in_chunk = False
+            if message.startswith(LOG_REQUEST_MARKERS):
+                finish()
+                request_at = last_at = at
+            elif message.startswith(LOG_TURN_END_MARKER):
+                finish()
+                request_at = None
+            elif message.startswith(LOG_CHUNK_PREFIXES):
+                text = message.split(": ", 1)[1]
+                if current and last_at is not None and at - last_at > LOG_TURN_GAP:
+                    finish()
+                    request_at = None
+                if current:
+                    delay = at - last_at
+                else:
+                    delay = at - request_at if request_at is not None else None
+                current.append((delay, text))
+                last_at = at
+                in_chunk = True
+    finish()
+    return turns
+
+
+def split_text(text, chunks=None, chunk_chars=CHUNK_CHARS):
+    """Cut text into `chunks` pieces (or pieces of about chunk_chars) at word boundaries."""
+    if chunks:
+        chunk_chars = max(1, len(text) // chunks + 1)
+    pieces = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_chars)
+        if end < len(text):
+            space = text.rfind(" ", start + 1, end)
+            end = space if space > start else end
+        pieces.append(text[start:end])
+        start = end
+    return pieces or [text]
+
+
+def turns_from_journal(path):
+    """One turn per journal record, cut into its recorded chunk count and paced by its recorded latencies."""
+    records, _ = read_journal(path)
+    turns = []
+    for record in records:
+        pieces = split_text(record['text'], record.get('chunks'))
+        first = record.get('first_chunk_latency')
+        last = record.get('last_chunk_latency')
+        gap = (last - first) / (len(pieces) - 1) if first is not None and last is not None and len(pieces) > 1 else None
+        turns.append([(first if i == 0 else gap, piece) for i, piece in enumerate(pieces)])
+    return turns
+
+
+def turns_from_markdown(path):
+    return [[(None, piece) for piece in split_text(entry['text'])] for entry in parse_description_file(path)]
+
+
+def load_turns(source):
+    """Turns from a log, journal or markdown file, or from the newest non-empty session in a descriptions directory."""
+    if os.path.isdir(source):
+        for path in reversed(list_description_files(source)):
+            journal = path[:-3] + ".jsonl"
+            with contextlib.suppress(ValueError):
+                return load_turns(journal if os.path.exists(journal) else path)
+        raise ValueError(f"No recorded descriptions in {source}")
+    if source.endswith(".log"):
+        turns = turns_from_log(source)
+    elif source.endswith(".jsonl"):
+        turns = turns_from_journal(source)
+    elif source.endswith(".md"):
+        turns = turns_from_markdown(source)
+    else:
+        raise ValueError(f"Don't know how to replay {source} (expected .log, .jsonl or .md)")
+    if not turns:
+        raise ValueError(f"No response turns found in {source}")
+    return turns
+
+
+# --- Live API stand-in ---
+
+class _Content:
+    __slots__ = ('turn_complete',)
+
+    def __init__(self, turn_complete):
+        self.turn_complete = turn_complete
+
+
+class ReplayResponse:
+    """The fields of a Live API server message that server.py reads."""
+
+    __slots__ = ('text', 'server_content', 'session_resumption_update', 'go_away', 'data')
+
+    def __init__(self, text, turn_complete):
+        self.text = text
+        self.server_content = _Content(turn_complete)
+        self.session_resumption_update = None
+        self.go_away = None
+        self.data = None
+
+
+class ReplaySession:
+    """One connected session: uploads are counted, each text input starts the next recorded turn."""
+
+    def __init__(self, server):
+        self.server = server
+        self._responses = asyncio.Queue()
+        self._pending = []  # Turns requested but not streamed yet, in order
+        self._streamer = None
+        self.closed = False
+
+    async def send_realtime_input(self, media=None, text=None, **kwargs):
+        if self.closed:
+            raise ConnectionError("replay session is closed")
+        server = self.server
+        if media is not None:
+            server.frames_received += 1
+            server.bytes_received += len(media.data)
+        if text:
+            self._request()
+
+    async def send_client_content(self, turns=None, turn_complete=True):
+        if self.closed:
+            raise ConnectionError("replay session is closed")
+        if turn_complete:
+            self._request()
+        else:
+            self.server.context_messages += 1
+
+    def _request(self):
+        self.server.requests += 1
+        self._pending.append((time.monotonic(), self.server.next_turn()))
+        if self._streamer is None or self._streamer.done():
+            self._streamer = asyncio.create_task(self._stream())
+
+    async def _stream(self):
+        """Stream pending turns one after another, as the model answers one input at a time."""
+        while self._pending:
+            requested, turn = self._pending.pop(0)
+            start = time.monotonic()
+            for i, (recorded, text) in enumerate(turn):
+                delay = self.server.delay(recorded, first=i == 0)
+                if i == 0:
+                    delay = max(0.0, delay - (start - requested))  # Waiting behind an earlier turn counts
+                await asyncio.sleep(delay)
+                self._responses.put_nowait(ReplayResponse(text, turn_complete=i == len(turn) - 1))
+                self.server.chunks_sent += 1
+            self.server.turns_sent += 1
+
+    async def receive(self):
+        """Yield responses until the end of the current turn, like the Live API's receive()."""
+        while not self.closed:
+            response = await self._responses.get()
+            yield response
+            if response.server_content.turn_complete:
+                return
+
+    async def close(self):
+        self.closed = True
+        if self._streamer is not None:
+            self._streamer.cancel()
+            await asyncio.gather(self._streamer, return_exceptions=True)
+
+
+class ReplayLiveServer:
+    """In-process replacement for client.aio.live: connect() yields ReplaySessions fed from recorded turns."""
+
+    def __init__(self, turns, first_chunk_latency=FIRST_CHUNK_LATENCY, chunk_interval=CHUNK_INTERVAL,
+                 jitter=JITTER, recorded_timing=True, speed=1.0, seed=0, connect_latency=0.0):
+        self.turns = turns
+        self.first_chunk_latency = first_chunk_latency
+        self.chunk_interval = chunk_interval
+        self.jitter = jitter
+        self.recorded_timing = recorded_timing  # Use the source's delays where it recorded them
+        self.speed = speed  # >1 replays faster than recorded
+        self.connect_latency = connect_latency
+        self._random = random.Random(seed)
+        self._next = 0
+        self.sessions = 0
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.requests = 0
+        self.context_messages = 0  # Client content sent without completing a turn (crop captions, text deltas)
+        self.turns_sent = 0
+        self.chunks_sent = 0
+
+    def next_turn(self):
+        turn = self.turns[self._next % len(self.turns)]
+        self._next += 1
+        return turn
+
+    def delay(self, recorded, first):
+        base = recorded if self.recorded_timing and recorded is not None else (
+            self.first_chunk_latency if first else self.chunk_interval)
+        if self.jitter:
+            base *= 1 + self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, base) / self.speed
+
+    @contextlib.asynccontextmanager
+    async def connect(self, config=None, **kwargs):
+        """Same shape as client.aio.live.connect(model=..., config=...); the model and config are ignored."""
+        if self.connect_latency:
+            await asyncio.sleep(self.connect_latency)
+        session = ReplaySession(self)
+        self.sessions += 1
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    def stats(self):
+        return {
+            'turns_loaded': len(self.turns),
+            'sessions': self.sessions,
+            'frames_received': self.frames_received,
+            'bytes_received': self.bytes_received,
+            'requests': self.requests,
+            'context_messages': self.context_messages,
+            'turns_sent': self.turns_sent,
+            'chunks_sent': self.chunks_sent,
+        }
+
+
+# --- Screen stand-in ---
+
+def list_frames(frames_dir, session=None):
+    """Saved frame paths in capture order, from one session directory or all of them."""
+    directories = [os.path.join(frames_dir, session)] if session else [frames_dir] + sorted(
+        os.path.join(frames_dir, name) for name in os.listdir(frames_dir)
+        if os.path.isdir(os.path.join(frames_dir, name)))
+    frames = []
+    for directory in directories:
+        for name in os.listdir(directory):
+            captured = frame_time(name)
+            if captured is not None:
+                frames.append((captured, os.path.join(directory, name)))
+    frames.sort()
+    return [path for _, path in frames]
+
+
+class ReplayShot:
+    """The parts of an mss screenshot ScreenCapturer uses."""
+
+    __slots__ = ('raw', 'size')
+
+    def __init__(self, raw, size):
+        self.raw = raw
+        self.size = size
+
+
+class ReplayFrameSource:
+    """mss-compatible handle that returns saved frames instead of grabbing the screen."""
+
+    def __init__(self, frames_dir, session=None, loop=True, preload=False):
+        self.paths = list_frames(frames_dir, session)
+        if not self.paths:
+            raise ValueError(f"No saved frames in {frames_dir}" + (f"/{session}" if session else ""))
+        self.loop = loop
+        self.position = 0
+        self._cache = [self._decode(path) for path in self.paths] if preload else None
+        first = self._cache[0] if self._cache else self._decode(self.paths[0])
+        monitor = {'left': 0, 'top': 0, 'width': first.size[0], 'height': first.size[1]}
+        self.monitors = [monitor, monitor]  # "all" and monitor 1 are the recorded frame
+
+    @staticmethod
+    def _decode(path):
+        with PILImage.open(path) as img:
+            rgb = img.convert("RGB")
+        return ReplayShot(bytearray(rgb.tobytes("raw", "BGRX")), rgb.size)
+
+    def grab(self, monitor):
+        if self.position >= len(self.paths):
+            if not self.loop:
+                raise EOFError("replayed every saved frame")
+            self.position = 0
+        index = self.position
+        self.position += 1
+        return self._cache[index] if self._cache else self._decode(self.paths[index])
+
+    def close(self):
+        self._cache = None
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('turns', 'frames'):
+        print(__doc__.strip().splitlines()[-2].strip())
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(1)
+    if sys.argv[1] == 'turns':
+        turns = load_turns(sys.argv[2])
+        chunks = sum(len(turn) for turn in turns)
+        timed = [turn[0][0] for turn in turns if turn[0][0] is not None]
+        print(json.dumps({
+            'turns': len(turns),
+            'chunks': chunks,
+            'avg_chunks_per_turn': round(chunks / len(turns), 1),
+            'avg_chars_per_turn': round(sum(len(text) for turn in turns for _, text in turn) / len(turns)),
+            'recorded_first_chunk_latency': round(sorted(timed)[len(timed) // 2], 3) if timed else None,
+        }, indent=2))
+    else:
+        paths = list_frames(sys.argv[2])
+        print(f"{len(paths)} frames" + (f", {paths[0]} .. {paths[-1]}" if paths else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Hierarchical rolling summaries of capture sessions.
+
+A day of capture is far more text than fits in a chat prompt, so indexed
+description entries are summarized bottom-up:
+
+- 5min:    each 5-minute window of a session, from its raw entries
+- hour:    each hour of a session, from its 5-minute summaries
+- session: each session, from its hourly summaries
+
+Summaries are built incrementally: a window is summarized once, after it has
+closed (the session has moved past it, a newer session exists, or the wall
+clock is WINDOW_GRACE past its end), and never again. An hour also waits
+until all of its non-empty 5-minute windows have summaries, so a failed
+5-minute summary is retried before the hour is built. A session rollup is
+rebuilt only when it gained hourly summaries. Everything is stored in
+gemini_descriptions/rollups.sqlite3 next to the activity index.
+
+The summarizer is any callable prompt -> text, so the pipeline runs against
+a stub without a model:  python rollups.py --stub
+"""
+
+import os
+import re
+import sys
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from activity_index import ActivityIndex, DESCRIPTIONS_DIR, TIMESTAMP_FORMAT, format_chunks
+
+ROLLUPS_FILENAME = "rollups.sqlite3"
+LEVELS = ('5min', 'hour', 'session')
+WINDOW = timedelta(minutes=5)
+HOUR = timedelta(hours=1)
+WINDOW_GRACE = timedelta(minutes=2)  # A window with no later entries closes this long after its end
+ROLLUP_INTERVAL = 60.0  # seconds between background passes when nothing new was indexed
+ROLLUP_INPUT_CHARS = 30000  # Budget for the text one summary is built from
+MAX_SUMMARIES_PER_PASS = 50  # Spread a large backlog over several passes
+
+LEVEL_PROMPTS = {
+    '5min': ("Summarize these screen activity descriptions from one 5-minute window in 2-4 sentences. "
+             "Name the applications, files, tasks and any errors."),
+    'hour': ("Summarize this hour of screen activity from its 5-minute summaries in one short paragraph: "
+             "main tasks, problems encountered and notable switches between activities."),
+    'session': ("Summarize this capture session from its hourly summaries: overall focus, a brief "
+                "timeline of the main tasks, problems encountered and their outcome."),
+}
+
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def floor_time(moment, step):
+    """Start of the window of size step (5 minutes or an hour) that contains moment."""
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight + ((moment - midnight) // step) * step
+
+
+def stub_summarize(prompt):
+    """Extractive stand-in for a model: the first sentence of each item in the prompt."""
+    body = prompt.split("\n\n", 1)[-1]
+    firsts = []
+    for item in body.split("\n\n"):
+        text = re.sub(r'^\*\*[^*]+:\*\*\s*', '', item.strip())
+        if text:
+            firsts.append(SENTENCE_RE.split(text, 1)[0][:200])
+    return " ".join(firsts[:8])
+
+
+def _thin(items, budget):
+    """Evenly drop items until their text fits the budget."""
+    total = sum(len(item['text']) for item in items)
+    if total <= budget:
+        return items
+    step = total / budget
+    return [item for i, item in enumerate(items) if int(i % step) == 0]
+
+
+class ActivityRollups:
+    """SQLite store of 5-minute/hour/session summaries plus the incremental builder."""
+
+    def __init__(self, index, summarize, path=None, interval=ROLLUP_INTERVAL):
+        self.index = index
+        self.summarize = summarize  # prompt -> summary text
+        self.path = path or os.path.join(index.descriptions_dir, ROLLUPS_FILENAME)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rollups (
+                level TEXT NOT NULL,
+                session TEXT NOT NULL,
+                start TEXT NOT NULL,
+                end TEXT NOT NULL,
+                text TEXT NOT NULL,
+                entries INTEGER NOT NULL,  -- Raw description entries covered
+                sources INTEGER NOT NULL,  -- Items the summary was built from
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (level, session, start)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS rollups_by_time ON rollups (level, start)")
+        self.conn.commit()
+
+        self.summaries_built = 0
+        self.errors = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Building ---
+
+    def update(self, max_summaries=MAX_SUMMARIES_PER_PASS, now=None):
+        """Summarize windows that closed since the last pass. Returns the number of summaries built."""
+        now = now or datetime.now()
+        sessions = self._sessions()
+        newest = sessions[-1][0] if sessions else None
+        built = 0
+        for session, first, last in sessions:
+            if built >= max_summaries:
+                break
+            finished = session != newest
+            built += self._update_level(session, '5min', WINDOW, first, last, finished, now, max_summaries - built)
+            built += self._update_level(session, 'hour', HOUR, first, last, finished, now, max_summaries - built)
+            if built < max_summaries:
+                built += self._update_session(session)
+        return built
+
+    def _sessions(self):
+        """(session, first entry time, last entry time) for sessions with timestamped entries, oldest first."""
+        with self.index.lock:
+            rows = self.index.conn.execute(
+                "SELECT session, MIN(timestamp), MAX(timestamp) FROM chunks "
+                "WHERE timestamp IS NOT NULL GROUP BY session ORDER BY session"
+            ).fetchall()
+        return [(s, datetime.strptime(a, TIMESTAMP_FORMAT), datetime.strptime(b, TIMESTAMP_FORMAT)) for s, a, b in rows]
+
+    def _done(self, level, session):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT start FROM rollups WHERE level = ? AND session = ?", (level, session)).fetchall()
+        return {row[0] for row in rows}
+
+    def _update_level(self, session, level, step, first, last, finished, now, limit):
+        done = self._done(level, session)
+        built = 0
+        start = floor_time(first, step)
+        while start <= last and built < limit:
+            end = start + step
+            closed = finished or last >= end or now - end >= WINDOW_GRACE
+            if not closed:
+                break  # Later windows are open too
+            key = start.strftime(TIMESTAMP_FORMAT)
+            if key not in done:
+                built += self._summarize_window(session, level, start, end)
+            start = end
+        return built
+
+    def _summarize_window(self, session, level, start, end):
+        start_key = start.strftime(TIMESTAMP_FORMAT)
+        end_key = (end - timedelta(seconds=1)).strftime(TIMESTAMP_FORMAT)
+        if level == '5min':
+            items = [c for c in self.index.between(start_key, end_key) if c['session'] == session]
+            entries = len(items)
+        else:
+            items = self.between('5min', start_key, end_key, session=session)
+            entries = sum(item['entries'] for item in items)
+            # Close the hour only once every 5-minute window with entries has its summary; a failed or
+            # not yet built one would otherwise leave a permanent gap
+            raw = [c for c in self.index.between(start_key, end_key) if c['session'] == session]
+            windows = {floor_time(datetime.strptime(c['timestamp'], TIMESTAMP_FORMAT), WINDOW) for c in raw}
+            if len(windows) > len(items):
+                return 0
+        if not items:
+            return 0
+        items = _thin(items, ROLLUP_INPUT_CHARS)
+        text = self._run_summarize(level, format_chunks(items), f"{start_key} - {end_key}")
+        if text is None:
+            return 0
+        self._store(level, session, start_key, end_key, text, entries, len(items))
+        return 1
+
+    def _update_session(self, session):
+        hours = self.between('hour', '0000', '9999', session=session)
+        if not hours:
+            return 0
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sources FROM rollups WHERE level = 'session' AND session = ?", (session,)).fetchone()
+        if row and row[0] == len(hours):
+            return 0
+        items = _thin(hours, ROLLUP_INPUT_CHARS)
+        text = self._run_summarize('session', format_chunks(items), f"session {session}")
+        if text is None:
+            return 0
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM rollups WHERE level = 'session' AND session = ?", (session,))
+        self._store('session', session, hours[0]['timestamp'], hours[-1]['end'], text,
+                    sum(h['entries'] for h in hours), len(hours))
+        return 1
+
+    def _run_summarize(self, level, body, label):
+        prompt = f"{LEVEL_PROMPTS[level]} ({label})\n\n{body}"
+        try:
+            text = (self.summarize(prompt) or "").strip()
+        except Exception as e:
+            self.errors += 1
+            print(f"Error summarizing {level} {label}: {e}")
+            return None
+        return text or None
+
+    def _store(self, level, session, start, end, text, entries, sources):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rollups (level, session, start, end, text, entries, sources, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (level, session, start, end, text, entries, sources, datetime.now().strftime(TIMESTAMP_FORMAT)),
+            )
+        self.summaries_built += 1
+
+    # --- Reading ---
+
+    def between(self, level, start, end, session=None):
+        """Summaries of one level starting in [start, end], oldest first, shaped like index chunks."""
+        query = "SELECT session, start, end, text, entries FROM rollups WHERE level = ? AND start >= ? AND start <= ?"
+        params = [level, start, end]
+        if session is not None:
+            query += " AND session = ?"
+            params.append(session)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY start, session", params).fetchall()
+        return [
+            {'session': s, 'timestamp': a, 'end': b, 'text': text, 'entries': entries, 'position': -1}
+            for s, a, b, text, entries in rows
+        ]
+
+    def sessions(self, max_chars=None):
+        """Session summaries, newest last; with max_chars only the newest that fit."""
+        summaries = self.between('session', '0000', '9999')
+        if max_chars is None:
+            return summaries
+        kept, total = [], 0
+        for summary in reversed(summaries):
+            if kept and total + len(summary['text']) > max_chars:
+                break
+            kept.append(summary)
+            total += len(summary['text'])
+        return kept[::-1]
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.conn.execute("SELECT level, COUNT(*) FROM rollups GROUP BY level").fetchall())
+        return {
+            **{level: counts.get(level, 0) for level in LEVELS},
+            'built': self.summaries_built,
+            'errors': self.errors,
+            'path': self.path,
+        }
+
+    # --- Background worker ---
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="rollups", daemon=True)
+        self._thread.start()
+        return self
+
+    def schedule(self):
+        """Ask the worker for a pass soon (e.g. after new descriptions were indexed)."""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                built = self.update()
+                if built:
+                    print(f"Rollups: built {built} summaries {self.stats()}")
+            except Exception as e:
+                print(f"Error updating rollups: {e}")
+                built = 0
+            if not built:  # With a backlog left, go straight into the next pass
+                self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def close(self):
+        self.stop()
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    """Build rollups offline: python rollups.py [--stub]"""
+    stub = "--stub" in sys.argv
+    if stub:
+        summarize = stub_summarize
+    else:
+        import google.generativeai as genai
+        from dotenv import load_dotenv
+        load_dotenv()
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        model = genai.GenerativeModel('gemini-2.5-flash-preview-05-20')
+        summarize = lambda prompt: model.generate_content(prompt).text  # noqa: E731
+
+    index = ActivityIndex(DESCRIPTIONS_DIR)
+    index.refresh()
+    rollups = ActivityRollups(index, summarize)
+    total = 0
+    while True:
+        built = rollups.update()
+        total += built
+        if not built:
+            break
+    print(f"Built {total} summaries: {rollups.stats()}")
+    for summary in rollups.sessions():
+        print(f"\n[{summary['session']}] {summary['entries']} entries\n{summary['text'][:300]}")
+    rollups.close()
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,29 @@ import asyncio
 import uuid
 import json
 import os
-import sys
-import base64
-import io
+import time
+import random
 import traceback
 import warnings
-from datetime import datetime
-from PIL import Image as PILImage # Renamed to avoid conflict if Image is used elsewhere
-import mss
+from datetime import datetime, timedelta
 import google.genai as genai
+from google.genai import types
 from loguru import logger # Added import
 
+from journal import DescriptionJournal
+from activity_store import ActivityStore
+from frame_store import FrameStore
+from turns import TurnAssembler, extract_response_text, is_turn_complete
+from capture import FrameChangeDetector, FrameQueue, ScreenCapturer, crop_caption
+from text_delta import TextDeltaExtractor, make_engine
+from encoding import FrameEncoder
+from peer_sessions import PeerSessionManager, SessionLimitError
+from peers import PeerLimitError, PeerRegistry
+from replay import ReplayFrameSource, ReplayLiveServer, load_turns
+import metrics
+from adaptive import AdaptiveCaptureController
+from logs import configure_logging
+
 from dotenv import load_dotenv
 
 # Load environment variables from a .env file into the environment
@@ -23,362 +35,371 @@ load_dotenv()
 warnings.filterwarnings("ignore", message=".*non-data parts in the response.*")
 
 from aiohttp import web
-from aiortc import RTCIceCandidate, RTCPeerConnection, RTCSessionDescription
-from aiortc.contrib.media import MediaRelay
-
-
-# For simplicity, we'll keep track of peer connections in memory.
-pcs = set()
-relay = MediaRelay() # Used to relay tracks if needed, or can be adapted to save to file
+from aiortc import RTCIceCandidate, RTCSessionDescription
 
 # --- Gemini Screen Streaming Constants ---
 GEMINI_MODEL_NAME = "models/gemini-2.0-flash-live-001"
 # Config updated to only include TEXT responses (one modality only is supported)
 GEMINI_CONFIG = {"response_modalities": ["TEXT"]}
-SCREEN_CAPTURE_INTERVAL = 2.0  # seconds (increased to reduce load)
+GEMINI_SESSION_RESUMPTION = True  # Ask for resumption handles so reconnects keep the model's context
+INITIAL_PROMPT = "You are viewing a computer screen. Please describe what you see when I send you screen captures. Transcribe the important text that is changing as the user interacts with the system."
+SCREEN_CAPTURE_INTERVAL = 2.0  # seconds (increased to reduce load); starting point when adaptive
+
+# --- Adaptive Capture Configuration ---
+ADAPTIVE_CAPTURE = True  # Tune interval, resolution and JPEG quality from activity, latency and bandwidth
+CAPTURE_MIN_INTERVAL = 0.5  # seconds between captures during active use
+CAPTURE_MAX_INTERVAL = 10.0  # seconds between captures on an idle screen
+UPLOAD_BUDGET_BYTES_PER_SEC = 250_000  # Frame upload bandwidth budget
+MAX_FRAME_WIDTH = 1920  # Larger monitors (4K/5K) are downscaled to this width before encoding
+TURN_IDLE_TIMEOUT = 5.0  # seconds without a chunk before a turn is closed without turn_complete
+
+# --- Reconnect Configuration ---
+RECONNECT_BASE_DELAY = 1.0  # seconds; doubles per failed attempt
+RECONNECT_MAX_DELAY = 60.0  # seconds; backoff cap
+RECONNECT_RESET_AFTER = 60.0  # seconds a session must last before the backoff starts over
+RECONNECT_CONTEXT_DESCRIPTIONS = 5  # Recent descriptions summarized in the prompt after reconnecting
+RECONNECT_CONTEXT_CHARS = 300  # Per-description cap in that summary
+DISCONNECTED_FRAME_BUFFER = 10  # Changed frames kept while disconnected (oldest dropped first)
+
+# --- Remote Screen Sessions (WebRTC) ---
+LOCAL_SCREEN_CAPTURE = True  # Stream this machine's own monitor (mss) to Gemini
+REMOTE_SESSIONS = False  # Give each WebRTC peer's video track its own Gemini session (billed to GOOGLE_API_KEY; /offer is unauthenticated)
+MAX_PEER_SESSIONS = 4  # Concurrent remote sessions; further offers get 503
+PEER_SAMPLE_INTERVAL = 2.0  # seconds between frames sampled from each peer's track
+PEER_ENCODE_WORKERS = 4  # Threads shared by all peers for frame conversion (and encoding when ENCODE_MODE is inline)
+MAX_PEER_CONNECTIONS = 16  # Live WebRTC connections; further offers get 503
+PEER_CONNECT_TIMEOUT = 30.0  # seconds for a new connection to reach "connected"
+PEER_IDLE_TIMEOUT = 60.0  # seconds without inbound media or datachannel messages before a peer is closed
+PEER_HEARTBEAT_TIMEOUT = 20.0  # seconds without ping/pong from a peer that uses the datachannel heartbeat
+
+# --- Observability ---
+TRACE_FRAMES = False  # Per-frame OpenTelemetry spans (needs opentelemetry-api and a configured SDK)
+LOG_ENQUEUE = True  # Write logs on a background thread instead of the event loop
+LOG_JSON = True  # Also write structured records (events, frame ids) to server_logs_*.jsonl
+
+# --- Frame Change Detection Configuration ---
+FRAME_CHANGE_THRESHOLD = 0.002  # Fraction of thumbnail pixels that must change to send a frame
+DESCRIPTION_CHANGE_THRESHOLD = 0.02  # Fraction changed since the last description to request a new one
+DESCRIPTION_MIN_FRAMES = 3  # Minimum frames sent between description requests
+PIXEL_DIFF_THRESHOLD = 24  # Grayscale delta (0-255) for a thumbnail pixel to count as changed
+FORCE_SEND_INTERVAL = 60.0  # seconds; resend an unchanged screen after this long
 
 # --- Frame Saving Configuration ---
 SAVE_FRAMES = True  # Set to False to disable frame saving
-FRAMES_DIR = "captured_frames"  # Directory to save frames
+FRAMES_DIR = "captured_frames"  # Directory to save frames (one subdirectory per session)
+FRAME_DEDUPE_THRESHOLD = 0.001  # Frames changed less than this vs. the last saved one are not written
+FRAME_FULL_RES_HOURS = 1  # Older frames are re-encoded as thumbnails
+FRAME_KEYFRAME_AFTER_DAYS = 1  # Older frames are thinned to one per minute
+FRAME_MAX_AGE_DAYS = 7  # Older frames are deleted
+FRAME_MAX_BYTES = 5 * 1024 ** 3  # Oldest frames are deleted while captured_frames is larger than this
+FRAME_JPEG_QUALITY = 80  # One encode per frame, shared by the saved file and the Gemini upload
+FRAME_FORMAT = "JPEG"  # "JPEG" or "WEBP" (smaller, slower to encode)
+ENCODE_MODE = "inline"  # Resize/encode "inline" (capture or peer thread), on a "thread" pool or a "process" pool
+ENCODE_WORKERS = 2  # Pool size for the thread and process modes, shared by local capture and peer sessions
+CAPTURE_TARGET = 1  # "all" (every monitor), a monitor number (1 = primary) or an ROI (left, top, width, height)
+CROP_TO_CHANGES = False  # Upload only the bounding box of what changed since the last sent frame, with its position
+CROP_MAX_AREA = 0.5  # Send the full frame when the changed region covers more than this fraction
+FULL_FRAME_INTERVAL = 30.0  # seconds; send an uncropped frame at least this often
+TEXT_DELTAS = False  # OCR the changed region and send small text-only changes as text instead of an image
+OCR_ENGINE = "tesseract"  # "tesseract" (needs pytesseract and tesseract installed) or "stub"
+FRAME_QUEUE_SIZE = 2  # Frames waiting to be sent; older ones are dropped when sends fall behind
+
+# --- Offline Replay (no screen, network or API key) ---
+LIVE_BACKEND = "gemini"  # "gemini" (Live API) or "replay" (recorded responses from REPLAY_SOURCE)
+REPLAY_SOURCE = "gemini_descriptions"  # A server_logs_*.log, a descriptions_*.jsonl/.md file or a descriptions directory
+REPLAY_FIRST_CHUNK_LATENCY = 1.0  # seconds, where the source didn't record it
+REPLAY_JITTER = 0.2  # +/- fraction applied to replayed delays
+CAPTURE_SOURCE = "screen"  # "screen" (mss) or "replay" (saved frames from REPLAY_FRAMES_DIR, in a loop)
+REPLAY_FRAMES_DIR = FRAMES_DIR
+
+# A process pool forks its workers here, before the frame store, journal and activity store below start threads
+process_encoder = None
+if ENCODE_MODE == "process":
+    process_encoder = FrameEncoder("process", workers=ENCODE_WORKERS, image_format=FRAME_FORMAT)
 
 # --- Gemini Descriptions Configuration ---
 SAVE_DESCRIPTIONS = True  # Set to False to disable description saving
 DESCRIPTIONS_DIR = "gemini_descriptions"  # Directory to save descriptions
 # Create timestamped filename for descriptions
 session_timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-DESCRIPTIONS_FILE = os.path.join(DESCRIPTIONS_DIR, f"descriptions_{session_timestamp}.md")  # File to save descriptions
-DESCRIPTIONS_HTML_FILE = os.path.join(DESCRIPTIONS_DIR, f"descriptions_{session_timestamp}.html")  # HTML file to save descriptions
-
-# Store descriptions in memory for easy HTML generation
-descriptions_list = []
-
-# Create frames directory if it doesn't exist
-if SAVE_FRAMES and not os.path.exists(FRAMES_DIR):
-    os.makedirs(FRAMES_DIR)
-    logger.info(f"Created frames directory: {FRAMES_DIR}")
+# Append-only journal: markdown log, JSON lines journal and a static HTML viewer that tails it
+description_journal = DescriptionJournal(DESCRIPTIONS_DIR, session_timestamp)
+DESCRIPTIONS_FILE = description_journal.markdown_path  # File to save descriptions
+DESCRIPTIONS_JOURNAL_FILE = description_journal.journal_path  # JSON lines journal read by the HTML viewer
+DESCRIPTIONS_HTML_FILE = description_journal.html_path  # HTML file to view descriptions
+SAVE_ACTIVITY_RECORDS = True  # Description and frame records in gemini_descriptions/activity.sqlite3
+activity_store = None
+frame_store = None
+
+# Frames are deduplicated, written off the capture path and aged into thumbnails/keyframes
+if SAVE_FRAMES:
+    frame_store = FrameStore(
+        FRAMES_DIR,
+        session=session_timestamp,
+        dedupe_threshold=FRAME_DEDUPE_THRESHOLD,
+        full_res_retention=timedelta(hours=FRAME_FULL_RES_HOURS),
+        archive_after=timedelta(days=FRAME_KEYFRAME_AFTER_DAYS),
+        max_age=timedelta(days=FRAME_MAX_AGE_DAYS),
+        max_bytes=FRAME_MAX_BYTES,
+    ).start()
+    logger.info(f"Frames will be saved to: {frame_store.session_dir}")
 
 # Create descriptions directory if it doesn't exist
 if SAVE_DESCRIPTIONS and not os.path.exists(DESCRIPTIONS_DIR):
     os.makedirs(DESCRIPTIONS_DIR)
     logger.info(f"Created descriptions directory: {DESCRIPTIONS_DIR}")
 
-# Helper function to save description to both markdown and HTML
-def save_description_to_files(description_text):
-    """Save description to both markdown and HTML files"""
+# Helper function to save description to the journal
+def save_description_to_files(description_text, timestamp=None, **fields):
+    """Append a description to the markdown log and the JSON lines journal"""
     if not SAVE_DESCRIPTIONS or not description_text:
         return
-        
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Add to descriptions list
-    descriptions_list.append({
-        'text': description_text,
-        'timestamp': timestamp
-    })
-    
+
     try:
-        # Write markdown file
-        with open(DESCRIPTIONS_FILE, 'w', encoding='utf-8') as f:
-            f.write(f"# Gemini Screen Descriptions Log\n\n")
-            f.write(f"**Started:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            f.write(f"---\n\n")
-            
-            for desc in descriptions_list:
-                f.write(f"**{desc['timestamp']}:** {desc['text']}\n\n")
-        
-        # Write HTML file
-        descriptions_html = ""
-        for desc in descriptions_list:
-            descriptions_html += f'''            <div class="description-item">
-                <div class="description-time">
-                    <span class="live-indicator"></span>
-                    {desc['timestamp']}
-                </div>
-                <div class="description-text">{desc['text']}</div>
-            </div>
-'''
-        
-        html_content = f'''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Gemini Screen Descriptions - {session_timestamp}</title>
-    <style>
-        body {{
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            line-height: 1.6;
-            margin: 0;
-            padding: 20px;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            min-height: 100vh;
-        }}
-        .container {{
-            max-width: 1000px;
-            margin: 0 auto;
-            background: white;
-            border-radius: 15px;
-            box-shadow: 0 20px 40px rgba(0,0,0,0.1);
-            overflow: hidden;
-        }}
-        .header {{
-            background: linear-gradient(135deg, #1e3c72 0%, #2a5298 100%);
-            color: white;
-            padding: 30px;
-            text-align: center;
-        }}
-        .header h1 {{
-            margin: 0;
-            font-size: 2.5em;
-            font-weight: 300;
-            text-shadow: 0 2px 4px rgba(0,0,0,0.3);
-        }}
-        .header .timestamp {{
-            margin: 10px 0 0 0;
-            font-size: 1.1em;
-            opacity: 0.9;
-        }}
-        .content {{
-            padding: 30px;
-        }}
-        .description-item {{
-            background: #f8f9fa;
-            border-left: 4px solid #2a5298;
-            margin: 20px 0;
-            padding: 20px;
-            border-radius: 0 10px 10px 0;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.05);
-            transition: transform 0.2s ease, box-shadow 0.2s ease;
-        }}
-        .description-item:hover {{
-            transform: translateY(-2px);
-            box-shadow: 0 4px 20px rgba(0,0,0,0.1);
-        }}
-        .description-time {{
-            color: #6c757d;
-            font-size: 0.9em;
-            margin-bottom: 10px;
-            font-weight: 500;
-        }}
-        .description-text {{
-            font-size: 1.1em;
-            color: #2c3e50;
-            line-height: 1.7;
-        }}
-        .stats {{
-            background: #e9ecef;
-            padding: 20px;
-            margin: 20px 0;
-            border-radius: 10px;
-            text-align: center;
-        }}
-        .stats-item {{
-            display: inline-block;
-            margin: 0 20px;
-            text-align: center;
-        }}
-        .stats-number {{
-            font-size: 2em;
-            font-weight: bold;
-            color: #2a5298;
-            display: block;
-        }}
-        .stats-label {{
-            color: #6c757d;
-            font-size: 0.9em;
-        }}
-        .footer {{
-            background: #f8f9fa;
-            padding: 20px;
-            text-align: center;
-            color: #6c757d;
-            border-top: 1px solid #dee2e6;
-        }}
-        .live-indicator {{
-            display: inline-block;
-            width: 12px;
-            height: 12px;
-            background: #28a745;
-            border-radius: 50%;
-            margin-right: 8px;
-            animation: pulse 2s infinite;
-        }}
-        @keyframes pulse {{
-            0% {{ opacity: 1; }}
-            50% {{ opacity: 0.5; }}
-            100% {{ opacity: 1; }}
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1><span class="live-indicator"></span>Gemini Screen Descriptions</h1>
-            <div class="timestamp">Session started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</div>
-        </div>
-        
-        <div class="content">
-            <div class="stats">
-                <div class="stats-item">
-                    <span class="stats-number">{len(descriptions_list)}</span>
-                    <span class="stats-label">Descriptions</span>
-                </div>
-                <div class="stats-item">
-                    <span class="stats-number">Live</span>
-                    <span class="stats-label">Status</span>
-                </div>
-            </div>
-            
-            <div id="descriptions-container">
-{descriptions_html}            </div>
-        </div>
-        
-        <div class="footer">
-            <p>Generated by Gemini Screen Capture System | Last updated: {timestamp}</p>
-        </div>
-    </div>
-</body>
-</html>'''
-
-        with open(DESCRIPTIONS_HTML_FILE, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        logger.debug(f"Saved description to both files: {DESCRIPTIONS_FILE} and {DESCRIPTIONS_HTML_FILE}")
-        
+        # Only queues the entry; the journal's writer thread does the disk I/O
+        record = description_journal.append(description_text, timestamp=timestamp, **fields)
+        if activity_store:
+            activity_store.record_description(session_timestamp, record)
     except Exception as e:
         logger.error(f"Error writing description to files: {e}")
 
 # Create/initialize description files if enabled
 if SAVE_DESCRIPTIONS:
-    logger.info(f"Descriptions will be saved to: {DESCRIPTIONS_FILE} and {DESCRIPTIONS_HTML_FILE}")
+    description_journal.open()
+    logger.info(f"Descriptions will be saved to: {DESCRIPTIONS_FILE} and {DESCRIPTIONS_JOURNAL_FILE} (viewer: {DESCRIPTIONS_HTML_FILE})")
+    if SAVE_ACTIVITY_RECORDS:
+        activity_store = ActivityStore()
+        activity_store.start_session(session_timestamp)
+        logger.info(f"Description and frame records will be saved to: {activity_store.path}")
 
-# --- Helper function for screen capture ---
-def _capture_screen_frame():
+# --- Gemini Interaction Functions ---
+def _get_capture_pipeline(app: web.Application):
+    """Create (once) the capture worker, change detector, adaptive controller and frame queue."""
+    if "screen_capturer" not in app:
+        app["screen_capturer"] = ScreenCapturer(
+            encoder=_get_frame_encoder(app),
+            source=(lambda: ReplayFrameSource(REPLAY_FRAMES_DIR)) if CAPTURE_SOURCE == "replay" else None,
+            target=CAPTURE_TARGET,
+            jpeg_quality=FRAME_JPEG_QUALITY,
+            crop_to_changes=CROP_TO_CHANGES,
+            crop_max_area=CROP_MAX_AREA,
+            full_frame_interval=FULL_FRAME_INTERVAL,
+            pixel_threshold=PIXEL_DIFF_THRESHOLD,
+            text_delta=TextDeltaExtractor(make_engine(OCR_ENGINE)) if TEXT_DELTAS and CROP_TO_CHANGES else None,
+        )
+    if "frame_change_detector" not in app:
+        app["frame_change_detector"] = FrameChangeDetector(
+            frame_threshold=FRAME_CHANGE_THRESHOLD,
+            description_threshold=DESCRIPTION_CHANGE_THRESHOLD,
+            description_min_frames=DESCRIPTION_MIN_FRAMES,
+            pixel_threshold=PIXEL_DIFF_THRESHOLD,
+            force_send_interval=FORCE_SEND_INTERVAL,
+        )
+    if ADAPTIVE_CAPTURE and "capture_controller" not in app:
+        app["capture_controller"] = AdaptiveCaptureController(
+            min_interval=CAPTURE_MIN_INTERVAL,
+            max_interval=CAPTURE_MAX_INTERVAL,
+            base_interval=SCREEN_CAPTURE_INTERVAL,
+            bandwidth_budget=UPLOAD_BUDGET_BYTES_PER_SEC,
+            max_frame_width=MAX_FRAME_WIDTH,
+            max_quality=FRAME_JPEG_QUALITY,
+        )
+    if "frame_queue" not in app:
+        app["frame_queue"] = FrameQueue(maxsize=FRAME_QUEUE_SIZE)
+        metrics.QUEUE_DEPTH.set_function(app["frame_queue"].depth)
+    return app["screen_capturer"], app["frame_change_detector"], app.get("capture_controller"), app["frame_queue"]
+
+async def capture_frames_loop(app: web.Application):
+    """Captures frames on a wall-clock schedule and queues the changed ones for sending."""
+    logger.info("Starting screen capture loop.")
+    capturer, detector, controller, frame_queue = _get_capture_pipeline(app)
+    loop = asyncio.get_running_loop()
+    next_capture = loop.time()
     try:
-        with mss.mss() as sct:
-            # sct.monitors[0] is the entire virtual screen, [1] is the primary monitor
-            # Using [1] for primary monitor as it's often what's intended for "screen"
-            monitor = sct.monitors[1] 
-            sct_img = sct.grab(monitor)
-
-            # Convert to PIL Image
-            img = PILImage.frombytes("RGB", (sct_img.width, sct_img.height), sct_img.rgb)
-
-            # Save frame as image file if enabled
-            if SAVE_FRAMES:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  # Include milliseconds
-                filename = f"frame_{timestamp}.jpg"
-                filepath = os.path.join(FRAMES_DIR, filename)
-                img.save(filepath, format="JPEG", quality=85)
-                logger.debug(f"Saved frame to: {filepath}")
-
-            # Save to BytesIO as JPEG for Gemini
-            image_io = io.BytesIO()
-            img.save(image_io, format="JPEG")
-            image_io.seek(0)
-            image_bytes = image_io.read()
-
-            return {"mime_type": "image/jpeg", "data": base64.b64encode(image_bytes).decode()}
+        while app.get("gemini_streaming_task_running", True):
+            if controller:
+                # Apply the controller's latest resolution/quality decisions to the next grab
+                capturer.scale = controller.scale
+                capturer.jpeg_quality = controller.quality
+            # The grab and encode run on the capturer's own thread, independent of sends
+            frame = await capturer.capture()
+            if frame and frame_store:
+                frame_store.save(frame)  # Only queues the write; identical frames are skipped
+            if frame and not detector.should_send(frame.signature):
+                # Near-duplicate of the last frame Gemini saw; don't upload it again
+                logger.bind(event="frame_skipped", frame=frame.hash, change=round(detector.last_change, 4)).debug(
+                    f"Skipped unchanged frame ({detector.last_change:.2%} changed).")
+                frame.change = detector.last_change
+                metrics.FRAMES.labels(outcome='skipped').inc()
+                if activity_store:
+                    activity_store.record_frame(session_timestamp, frame, sent=False)
+                if controller:
+                    controller.observe(detector.last_change, sent=False)
+            elif frame:
+                frame.change = detector.last_change
+                frame_queue.put_latest(frame)
+            else:
+                metrics.FRAMES.labels(outcome='failed').inc()
+                logger.warning("Failed to capture screen frame.")
+
+            # Schedule against the clock so capture/encode time doesn't stretch the interval
+            interval = controller.interval if controller else SCREEN_CAPTURE_INTERVAL
+            next_capture += interval
+            now = loop.time()
+            if next_capture < now:
+                next_capture = now  # Running behind; don't try to catch up with a burst
+            await asyncio.sleep(next_capture - now)
+    except asyncio.CancelledError:
+        logger.info("Screen capture loop cancelled.")
     except Exception as e:
-        logger.error(f"Error capturing screen: {e}")
-        return None
+        logger.error(f"Error in capture_frames_loop: {e}")
+        traceback.print_exc()
+        # Signal to stop the streaming task
+        app["gemini_streaming_task_running"] = False
+    finally:
+        logger.info("Screen capture loop stopped.")
+
+async def _send_context(session, text):
+    """Add text to the conversation without completing a turn, so the model doesn't answer it."""
+    await session.send_client_content(turns=types.Content(role="user", parts=[types.Part(text=text)]),
+                                      turn_complete=False)
 
-# --- Gemini Interaction Functions ---
 async def send_screen_loop(session, app: web.Application):
-    """Periodically captures and sends screen frames to Gemini."""
+    """Drains the frame queue and sends frames to Gemini."""
     logger.info("Starting to send screen frames to Gemini.")
-    frame_count = 0
+    capturer, detector, controller, frame_queue = _get_capture_pipeline(app)
+    capturer.request_full_frame()  # A new session has not seen the screen yet
     try:
-        while app.get("gemini_streaming_task_running", True):
-            frame_data = await asyncio.to_thread(_capture_screen_frame)
-            if frame_data:
-                try:
-                    # frame_data is {"mime_type": "image/jpeg", "data": base64_encoded_string}
-                    # The send_realtime_input method expects image data via the 'media' parameter.
-                    await session.send_realtime_input(media=frame_data)
-                    logger.debug("Sent screen frame to Gemini.")
-                    
-                    frame_count += 1
-                    # Ask for description every 3rd frame (increased frequency)
-                    if frame_count % 3 == 0:
-                        await session.send_realtime_input(text="Describe what you see on the screen in detail.")
-                        logger.info(f"Sent description request at frame {frame_count}")
-                        
-                except Exception as e:
-                    logger.error(f"Error sending frame to Gemini: {e}")
-                    # If it's a connection error, stop the loop
-                    if "ConnectionClosedError" in str(type(e)) or "timeout" in str(e).lower():
-                        logger.error("Connection lost, stopping screen capture loop")
-                        app["gemini_streaming_task_running"] = False
-                        break
-                    # For other errors, log and continue
-                    logger.warning("Continuing despite send error...")
+        while _session_running(app):
+            try:
+                # Wake up periodically so a stopped session is noticed even with no frames queued
+                frame = await asyncio.wait_for(frame_queue.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                continue
+            if frame_queue.maxsize > FRAME_QUEUE_SIZE and frame_queue.depth() <= FRAME_QUEUE_SIZE:
+                # The backlog buffered while disconnected has gone out; back to latest-frame-wins
+                frame_queue.set_maxsize(FRAME_QUEUE_SIZE)
+            try:
+                # Raw JPEG bytes go straight into a Blob; no base64 string round-trip on our side
+                capturer.uncrop_if_stale(frame)
+                if capturer.text_delta and frame.crop is not None:
+                    # OCR off the event loop; a small text-only change goes out as text
+                    frame.text = await asyncio.to_thread(capturer.text_delta.extract, frame)
+                send_start = time.perf_counter()
+                if frame.text:
+                    # Context only: the next describe prompt covers it, so each small edit isn't a turn of its own
+                    await _send_context(session, frame.text)
+                else:
+                    if frame.crop is not None:
+                        # Without its position a crop would be described as the whole screen
+                        await _send_context(session, crop_caption(frame))
+                    await session.send_realtime_input(media=types.Blob(data=frame.payload, mime_type=frame.mime_type))
+                send_seconds = time.perf_counter() - send_start
+                capturer.mark_sent(frame)
+                metrics.FRAMES.labels(outcome='sent').inc()
+                metrics.PAYLOAD_BYTES.labels(kind=metrics.frame_kind(frame)).observe(frame.payload_size)
+                metrics.trace_frame(frame, send_seconds)
+                capturer.timer.record('send', send_seconds)
+                capturer.timer.record('frame_age', time.time() - frame.captured_at)
+                if activity_store:
+                    activity_store.record_frame(session_timestamp, frame, sent=True, send_latency=send_seconds)
+                if controller:
+                    controller.observe(frame.change, sent=True, payload_bytes=frame.payload_size,
+                                       send_seconds=send_seconds, native_width=capturer.native_size[0])
+                logger.bind(event="frame_sent", frame=frame.hash, kind=metrics.frame_kind(frame), bytes=frame.payload_size,
+                            send_ms=round(send_seconds * 1000, 1)).debug(
+                    f"Sent screen {'text update' if frame.text else 'frame'} to Gemini "
+                    f"({frame.payload_size:,} of {frame.size:,} bytes"
+                    f"{f', region {frame.crop}' if frame.crop else ''}, queue depth {frame_queue.depth()}).")
+                
+                # Ask for a description only once the screen has changed significantly
+                if detector.should_describe():
+                    await session.send_realtime_input(text="Describe what you see on the screen in detail.")
+                    if "turn_assembler" in app:
+                        app["turn_assembler"].mark_request()
+                    app["description_frame"] = frame.hash  # Response logs refer back to it
+                    logger.bind(event="description_request", frame=frame.hash).info(f"Sent description request at frame {detector.frames_sent} ({detector.stats()}, queue: {frame_queue.stats()}, timings: {capturer.timer.summary()})")
                     
-            else:
-                logger.warning("Failed to capture/send screen frame.")
-            await asyncio.sleep(SCREEN_CAPTURE_INTERVAL)
+            except Exception as e:
+                logger.error(f"Error sending frame to Gemini: {e}")
+                # If it's a connection error, end this session; the supervisor reconnects
+                if "ConnectionClosedError" in str(type(e)) or "timeout" in str(e).lower():
+                    logger.error("Connection lost, stopping screen sending loop")
+                    # Keep the unsent frame so it goes out first after reconnecting
+                    frame_queue.put_back(frame)
+                    app["gemini_session_error"] = f"send failed: {e}"
+                    app["gemini_session_active"] = False
+                    break
+                # For other errors, log and continue
+                logger.warning("Continuing despite send error...")
     except asyncio.CancelledError:
         logger.info("Screen sending loop cancelled.")
     except Exception as e:
         logger.error(f"Error in send_screen_loop: {e}")
         traceback.print_exc()
-        # Signal to stop the streaming task
-        app["gemini_streaming_task_running"] = False
+        # Signal the supervisor to replace this session
+        app["gemini_session_active"] = False
     finally:
         logger.info("Screen sending loop stopped.")
 
+def _save_assembled_turn(record):
+    """TurnAssembler callback: persist one complete description."""
+    logger.bind(event="description", chunks=record['chunks'], chars=len(record['text']),
+                first_chunk_latency=record.get('first_chunk_latency')).info(
+        f"Gemini description ({record['chunks']} chunks, {len(record['text'])} chars): {record['text'][:200]}")
+    metrics.DESCRIPTIONS.inc()
+    if 'first_chunk_latency' in record:
+        metrics.FIRST_CHUNK_SECONDS.observe(record['first_chunk_latency'])
+        metrics.FINAL_CHUNK_SECONDS.observe(record['last_chunk_latency'])
+    fields = {key: value for key, value in record.items() if key not in ('text', 'timestamp')}
+    save_description_to_files(record['text'], timestamp=record['timestamp'], **fields)
+
 async def receive_gemini_responses_loop(session, app: web.Application):
-    """Receives and logs responses from Gemini."""
+    """Receives Gemini responses and assembles streamed fragments into descriptions."""
     logger.info("Starting to listen for Gemini responses.")
+    assembler = app.get("turn_assembler")
+    if assembler is None:
+        assembler = app["turn_assembler"] = TurnAssembler(_save_assembled_turn, idle_timeout=TURN_IDLE_TIMEOUT)
     try:
-        while app.get("gemini_streaming_task_running", True):
+        while _session_running(app):
             try:
                 async for response in session.receive():
-                    if not app.get("gemini_streaming_task_running", True):
+                    if not _session_running(app):
                         break
                     
                     # Try to get text from the response
                     response_text = None
                     try:
-                        # Check if response has text attribute and it's not empty
-                        if hasattr(response, 'text') and response.text:
-                            response_text = response.text.strip()
-                            logger.info(f"Gemini response (text): {response_text}")
-                            
-                            # Save description to file if enabled
-                            if SAVE_DESCRIPTIONS and response_text:
-                                try:
-                                    save_description_to_files(response_text)
-                                except Exception as e:
-                                    logger.error(f"Error writing description to files: {e}")
-                        
-                        # If no direct text, try to get text from parts
-                        elif hasattr(response, 'parts') and response.parts:
-                            text_parts = []
-                            for part in response.parts:
-                                if hasattr(part, 'text') and part.text:
-                                    text_parts.append(part.text.strip())
-                            if text_parts:
-                                response_text = ' '.join(text_parts).strip()
-                                logger.info(f"Gemini response (from parts): {response_text}")
-                                
-                                # Save description to file if enabled
-                                if SAVE_DESCRIPTIONS and response_text:
-                                    try:
-                                        save_description_to_files(response_text)
-                                    except Exception as e:
-                                        logger.error(f"Error writing description to files: {e}")
+                        response_text = extract_response_text(response)
+                        if response_text:
+                            logger.bind(event="response_chunk", request_frame=app.get("description_frame"),
+                                        chars=len(response_text)).debug(f"Gemini response chunk: {response_text}")
+                            metrics.RESPONSE_CHUNKS.inc()
+                            assembler.add_chunk(response_text)
                         
                         # Log if we didn't find any text
                         if not response_text:
-                            logger.debug(f"Received non-text response from Gemini. Response type: {type(response)}")
+                            logger.bind(event="non_text_response").debug(
+                                f"Received non-text response from Gemini. Response type: {type(response)}")
                         
                     except Exception as e:
                         logger.warning(f"Error extracting text from Gemini response: {e}")
                     
+                    # One description per model turn: persist once the server says the turn is done
+                    if is_turn_complete(response):
+                        with logger.contextualize(request_frame=app.get("description_frame")):
+                            assembler.complete_turn()
+                    
+                    # Remember the latest resumption handle so a reconnect can pick the session back up
+                    resumption = getattr(response, 'session_resumption_update', None)
+                    if resumption and getattr(resumption, 'resumable', False) and resumption.new_handle:
+                        app["gemini_resume_handle"] = resumption.new_handle
+                    if getattr(response, 'go_away', None):
+                        logger.warning(f"Gemini will close the session soon: {response.go_away}")
+                    
                     # Handle audio/data responses
                     if hasattr(response, 'data') and response.data:
-                        logger.debug("Received audio data from Gemini.")
+                        logger.bind(event="audio").debug("Received audio data from Gemini.")
                 
                 # If we exit the async for loop, it means the session receive() generator ended
                 # This could be normal session completion or an error
@@ -392,6 +413,8 @@ async def receive_gemini_responses_loop(session, app: web.Application):
                 # Don't break immediately, try to continue unless it's a critical error
                 if "ConnectionClosedError" in str(type(e)):
                     logger.error("Connection closed, stopping receive loop")
+                    app["gemini_session_error"] = f"receive failed: {e}"
+                    app["gemini_session_active"] = False
                     break
                 await asyncio.sleep(1)  # Wait a bit before retrying
                 
@@ -400,55 +423,200 @@ async def receive_gemini_responses_loop(session, app: web.Application):
     except Exception as e:
         logger.error(f"Error in receive_gemini_responses_loop: {e}")
         traceback.print_exc()
-        # If there is an error with receiving, we might want to stop the streaming
-        app["gemini_streaming_task_running"] = False
+        # If there is an error with receiving, let the supervisor reconnect
+        app["gemini_session_active"] = False
     finally:
+        # Don't lose a partially streamed description
+        assembler.flush()
         logger.info("Gemini response receiving loop stopped.")
 
 
+def _session_running(app: web.Application):
+    """True while both the streaming task and the current Gemini session should keep going."""
+    return app.get("gemini_streaming_task_running", True) and app.get("gemini_session_active", True)
+
+def _reconnect_delay(attempt):
+    """Exponential backoff with jitter: half the capped delay fixed, half random."""
+    delay = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def _session_prompt(reconnect=False):
+    """Initial prompt, plus a short summary of recent descriptions when reconnecting."""
+    prompt = INITIAL_PROMPT
+    if CROP_TO_CHANGES:
+        prompt += (" To save bandwidth, an image may show only the part of the screen that changed; it is then "
+                   "preceded by a 'Screen region update' message giving its position on the full screen. Treat "
+                   "the rest of the screen as unchanged from the last full image.")
+    if TEXT_DELTAS:
+        prompt += (" Small edits to on-screen text may arrive as 'Screen text update' messages listing removed "
+                   "and added lines instead of an image; apply them to the last screen you saw.")
+    recent = list(description_journal.recent)[-RECONNECT_CONTEXT_DESCRIPTIONS:] if reconnect else []
+    if recent:
+        lines = []
+        for entry in recent:
+            text = " ".join(entry['text'].split())
+            if len(text) > RECONNECT_CONTEXT_CHARS:
+                text = text[:RECONNECT_CONTEXT_CHARS] + "..."
+            lines.append(f"- {entry['timestamp']}: {text}")
+        prompt += ("\n\nThe connection was interrupted. For context, these were your most recent descriptions:\n"
+                   + "\n".join(lines))
+    return prompt
+
+def _live_config(app: web.Application):
+    """GEMINI_CONFIG, asking for session resumption (with the last handle, if any)."""
+    config = dict(GEMINI_CONFIG)
+    if GEMINI_SESSION_RESUMPTION:
+        handle = app.get("gemini_resume_handle")
+        config["session_resumption"] = {"handle": handle} if handle else {}
+    return config
+
+def _get_live_connect(app: web.Application):
+    """Create (once) the connect(config=...) callable for Live sessions: the Gemini API or a local replay."""
+    if "live_connect" not in app:
+        if LIVE_BACKEND == "replay":
+            replay_server = app["replay_server"] = ReplayLiveServer(
+                load_turns(REPLAY_SOURCE),
+                first_chunk_latency=REPLAY_FIRST_CHUNK_LATENCY,
+                jitter=REPLAY_JITTER,
+            )
+            logger.info(f"Replaying {len(replay_server.turns)} recorded responses from {REPLAY_SOURCE} instead of Gemini")
+            app["live_connect"] = replay_server.connect
+        else:
+            api_key = os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                return None
+            client = genai.Client(api_key=api_key)
+            app["live_connect"] = lambda config: client.aio.live.connect(model=GEMINI_MODEL_NAME, config=config)
+    return app["live_connect"]
+
+async def run_gemini_session(connect, app: web.Application, reconnect=False):
+    """Connect once and stream until the session ends or fails."""
+    async with connect(config=_live_config(app)) as session:
+        resumed = bool(app.get("gemini_resume_handle")) and GEMINI_SESSION_RESUMPTION
+        model = GEMINI_MODEL_NAME if LIVE_BACKEND == "gemini" else f"replay of {REPLAY_SOURCE}"
+        logger.info(f"Successfully connected to Gemini model: {model} (reconnect={reconnect}, resumed={resumed})")
+        app["gemini_session"] = session
+        app["gemini_session_active"] = True
+        _mark_connected(app)
+
+        if "turn_assembler" not in app:
+            app["turn_assembler"] = TurnAssembler(_save_assembled_turn, idle_timeout=TURN_IDLE_TIMEOUT)
+
+        # Ask Gemini to describe the screen; after a reconnect also remind it what it saw last
+        await session.send_realtime_input(text=_session_prompt(reconnect=reconnect and not resumed))
+        app["turn_assembler"].mark_request()  # Its answer is the first description and queues ahead of later requests
+        logger.info(f"Sent initial prompt to Gemini")
+
+        tasks = [
+            asyncio.create_task(send_screen_loop(session, app)),
+            asyncio.create_task(receive_gemini_responses_loop(session, app)),
+        ]
+        try:
+            # When either side gives up the session is done; don't wait on the other one
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            app["gemini_session_active"] = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+def _mark_connected(app: web.Application):
+    stats = app["gemini_connection"]
+    now = time.time()
+    if stats['disconnected_at'] is not None:
+        downtime = now - stats['disconnected_at']
+        stats['total_downtime'] += downtime
+        stats['last_downtime'] = downtime
+        stats['reconnects'] += 1
+        metrics.RECONNECTS.inc()
+        logger.info(f"Reconnected to Gemini after {downtime:.1f}s ({stats['reconnects']} reconnects, {stats['total_downtime']:.1f}s total downtime)")
+    stats['connected'] = True
+    metrics.CONNECTED.set(1)
+    stats['connected_since'] = now
+    stats['disconnected_at'] = None
+
+def _mark_disconnected(app: web.Application, reason):
+    stats = app["gemini_connection"]
+    if stats['disconnected_at'] is None:
+        # Downtime counts from the first failure, not from the latest failed attempt
+        stats['disconnected_at'] = time.time()
+    stats['connected'] = False
+    metrics.CONNECTED.set(0)
+    stats['last_error'] = reason
+
 async def run_gemini_screen_interaction(app: web.Application):
-    """Main task to manage screen streaming to Gemini."""
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
+    """Supervisor: keeps a Gemini Live session up, reconnecting with jittered backoff."""
+    connect = _get_live_connect(app)
+    if connect is None:
         logger.error("GOOGLE_API_KEY environment variable not set. Screen streaming to Gemini will not start.")
         return
 
-    client = genai.Client(api_key=api_key)
     app["gemini_streaming_task_running"] = True
+    app["gemini_connection"] = {
+        'connected': False, 'connected_since': None, 'disconnected_at': None,
+        'attempts': 0, 'reconnects': 0, 'total_downtime': 0.0, 'last_downtime': None, 'last_error': None,
+    }
     logger.info("Attempting to connect to Gemini for screen streaming...")
 
+    # Capture outlives individual sessions; frames keep queueing while we reconnect
+    _, _, _, frame_queue = _get_capture_pipeline(app)
+    capture_task = asyncio.create_task(capture_frames_loop(app))
+    attempt = 0
+    reconnect = False
+
     try:
-        async with client.aio.live.connect(model=GEMINI_MODEL_NAME, config=GEMINI_CONFIG) as session:
-            logger.info(f"Successfully connected to Gemini model: {GEMINI_MODEL_NAME}")
-            app["gemini_session"] = session
-
-            # Ask Gemini to describe the screen
-            initial_prompt = "You are viewing a computer screen. Please describe what you see when I send you screen captures. Transcribe the important text that is changing as the user interacts with the system."
-            await session.send_realtime_input(text=initial_prompt)
-            logger.info(f"Sent initial prompt to Gemini")
-            
-            async with asyncio.TaskGroup() as tg:
-                tg.create_task(send_screen_loop(session, app))
-                tg.create_task(receive_gemini_responses_loop(session, app))
-            # TaskGroup will wait for all tasks to complete here
-            # This point is reached if both tasks finish (e.g., due to cancellation or natural completion)
-            
+        while app.get("gemini_streaming_task_running", True):
+            app["gemini_connection"]['attempts'] += 1
+            started = time.monotonic()
+            try:
+                await run_gemini_session(connect, app, reconnect=reconnect)
+                reason = app.pop("gemini_session_error", "session ended")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to connect or run Gemini screen interaction: {e}")
+                traceback.print_exc()
+                reason = str(e)
+                if app.get("gemini_resume_handle") and not app["gemini_connection"]['connected']:
+                    # A stale handle can make every connect fail; fall back to a fresh session
+                    app.pop("gemini_resume_handle", None)
+            finally:
+                app.pop("gemini_session", None)  # Remove the session reference
+
+            if not app.get("gemini_streaming_task_running", True):
+                break
+            _mark_disconnected(app, reason)
+            # Buffer a longer backlog of changed frames until the next session is up
+            frame_queue.set_maxsize(DISCONNECTED_FRAME_BUFFER)
+
+            if time.monotonic() - started >= RECONNECT_RESET_AFTER:
+                attempt = 0  # The last session was healthy; start the backoff over
+            delay = _reconnect_delay(attempt)
+            attempt += 1
+            reconnect = True
+            logger.warning(f"Gemini session lost ({reason}); reconnecting in {delay:.1f}s (attempt {attempt})")
+            await asyncio.sleep(delay)
+
     except asyncio.CancelledError:
         logger.info("Gemini screen interaction task was cancelled.")
-    except Exception as e:
-        logger.error(f"Failed to connect or run Gemini screen interaction: {e}")
-        traceback.print_exc()
-        # Wait a bit before the task ends to avoid rapid restart attempts
-        await asyncio.sleep(5)
     finally:
         logger.info("Gemini screen interaction task finished or was terminated.")
         app["gemini_streaming_task_running"] = False # Ensure flag is cleared
+        capture_task.cancel()
+        await asyncio.gather(capture_task, return_exceptions=True)
         if "gemini_session" in app:
             app.pop("gemini_session", None)  # Remove the session reference
 
 
 async def start_gemini_streaming_background_task(app: web.Application):
     """aiohttp startup task to launch Gemini streaming."""
+    _get_frame_encoder(app)  # Pool workers start before any capture or peer traffic
+    _get_peer_registry(app)
+    if REMOTE_SESSIONS:
+        _get_peer_sessions(app)
+    if not LOCAL_SCREEN_CAPTURE:
+        logger.info("Local screen capture disabled; only remote peer sessions will stream.")
+        return
     app['gemini_screen_stream_task'] = asyncio.create_task(run_gemini_screen_interaction(app))
     logger.info("Gemini screen streaming background task created.")
 
@@ -473,6 +641,48 @@ async def cleanup_gemini_streaming_background_task(app: web.Application):
     else:
         logger.info("No Gemini screen streaming task found to cleanup.")
 
+    if 'screen_capturer' in app:
+        app['screen_capturer'].close()
+    if app.get('peer_sessions'):
+        await app['peer_sessions'].close()
+    if 'frame_encoder' in app:
+        app['frame_encoder'].close()
+
+def _get_frame_encoder(app: web.Application):
+    """Create (once) the encoder shared by local capture and peer sessions."""
+    if "frame_encoder" not in app:
+        if ENCODE_MODE == "process" and process_encoder:
+            app["frame_encoder"] = process_encoder
+        else:
+            app["frame_encoder"] = FrameEncoder(ENCODE_MODE, workers=ENCODE_WORKERS, image_format=FRAME_FORMAT)
+        logger.info(f"Frame encoding: {FRAME_FORMAT}, {ENCODE_MODE}"
+                    + (f" ({ENCODE_WORKERS} workers)" if ENCODE_MODE != "inline" else ""))
+    return app["frame_encoder"]
+
+def _get_peer_sessions(app: web.Application):
+    """Create (once) the manager that runs one Gemini session per remote video track; None without an API key."""
+    if "peer_sessions" not in app:
+        live_connect = _get_live_connect(app)
+        if live_connect is None:
+            logger.error("GOOGLE_API_KEY environment variable not set. Remote peer sessions are disabled.")
+            app["peer_sessions"] = None
+            return None
+        app["peer_sessions"] = PeerSessionManager(
+            connect=lambda: live_connect(config=dict(GEMINI_CONFIG)),
+            descriptions_dir=DESCRIPTIONS_DIR,
+            prompt=INITIAL_PROMPT,
+            max_sessions=MAX_PEER_SESSIONS,
+            encode_workers=PEER_ENCODE_WORKERS,
+            encoder=_get_frame_encoder(app),
+            sample_interval=PEER_SAMPLE_INTERVAL,
+            max_width=MAX_FRAME_WIDTH,
+            jpeg_quality=FRAME_JPEG_QUALITY,
+            activity_store=activity_store,
+            turn_idle_timeout=TURN_IDLE_TIMEOUT,
+        )
+        metrics.PEER_SESSIONS.set_function(lambda: len(app["peer_sessions"].sessions))
+    return app["peer_sessions"]
+
 # --- Existing WebRTC Code ---
 async def handle_options(request):
     return web.Response(
@@ -483,60 +693,34 @@ async def handle_options(request):
         }
     )
 
+def _busy_response(message):
+    return web.json_response(
+        {"error": message},
+        status=503,
+        headers={"Retry-After": "30", "Access-Control-Allow-Origin": "*"},
+    )
+
 async def offer(request):
     params = await request.json()
     offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
+    peer_sessions = request.app.get("peer_sessions") if REMOTE_SESSIONS else None
+    if peer_sessions and peer_sessions.full() and "m=video" in offer.sdp:
+        # Admission control: refuse before negotiating rather than dropping the track later
+        peer_sessions.rejected += 1
+        logger.warning(f"Rejected offer from {request.remote}: {MAX_PEER_SESSIONS} peer sessions active")
+        return _busy_response(f"Server is at its limit of {MAX_PEER_SESSIONS} screen sessions, try again later")
 
-    pc = RTCPeerConnection()
-    pc_id = "PeerConnection(%s)" % uuid.uuid4()
-    pcs.add(pc)
-
-    def log_info(msg, *args):
-        logger.info(f"{pc_id} {msg}", *args)
-
-    log_info("Created for {}", request.remote)
-
-    @pc.on("datachannel")
-    def on_datachannel(channel):
-        @channel.on("message")
-        def on_message(message):
-            if isinstance(message, str) and message.startswith("ping"):
-                channel.send("pong" + message[4:])
-
-    @pc.on("connectionstatechange")
-    async def on_connectionstatechange():
-        log_info("Connection state is {}", pc.connectionState)
-        if pc.connectionState == "failed":
-            await pc.close()
-            pcs.discard(pc)
-
-    @pc.on("track")
-    def on_track(track):
-        log_info("Track {} received", track.kind)
-
-        if track.kind == "video":
-            # This is where you would typically process the video track
-            # For example, save to a file, perform analysis, etc.
-            # For this example, we'll just log and relay it (if configured)
-            # local_video = relay.subscribe(track) # Example of relaying
-            pass # Placeholder for actual video processing
-
-        @track.on("ended")
-        async def on_ended():
-            log_info("Track {} ended", track.kind)
-            # You might want to do cleanup here
-
-    # handle offer
-    await pc.setRemoteDescription(offer)
-
-    # send answer
-    answer = await pc.createAnswer()
-    await pc.setLocalDescription(answer)
+    try:
+        peer = await _get_peer_registry(request.app).accept(offer, uuid.uuid4().hex, request.remote)
+    except PeerLimitError as e:
+        logger.warning(f"Rejected offer from {request.remote}: {e}")
+        return _busy_response(f"Server is at its limit of {MAX_PEER_CONNECTIONS} connections, try again later")
+    logger.info(f"Peer {peer.peer_id} created for {request.remote}")
 
     return web.Response(
         content_type="application/json",
         text=json.dumps(
-            {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+            {"sdp": peer.pc.localDescription.sdp, "type": peer.pc.localDescription.type}
         ),
         headers={
             "Access-Control-Allow-Origin": "*",  # Allows all origins
@@ -545,45 +729,142 @@ async def offer(request):
         }
     )
 
+def _get_peer_registry(app: web.Application):
+    """Create (once) the registry that owns every peer connection and enforces its timeouts."""
+    if "peer_registry" not in app:
+        app["peer_registry"] = PeerRegistry(
+            max_peers=MAX_PEER_CONNECTIONS,
+            connect_timeout=PEER_CONNECT_TIMEOUT,
+            idle_timeout=PEER_IDLE_TIMEOUT,
+            heartbeat_timeout=PEER_HEARTBEAT_TIMEOUT,
+            on_track=lambda peer, track: _on_peer_track(app, peer, track),
+            on_close=lambda peer: _on_peer_closed(app, peer),
+        ).start()
+        metrics.PEER_CONNECTIONS.set_function(lambda: len(app["peer_registry"]))
+    return app["peer_registry"]
+
+def _on_peer_track(app: web.Application, peer, track):
+    logger.info(f"Peer {peer.peer_id}: track {track.kind} received")
+    peer_sessions = app.get("peer_sessions") if REMOTE_SESSIONS else None
+    if track.kind != "video" or not peer_sessions:
+        return
+
+    @track.on("ended")
+    async def on_ended():
+        logger.info(f"Peer {peer.peer_id}: track {track.kind} ended")
+        await peer_sessions.remove(peer.peer_id)
+
+    asyncio.ensure_future(_start_peer_session(app, peer, track))
+
+async def _start_peer_session(app: web.Application, peer, track):
+    registry, peer_sessions = app["peer_registry"], app["peer_sessions"]
+    if peer.peer_id not in registry.peers:
+        return  # Closed while negotiating
+    try:
+        # Unbuffered relay: the session samples the newest frame, older decoded frames are dropped
+        session = await peer_sessions.add(peer.peer_id, peer.relay.subscribe(track, buffered=False))
+    except SessionLimitError as e:
+        logger.info(f"Peer {peer.peer_id}: no session for video track: {e}")
+        await registry.close(peer.peer_id, "session_limit")
+        return
+    if peer.peer_id not in registry.peers or track.readyState == "ended":
+        # Closed, or the track ended, while the session was starting; on_ended found nothing to remove then
+        await peer_sessions.remove(peer.peer_id)
+        return
+    logger.info(f"Peer {peer.peer_id}: streaming video track to Gemini as session {session.session_id}")
+
+async def _on_peer_closed(app: web.Application, peer):
+    """PeerRegistry callback: stop the peer's Gemini session, if it has one."""
+    if app.get("peer_sessions"):
+        await app["peer_sessions"].remove(peer.peer_id)
+
+async def stats(request):
+    """Current capture pipeline decisions, counters and stage timings."""
+    app = request.app
+    payload = {
+        'streaming': app.get("gemini_streaming_task_running", False),
+        'peer_connections': len(app['peer_registry']) if 'peer_registry' in app else 0,
+    }
+    if 'capture_controller' in app:
+        payload['controller'] = app['capture_controller'].stats()
+    if 'frame_change_detector' in app:
+        payload['frames'] = app['frame_change_detector'].stats()
+    if 'screen_capturer' in app:
+        payload['timings'] = app['screen_capturer'].timer.summary()
+        payload['capture'] = app['screen_capturer'].stats()
+    if 'frame_queue' in app:
+        payload['queue'] = app['frame_queue'].stats()
+    if 'gemini_connection' in app:
+        payload['connection'] = app['gemini_connection']
+    if 'turn_assembler' in app:
+        payload['descriptions'] = {
+            'turns': app['turn_assembler'].turns_emitted,
+            'chunks': app['turn_assembler'].chunks_received,
+        }
+    if 'replay_server' in app:
+        payload['replay'] = app['replay_server'].stats()
+    if 'log_sampler' in app:
+        payload['logging'] = app['log_sampler'].stats()
+    if 'peer_registry' in app:
+        payload['peers'] = app['peer_registry'].stats()
+    if app.get('peer_sessions'):
+        payload['peer_sessions'] = app['peer_sessions'].stats()
+    if activity_store:
+        payload['store'] = activity_store.stats()
+    if frame_store:
+        payload['frame_storage'] = frame_store.stats()
+    return web.json_response(payload, headers={"Access-Control-Allow-Origin": "*"})
+
+async def metrics_handler(request):
+    """Prometheus text exposition of the capture, description, persistence and connection metrics."""
+    return web.Response(body=metrics.REGISTRY.render().encode('utf-8'), headers={"Content-Type": metrics.CONTENT_TYPE})
+
 async def on_shutdown(app):
-    # close peer connections
-    coros = [pc.close() for pc in pcs]
-    await asyncio.gather(*coros)
-    pcs.clear()
+    # close peer connections (and their sessions)
+    if 'peer_registry' in app:
+        await app['peer_registry'].close_all()
+
+async def close_description_journal(app):
+    """Flush and fsync any queued descriptions before exit."""
+    if SAVE_DESCRIPTIONS:
+        await asyncio.to_thread(description_journal.close)
+        logger.info(f"Description journal closed ({description_journal.entry_count} entries this session)")
+    if activity_store:
+        await asyncio.to_thread(activity_store.close)
+        logger.info(f"Activity store closed ({activity_store.descriptions_written} descriptions, "
+                    f"{activity_store.frames_written} frames this session)")
+    if frame_store:
+        await asyncio.to_thread(frame_store.close)
+        logger.info(f"Frame store closed ({frame_store.frames_saved} frames saved, "
+                    f"{frame_store.frames_deduplicated} duplicates skipped this session)")
 
 if __name__ == "__main__":
-    # Configure Loguru with detailed timestamps
-    logger.remove() # Removes the default handler
-    
-    # Add a new handler with detailed timestamp format
-    logger.add(
-        sys.stderr, 
-        level="INFO",
-        format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        colorize=True
-    )
-    
-    # Also add a file logger for persistent logs
+    # Console at INFO, text and JSON files at DEBUG; hot-path debug lines are sampled (see logs.py)
     log_filename = f"server_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    logger.add(
-        log_filename,
-        level="DEBUG", 
-        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}",
-        rotation="10 MB",  # Rotate when file reaches 10MB
-        retention="7 days",  # Keep logs for 7 days
-        compression="zip"  # Compress old logs
-    )
+    log_sampler = configure_logging(log_filename, json_filename=log_filename[:-4] + ".jsonl" if LOG_JSON else None,
+                                    enqueue=LOG_ENQUEUE)
     
     logger.info(f"Server starting up at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info(f"Logs will be saved to: {log_filename}")
 
     app = web.Application()
+    app["log_sampler"] = log_sampler
     
     # Add Gemini streaming lifecycle handlers
     app.on_startup.append(start_gemini_streaming_background_task)
     app.on_cleanup.append(cleanup_gemini_streaming_background_task)
     
     app.on_shutdown.append(on_shutdown)
+    app.on_cleanup.append(close_description_journal)
     app.router.add_post("/offer", offer)
     app.router.add_route("OPTIONS", "/offer", handle_options)
-    web.run_app(app, access_log=None, host="0.0.0.0", port=8080) 
\ No newline at end of file
+    app.router.add_get("/stats", stats)
+    app.router.add_get("/metrics", metrics_handler)
+    if TRACE_FRAMES and not metrics.enable_tracing():
+        logger.warning("TRACE_FRAMES is set but opentelemetry-api is not installed; frame spans are disabled")
+    # Serve the descriptions directory so the HTML viewer can tail its journal
+    if SAVE_DESCRIPTIONS:
+        app.router.add_static("/descriptions/", DESCRIPTIONS_DIR)
+        logger.info(f"Live description viewer: http://localhost:8080/descriptions/{os.path.basename(DESCRIPTIONS_HTML_FILE)}")
+    web.run_app(app, access_log=None, host="0.0.0.0", port=8080)
+    logger.complete()  # Wait for the writer thread to drain the queued records 
\ No newline at end of file
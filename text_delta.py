@@ -0,0 +1,178 @@
+"""
+Local OCR pre-pass: send what the text on screen changed to instead of an image.
+
+When a frame's changed region (ScreenCapturer's dirty-rectangle crop) is small,
+TextDeltaExtractor OCRs that region in the last frame Gemini was shown and in
+the new frame and diffs the lines. If only text changed (every changed pixel
+lies inside an OCR line box) and the diff is short, the diff is added to the
+conversation as text instead of the cropped image, without starting a model
+turn; the next describe prompt covers it. Full frames
+(new session, layout change, periodic refresh) and non-text changes still go
+out as images, and every MAX_TEXT_FRAMES text updates an image is sent anyway
+so the model keeps seeing the screen.
+
+OCR engines have read(image) -> [(line, (left, top, right, bottom)), ...] and
+are callable as image -> list of text lines:
+
+- TesseractEngine: pytesseract + a local tesseract install (optional dependency)
+- StubOCREngine: no dependencies; one pseudo "line" per band of pixels, for tests
+"""
+
+import time
+import difflib
+import hashlib
+from PIL import ImageChops, ImageDraw
+
+MAX_DELTA_LINES = 20  # More changed lines than this is not a small text edit; send the image
+MAX_TEXT_FRAMES = 10  # Consecutive text updates before an image is sent again
+MIN_TEXT_LINES = 1  # OCR must find at least this many lines in the changed region
+PIXEL_THRESHOLD = 24  # Grayscale difference that counts as a changed pixel
+TEXT_BOX_MARGIN = 2  # px around each OCR line box still counted as text (anti-aliasing, cursor)
+MAX_NON_TEXT_CHANGE = 0.001  # Fraction of the region that may change outside line boxes
+OCR_ENGINES = ('tesseract', 'stub')
+
+
+class TesseractEngine:
+    """Tesseract OCR through pytesseract (pip install pytesseract, plus the tesseract binary)."""
+
+    def __init__(self, lang="eng", config="--psm 6"):
+        try:
+            import pytesseract
+        except ImportError as e:
+            raise RuntimeError("TesseractEngine needs pytesseract: pip install pytesseract") from e
+        self._pytesseract = pytesseract
+        self.lang = lang
+        self.config = config
+
+    def read(self, image):
+        data = self._pytesseract.image_to_data(image.convert("L"), lang=self.lang, config=self.config,
+                                               output_type=self._pytesseract.Output.DICT)
+        lines = {}  # (block, paragraph, line) -> [words, box]
+        for i, word in enumerate(data['text']):
+            if not word.strip():
+                continue
+            box = (data['left'][i], data['top'][i], data['left'][i] + data['width'][i],
+                   data['top'][i] + data['height'][i])
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            if key in lines:
+                words, (left, top, right, bottom) = lines[key]
+                words.append(word)
+                lines[key][1] = (min(left, box[0]), min(top, box[1]), max(right, box[2]), max(bottom, box[3]))
+            else:
+                lines[key] = [[word], box]
+        return [(" ".join(words), box) for words, box in lines.values()]
+
+    def __call__(self, image):
+        return [line for line, _ in self.read(image)]
+
+
+class StubOCREngine:
+    """Deterministic stand-in for OCR: each band of rows with any contrast becomes one pseudo line."""
+
+    def __init__(self, band_height=16, min_contrast=24):
+        self.band_height = band_height
+        self.min_contrast = min_contrast
+
+    def read(self, image):
+        gray = image.convert("L")
+        lines = []
+        for top in range(0, gray.height, self.band_height):
+            box = (0, top, gray.width, min(gray.height, top + self.band_height))
+            band = gray.crop(box)
+            low, high = band.getextrema()
+            if high - low >= self.min_contrast:
+                lines.append((f"line@{top}: {hashlib.blake2b(band.tobytes(), digest_size=6).hexdigest()}", box))
+        return lines
+
+    def __call__(self, image):
+        return [line for line, _ in self.read(image)]
+
+
+def make_engine(name):
+    if name == 'tesseract':
+        return TesseractEngine()
+    if name == 'stub':
+        return StubOCREngine()
+    raise ValueError(f"Unknown OCR engine {name!r} (expected one of {', '.join(OCR_ENGINES)})")
+
+
+def non_text_change(before, after, boxes, pixel_threshold=PIXEL_THRESHOLD, margin=TEXT_BOX_MARGIN):
+    """Fraction of the region's pixels that changed outside the given OCR line boxes."""
+    changed = ImageChops.difference(before.convert("L"), after.convert("L")).point(
+        lambda value: 255 if value > pixel_threshold else 0)
+    draw = ImageDraw.Draw(changed)
+    for left, top, right, bottom in boxes:
+        draw.rectangle((left - margin, top - margin, right + margin, bottom + margin), fill=0)
+    return changed.histogram()[255] / (changed.width * changed.height)
+
+
+def line_delta(before, after):
+    """Changed lines between two OCR results as '- old' / '+ new' lines."""
+    delta = []
+    for line in difflib.ndiff(before, after):
+        if line.startswith(('- ', '+ ')):
+            delta.append(line)
+    return delta
+
+
+class TextDeltaExtractor:
+    """Decides per sent frame whether a text delta can replace the (cropped) image."""
+
+    def __init__(self, engine, max_delta_lines=MAX_DELTA_LINES, max_text_frames=MAX_TEXT_FRAMES,
+                 min_text_lines=MIN_TEXT_LINES):
+        self.engine = engine
+        self.max_delta_lines = max_delta_lines
+        self.max_text_frames = max_text_frames
+        self.min_text_lines = min_text_lines
+
+        self._reference = None  # Full-resolution image of what Gemini has seen
+        self._text_frames = 0  # Text updates since the last image
+        self.checked = 0
+        self.deltas = 0
+        self.non_text = 0  # Regions where something besides text changed
+        self.ocr_seconds = 0.0
+
+    def extract(self, frame):
+        """Text update for a cropped frame, or None to send the image. Runs OCR; call off the event loop."""
+        reference = self._reference
+        if (frame.crop is None or frame.image is None or reference is None
+                or reference.size != frame.image.size or self._text_frames >= self.max_text_frames):
+            return None
+        self.checked += 1
+        start = time.perf_counter()
+        before_image, after_image = reference.crop(frame.crop), frame.image.crop(frame.crop)
+        before = self.engine.read(before_image)
+        after = self.engine.read(after_image)
+        self.ocr_seconds += time.perf_counter() - start
+        if len(after) < self.min_text_lines:
+            return None  # Not text (an image, video or blank region changed)
+        boxes = [box for _, box in before + after]
+        if non_text_change(before_image, after_image, boxes) > MAX_NON_TEXT_CHANGE:
+            self.non_text += 1
+            return None  # An icon, image or other non-text pixels changed too; the model must see them
+        delta = line_delta([line for line, _ in before], [line for line, _ in after])
+        if not delta or len(delta) > self.max_delta_lines:
+            return None  # Pixels changed but not the text, or too much text changed
+        self.deltas += 1
+        left, top, right, bottom = frame.crop
+        return (f"Screen text update (region x={left}-{right}, y={top}-{bottom}; '-' removed, '+' added):\n"
+                + "\n".join(delta))
+
+    def mark_sent(self, frame):
+        """Gemini has now seen this frame's content, as an image or as its text update."""
+        self._text_frames = self._text_frames + 1 if frame.text else 0
+        if frame.image is not None:
+            self._reference = frame.image
+
+    def reset(self):
+        self._reference = None
+        self._text_frames = 0
+
+    def stats(self):
+        return {
+            'engine': type(self.engine).__name__,
+            'checked': self.checked,
+            'text_deltas': self.deltas,
+            'non_text_changes': self.non_text,
+            'avg_ocr_ms': round(self.ocr_seconds / self.checked * 1000, 2) if self.checked else None,
+        }
@@ -0,0 +1,135 @@
+"""
+Turn assembly for streamed Gemini Live responses.
+
+The Live API streams a description as many small text fragments ("Okay, I'",
+"m ready. Send me..."). TurnAssembler buffers them until the server signals
+turn completion, or until no fragment has arrived for idle_timeout seconds,
+and then emits one record per description with its latencies.
+
+Request times are kept in a FIFO: the model answers requests in order, so
+each completed turn takes the oldest request sent before its first chunk.
+A request sent while an earlier turn is still streaming stays queued for the
+next turn instead of being lost.
+"""
+
+import time
+import asyncio
+from collections import deque
+from datetime import datetime
+from loguru import logger
+
+MAX_PENDING_REQUESTS = 16  # Oldest unanswered request times are forgotten beyond this
+
+
+def extract_response_text(response):
+    """Return the raw (unstripped) text fragment carried by a Live API response, if any."""
+    # Check if response has text attribute and it's not empty
+    if hasattr(response, 'text') and response.text:
+        return response.text
+
+    # If no direct text, try to get text from parts
+    if hasattr(response, 'parts') and response.parts:
+        text_parts = [part.text for part in response.parts if hasattr(part, 'text') and part.text]
+        if text_parts:
+            return ''.join(text_parts)
+    return None
+
+
+def is_turn_complete(response):
+    """True when the Live API marks the end of the model's turn."""
+    server_content = getattr(response, 'server_content', None)
+    return bool(server_content and getattr(server_content, 'turn_complete', False))
+
+
+class TurnAssembler:
+    """Buffers streamed text fragments and emits one record per model turn."""
+
+    def __init__(self, on_turn, idle_timeout=5.0):
+        self.on_turn = on_turn  # Called with the assembled record (a dict)
+        self.idle_timeout = idle_timeout
+        self.turns_emitted = 0
+        self.chunks_received = 0
+
+        self._chunks = []
+        self._started_at = None  # Wall-clock timestamp of the first chunk
+        self._first_chunk_time = None
+        self._last_chunk_time = None
+        self._requests = deque(maxlen=MAX_PENDING_REQUESTS)  # Send times of unanswered description requests
+        self._idle_handle = None
+
+    def mark_request(self):
+        """Record that a description request was just sent to the model."""
+        self._requests.append(time.monotonic())
+
+    def add_chunk(self, text):
+        """Buffer one streamed text fragment."""
+        if not text:
+            return
+        now = time.monotonic()
+        if not self._chunks:
+            self._started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self._first_chunk_time = now
+        self._chunks.append(text)
+        self._last_chunk_time = now
+        self.chunks_received += 1
+        self._reset_idle_timer()
+
+    def complete_turn(self, reason="turn_complete"):
+        """Emit the buffered fragments as one record. Returns the record or None."""
+        self._cancel_idle_timer()
+        if not self._chunks:
+            return None
+
+        # Fragments are slices of one continuous stream; join them as-is
+        text = "".join(self._chunks).strip()
+        record = {
+            'timestamp': self._started_at,
+            'text': text,
+            'chunks': len(self._chunks),
+            'completed_by': reason,
+        }
+        if self._requests and self._requests[0] <= self._first_chunk_time:
+            request_time = self._requests.popleft()
+            record['first_chunk_latency'] = round(self._first_chunk_time - request_time, 3)
+            record['last_chunk_latency'] = round(self._last_chunk_time - request_time, 3)
+        record['stream_duration'] = round(self._last_chunk_time - self._first_chunk_time, 3)
+
+        self._chunks = []
+        self._started_at = None
+        self._first_chunk_time = None
+        self._last_chunk_time = None
+
+        if text:
+            self.turns_emitted += 1
+            try:
+                self.on_turn(record)
+            except Exception as e:
+                logger.error(f"Error handling assembled turn: {e}")
+        return record
+
+    def flush(self):
+        """Emit whatever is buffered, e.g. when the session ends mid-turn.
+
+        Pending request times are dropped too: a new session will not answer them.
+        """
+        record = self.complete_turn(reason="flush")
+        self._requests.clear()
+        return record
+
+    def _reset_idle_timer(self):
+        self._cancel_idle_timer()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No event loop (e.g. offline use); rely on complete_turn/flush
+        self._idle_handle = loop.call_later(self.idle_timeout, self._on_idle)
+
+    def _cancel_idle_timer(self):
+        if self._idle_handle is not None:
+            self._idle_handle.cancel()
+            self._idle_handle = None
+
+    def _on_idle(self):
+        self._idle_handle = None
+        logger.debug(f"No response chunk for {self.idle_timeout}s, closing turn")
+        self.complete_turn(reason="idle_timeout")